@@ -1,23 +1,39 @@
-import time
+import json
 from fire import Fire
 from dareplane_utils.default_server.server import DefaultServer
 
 from ct_bic.utils.logging import logger
+from ct_bic.config import get_scheduling_policy
+from ct_bic.isolated import DeviceProcess
 from ct_bic.main import CTManager
+from ct_bic.scheduling import apply_policy
 from ct_bic.stimulation_cmds import get_single_pulse_stim_cmd
 
 
-def main(port: int = 8080, ip: str = "127.0.0.1", loglevel: int = 10):
+def send_json(server: DefaultServer, payload: dict) -> int:
+    """Reply to the currently connected client with a json payload"""
+    server.current_conn.sendall(json.dumps(payload).encode())
+    return 0
+
+
+def main(
+    port: int = 8080,
+    ip: str = "127.0.0.1",
+    loglevel: int = 10,
+    isolated: bool = False,
+):
     logger.setLevel(loglevel)
 
+    if isolated:
+        return main_isolated(port, ip)
+
     logger.info("Starting CTManager")
     ctm = CTManager()
 
-    logger.info("Generating stim commmands")
-    cmds = get_single_pulse_stim_cmd(ctm.implant)
-
-    logger.info("Registering stim commmands")
-    ctm.init_stim_cmds(cmds)
+    logger.info("Generating and registering stim commmands")
+    for device_id, dev in ctm.devices.items():
+        cmds = get_single_pulse_stim_cmd(dev.implant)
+        ctm.init_stim_cmds(cmds, device_id=device_id)
 
     # preload the stimulation command with a single pulse
 
@@ -25,7 +41,53 @@ def main(port: int = 8080, ip: str = "127.0.0.1", loglevel: int = 10):
         "START": ctm.start_recording,
         "STIM": ctm.start_stimulation,
         "STOPSTIM": ctm.stop_stimulation,
+        # double buffered update of the single pulse, e.g. for adaptive
+        # amplitudes - validated ahead, swapped in with a short stop / start
+        # of the stimulation after the next function finished
+        "SWAPSTIM": lambda amplitude_uA=12, pulsewidth_us=60, device_id=None: (
+            ctm.swap_stim_cmds(
+                get_single_pulse_stim_cmd(
+                    ctm.get_device(device_id).implant,
+                    amplitude_uA=int(amplitude_uA),
+                    pulsewidth_us=int(pulsewidth_us),
+                ),
+                device_id=device_id,
+            )
+        ),
         "LISTEN": ctm.listen_for_stim_trigger,
+        "STOPLISTEN": ctm.stop_listening,
+        "CLOSED_LOOP": lambda device_id=None: ctm.start_closed_loop(
+            device_id=device_id
+        ),
+        "STOP_CLOSED_LOOP": ctm.stop_closed_loop,
+        "RESTART": ctm.restart,
+        # e.g. RECONFIGURE|{"amplification": "57_5dB", "ref_channels": [4]}
+        "RECONFIGURE": lambda **kwargs: send_json(
+            server, ctm.reconfigure_recording(**kwargs)
+        ),
+        "ARCHIVE": ctm.start_archive,
+        "STOP_ARCHIVE": ctm.stop_archive,
+        "IMPEDANCE": ctm.start_impedance_sweep,
+        "GET_IMPEDANCE": lambda device_id=None: send_json(
+            server, ctm.get_impedances(device_id)
+        ),
+        "SCHEDULE_IMPEDANCE": ctm.schedule_impedance_sweeps,
+        "DROPSTATS": lambda device_id=None: send_json(
+            server, ctm.get_drop_stats(device_id)
+        ),
+        "STATS": lambda device_id=None: send_json(
+            server, ctm.stats(device_id)
+        ),
+        "QUALITY": lambda device_id=None: send_json(
+            server, ctm.get_signal_quality(device_id)
+        ),
+        # e.g. JITTER|{"role": "controller", "duration_s": 5}
+        "JITTER": lambda role=None, duration_s=2: send_json(
+            server, ctm.measure_jitter(role, float(duration_s))
+        ),
+        "PUBLISH_STATS": ctm.publish_stats,
+        "RELOAD_CONFIG": lambda: send_json(server, ctm.reload_config()),
+        "WATCH_CONFIG": ctm.watch_config,
     }
 
     server = DefaultServer(
@@ -37,18 +99,56 @@ def main(port: int = 8080, ip: str = "127.0.0.1", loglevel: int = 10):
 
     # initialize to start the socket
     server.init_server()
+    # the server loop runs in this thread
+    apply_policy(get_scheduling_policy(ctm.cfg, "server"), "server")
     # start processing of the server
     server.start_listening()
 
-    # Set stop events, just in case they are not properly set
-    ctm.trigger_stop_event.set()
-    ctm.stop_event.set()
+    # Stop all remaining threads (joined with timeout) and power down
+    ctm.close()
+
+    return 0
+
+
+def main_isolated(port: int, ip: str) -> int:
+    """
+    Run the implant session in a separate process (see ct_bic.isolated), so
+    that the server and the controller do not compete with the SDK callback
+    for the GIL
+    """
+    logger.info("Starting device process")
+    dp = DeviceProcess()
+    dp.start()
+    dp.init_stim_cmds()
+
+    pcommand_map = {
+        "START": dp.start_recording,
+        "STIM": dp.start_stimulation,
+        "STOPSTIM": dp.stop_stimulation,
+        "LISTEN": dp.listen_for_stim_trigger,
+        "STOPLISTEN": dp.stop_listening,
+        "DROPSTATS": lambda: send_json(server, dp.get_drop_stats()),
+        "RECONFIGURE": lambda **kwargs: send_json(
+            server, dp.reconfigure_recording(**kwargs)
+        ),
+        "STATS": lambda: send_json(server, dp.stats()),
+        "QUALITY": lambda: send_json(server, dp.get_signal_quality()),
+        "JITTER": lambda role=None, duration_s=2: send_json(
+            server, dp.measure_jitter(role, float(duration_s))
+        ),
+    }
 
-    # Wait a bit for the threads to be stopped
-    ctm.implant.set_implant_power(False)
-    time.sleep(2)
-    del ctm
+    server = DefaultServer(
+        port,
+        ip=ip,
+        pcommand_map=pcommand_map,
+        name="CorTecServer",
+    )
+    server.init_server()
+    apply_policy(get_scheduling_policy(dp.cfg, "server"), "server")
+    server.start_listening()
 
+    dp.close()
     return 0
 
 
@@ -0,0 +1,440 @@
+# Chunked, compressed archive of recordings with random access. Samples are
+# stored in chunks of `chunk_n` samples, each compressed on its own:
+#   - data: float32 bits XORed with the previous sample (the float analogue
+#     of a delta) and byte shuffled, so that the slowly changing sign and
+#     exponent bytes end up next to each other
+#   - counters: delta to the previous sample
+#   - time stamps: float64 bits XORed with the previous sample
+# and deflated with zlib at a fast level. A sidecar index (<path>.idx, a npy
+# structured array) maps counter and time ranges to the chunk offsets, so
+# reading a few seconds of a long session only touches the chunks needed.
+# Every chunk also carries its own header, so the index can be rebuilt from
+# the data file if a recording was not closed properly.
+#
+# Counters restart with every measurement, e.g. a stop / start or a restart
+# of the watchdog. A counter going back starts a new segment: the writer
+# closes the current chunk, so chunks never span two segments, and the
+# reader finds the segments as chunks starting below the end of the previous
+# one. Counter and time ranges are looked up per segment.
+#
+#   [magic][uint32 header length][json header]
+#   [chunk header][compressed chunk] ...
+#
+# Usage:
+#   python -m ct_bic.archive convert ./data/*.csv
+#   python -m ct_bic.archive info ./data/session.ctbic
+import json
+import struct
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ct_bic.utils.logging import logger
+
+MAGIC = b"CTBICARC"
+VERSION = 1
+SUFFIX = ".ctbic"
+
+# compressed bytes, n samples, first / last counter, first / last time
+CHUNK_HEADER = struct.Struct("<IIqqdd")
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("offset", "<i8"),  # of the chunk header in the data file
+        ("nbytes", "<u4"),  # compressed payload
+        ("n", "<u4"),
+        ("cntr_first", "<i8"),
+        ("cntr_last", "<i8"),
+        ("t_first", "<f8"),
+        ("t_last", "<f8"),
+    ]
+)
+
+
+def index_path(path: Path | str) -> Path:
+    return Path(f"{path}.idx")
+
+
+def write_index(path: Path | str, index: np.ndarray):
+    # via a file object, np.save would append .npy to the name otherwise
+    with open(index_path(path), "wb") as f:
+        np.save(f, index, allow_pickle=False)
+
+
+def encode_chunk(
+    data: np.ndarray, cntr: np.ndarray, t: np.ndarray, level: int = 1
+) -> bytes:
+    """Compress data (n, n_channels) float32, cntr (n,) int64, t (n,) f8"""
+    bits = np.ascontiguousarray(data, dtype=np.float32).view(np.uint32)
+    xored = bits.copy()
+    xored[1:] ^= bits[:-1]
+    # byte shuffle: (n, n_ch, 4) -> (4, n_ch, n)
+    shuffled = xored.view(np.uint8).reshape(*bits.shape, 4).transpose(2, 1, 0)
+
+    d_cntr = np.diff(cntr, prepend=0)
+    t_bits = np.ascontiguousarray(t, dtype=np.float64).view(np.uint64)
+    x_t = t_bits.copy()
+    x_t[1:] ^= t_bits[:-1]
+    raw = b"".join(
+        [
+            np.ascontiguousarray(shuffled).tobytes(),
+            d_cntr.tobytes(),
+            x_t.tobytes(),
+        ]
+    )
+    return zlib.compress(raw, level)
+
+
+def decode_chunk(
+    payload: bytes, n: int, n_channels: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    raw = zlib.decompress(payload)
+    k = n * n_channels * 4
+    shuffled = np.frombuffer(raw, dtype=np.uint8, count=k).reshape(
+        4, n_channels, n
+    )
+    xored = (
+        np.ascontiguousarray(shuffled.transpose(2, 1, 0))
+        .view(np.uint32)
+        .reshape(n, n_channels)
+    )
+    data = np.bitwise_xor.accumulate(xored, axis=0).view(np.float32)
+    cntr = np.cumsum(np.frombuffer(raw, dtype=np.int64, count=n, offset=k))
+    x_t = np.frombuffer(raw, dtype=np.uint64, count=n, offset=k + 8 * n)
+    t = np.bitwise_xor.accumulate(x_t).view(np.float64)
+    return data, cntr, t
+
+
+class ArchiveWriter:
+    """
+    Parameters
+    ----------
+    path : Path | str
+        data file, the index is written to <path>.idx on close
+    n_channels : int
+        number of channels per sample
+    sfreq : float
+        used for time stamps if none are provided, t = cntr / sfreq
+    chunk_n : int
+        samples per chunk, i.e. the granularity of random access
+    level : int
+        zlib compression level, 1 = fastest
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        n_channels: int = 32,
+        sfreq: float = 1000,
+        chunk_n: int = 1000,
+        level: int = 1,
+    ):
+        self.path = Path(path)
+        self.n_channels = n_channels
+        self.sfreq = sfreq
+        self.chunk_n = chunk_n
+        self.level = level
+
+        self._data = np.zeros((chunk_n, n_channels), dtype=np.float32)
+        self._cntr = np.zeros(chunk_n, dtype=np.int64)
+        self._t = np.zeros(chunk_n, dtype=np.float64)
+        self._n = 0
+        self._index: list[tuple] = []
+        self._last_cntr = np.iinfo(np.int64).min
+
+        self.f = open(self.path, "wb")
+        header = json.dumps(
+            {
+                "version": VERSION,
+                "n_channels": n_channels,
+                "sfreq": sfreq,
+                "chunk_n": chunk_n,
+                "codec": "xor_shuffle_zlib",
+            }
+        ).encode()
+        self.f.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def add(
+        self,
+        data: np.ndarray,
+        cntr: np.ndarray | int,
+        t: np.ndarray | None = None,
+    ):
+        """
+        Add samples of shape (n_samples, n_channels) with one counter per
+        sample (a scalar is used for all, as in CTListener packets)
+        """
+        data = np.asarray(data, dtype=np.float32).reshape(-1, self.n_channels)
+        n = len(data)
+        if n == 0:
+            return
+        cntr = np.broadcast_to(np.asarray(cntr, dtype=np.int64), (n,))
+        t = cntr / self.sfreq if t is None else np.asarray(t, dtype=np.float64)
+
+        if cntr[0] >= self._last_cntr and (n == 1 or cntr[-1] >= cntr[0]):
+            # the usual case, a packet continuing the segment
+            self._append(data, cntr, t)
+        else:
+            j = 0
+            for k in np.flatnonzero(
+                np.diff(cntr, prepend=self._last_cntr) < 0
+            ):
+                self._append(data[j:k], cntr[j:k], t[j:k])
+                self.flush()
+                j = k
+            self._append(data[j:], cntr[j:], t[j:])
+        self._last_cntr = int(cntr[-1])
+
+    def _append(self, data: np.ndarray, cntr: np.ndarray, t: np.ndarray):
+        n = len(data)
+        j = 0
+        while j < n:
+            k = min(n - j, self.chunk_n - self._n)
+            self._data[self._n : self._n + k] = data[j : j + k]
+            self._cntr[self._n : self._n + k] = cntr[j : j + k]
+            self._t[self._n : self._n + k] = t[j : j + k]
+            self._n += k
+            j += k
+            if self._n == self.chunk_n:
+                self.flush()
+
+    def process(self, data: np.ndarray, cntr: int):
+        """Entry point for CTListener stages"""
+        self.add(data, cntr)
+
+    def flush(self):
+        if self._n == 0:
+            return
+        n = self._n
+        payload = encode_chunk(
+            self._data[:n], self._cntr[:n], self._t[:n], self.level
+        )
+        entry = (
+            self.f.tell(),
+            len(payload),
+            n,
+            int(self._cntr[0]),
+            int(self._cntr[n - 1]),
+            float(self._t[0]),
+            float(self._t[n - 1]),
+        )
+        self.f.write(CHUNK_HEADER.pack(*entry[1:]) + payload)
+        self._index.append(entry)
+        self._n = 0
+
+    def close(self):
+        if self.f.closed:
+            return
+        self.flush()
+        self.f.close()
+        write_index(self.path, np.array(self._index, dtype=INDEX_DTYPE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_header(f) -> tuple[dict, int]:
+    """Header of an open archive and the offset of the first chunk"""
+    f.seek(0)
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError(f"{f.name} is not a ct_bic archive")
+    (n,) = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(n)), len(MAGIC) + 4 + n
+
+
+def rebuild_index(path: Path | str) -> np.ndarray:
+    """Scan the chunk headers, e.g. of a recording which was not closed"""
+    entries = []
+    with open(path, "rb") as f:
+        _, offset = read_header(f)
+        while True:
+            f.seek(offset)
+            hdr = f.read(CHUNK_HEADER.size)
+            if len(hdr) < CHUNK_HEADER.size:
+                break
+            nbytes, *rest = CHUNK_HEADER.unpack(hdr)
+            if len(f.read(nbytes)) < nbytes:
+                logger.warning(f"Truncated chunk at {offset} in {path}")
+                break
+            entries.append((offset, nbytes, *rest))
+            offset += CHUNK_HEADER.size + nbytes
+
+    index = np.array(entries, dtype=INDEX_DTYPE)
+    write_index(path, index)
+    return index
+
+
+class ArchiveReader:
+    """
+    Random access to an archive by counter or time range. Only the chunks
+    overlapping the requested range are read and decompressed.
+
+    Attributes
+    ----------
+    n_chunks_read : int
+        chunks read since opening, to check the access pattern
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.f = open(self.path, "rb")
+        self.header, _ = read_header(self.f)
+        self.n_channels = self.header["n_channels"]
+
+        ipath = index_path(self.path)
+        if ipath.exists():
+            self.index = np.load(ipath, allow_pickle=False)
+        else:
+            logger.warning(f"No index for {self.path} - rebuilding")
+            self.index = rebuild_index(self.path)
+        self.n_chunks_read = 0
+
+    @property
+    def n_samples(self) -> int:
+        return int(self.index["n"].sum())
+
+    def read_chunk(self, i: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        entry = self.index[i]
+        self.f.seek(int(entry["offset"]) + CHUNK_HEADER.size)
+        payload = self.f.read(int(entry["nbytes"]))
+        self.n_chunks_read += 1
+        return decode_chunk(payload, int(entry["n"]), self.n_channels)
+
+    @property
+    def segments(self) -> np.ndarray:
+        """Segment of each chunk, a new one starts with a counter reset"""
+        idx = self.index
+        return np.concatenate(
+            ([0], np.cumsum(idx["cntr_first"][1:] < idx["cntr_last"][:-1]))
+        )[: len(idx)]
+
+    @property
+    def n_segments(self) -> int:
+        return int(self.segments[-1]) + 1 if len(self.index) else 0
+
+    def _empty(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (
+            np.zeros((0, self.n_channels), dtype=np.float32),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.float64),
+        )
+
+    def _read_range(
+        self,
+        lo: float,
+        hi: float,
+        first: str,
+        last: str,
+        key: int,
+        segment: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        segments = self.segments
+        chunks = []
+        for s in range(self.n_segments) if segment is None else [segment]:
+            # within a segment the chunks are in recording order, so both
+            # columns are sorted
+            j0, j1 = np.searchsorted(segments, [s, s + 1])
+            i0 = j0 + np.searchsorted(self.index[last][j0:j1], lo, "left")
+            i1 = j0 + np.searchsorted(self.index[first][j0:j1], hi, "right")
+            chunks.extend(self.read_chunk(i) for i in range(i0, i1))
+        if not chunks:
+            return self._empty()
+        data, cntr, t = (np.concatenate(x) for x in zip(*chunks))
+        vals = (cntr, t)[key]
+        msk = (vals >= lo) & (vals <= hi)
+        return data[msk], cntr[msk], t[msk]
+
+    def read_cntr(
+        self, cntr_start: int, cntr_stop: int, segment: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (data, cntr, t) of all samples with cntr_start <= cntr <= cntr_stop,
+        of a single segment or of all of them in recording order
+        """
+        return self._read_range(
+            cntr_start, cntr_stop, "cntr_first", "cntr_last", 0, segment
+        )
+
+    def read_time(
+        self, t_start: float, t_stop: float, segment: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(data, cntr, t) of all samples with t_start <= t <= t_stop"""
+        return self._read_range(
+            t_start, t_stop, "t_first", "t_last", 1, segment
+        )
+
+    def read_all(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        chunks = [self.read_chunk(i) for i in range(len(self.index))]
+        if not chunks:
+            return self._empty()
+        return tuple(np.concatenate(x) for x in zip(*chunks))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def csv_to_archive(
+    csv_path: Path | str,
+    out_path: Path | str | None = None,
+    chunk_n: int = 1000,
+    sfreq: float = 1000,
+    csv_chunksize: int = 100_000,
+) -> Path:
+    """Convert a csv written from `buffers_to_df`, read in chunks"""
+    csv_path = Path(csv_path)
+    out_path = (
+        Path(out_path)
+        if out_path is not None
+        else csv_path.with_suffix(SUFFIX)
+    )
+    writer = None
+    for df in pd.read_csv(csv_path, chunksize=csv_chunksize):
+        ch_cols = [c for c in df.columns if c.startswith("Ch_")]
+        if writer is None:
+            writer = ArchiveWriter(
+                out_path, n_channels=len(ch_cols), sfreq=sfreq, chunk_n=chunk_n
+            )
+        writer.add(
+            df[ch_cols].to_numpy(dtype=np.float32),
+            df["cntr"].to_numpy(dtype=np.int64),
+        )
+    if writer is None:
+        raise ValueError(f"{csv_path} is empty")
+    writer.close()
+    return out_path
+
+
+def convert(*paths: str, chunk_n: int = 1000, sfreq: float = 1000):
+    """Convert csv dumps to archives next to them"""
+    for pth in paths:
+        out = csv_to_archive(pth, chunk_n=chunk_n, sfreq=sfreq)
+        ratio = Path(pth).stat().st_size / out.stat().st_size
+        logger.info(f"Converted {pth} -> {out}, {ratio:.1f}x smaller")
+    return 0
+
+
+def info(path: str):
+    with ArchiveReader(path) as rd:
+        print(
+            f"{path}: {rd.header}, {rd.n_samples} samples in"
+            f" {len(rd.index)} chunks, {rd.n_segments} segments"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    from fire import Fire
+
+    Fire({"convert": convert, "info": info})
@@ -0,0 +1,183 @@
+# Blanking of stimulation artifacts in the live data path. Stimulation onsets
+# and offsets are taken from the listener callbacks and mapped to measurement
+# counters, so that a window of `pre_n` samples before and `post_n` samples
+# after each stimulation can be flagged and replaced. As the onset callback
+# arrives after the samples preceding it were received, the output is
+# delayed by `pre_n` samples - and returned with the counters of the delayed
+# samples, which is what downstream stages and sinks store them under.
+import threading
+
+import numpy as np
+
+from ct_bic.utils.logging import logger
+
+BLANKING_MODES = ("mark", "hold", "zero")
+
+
+def split_by_counter(data: np.ndarray, cntr: int | np.ndarray):
+    """
+    Yield (samples, counter) per packet, for stages and sinks which take one
+    counter per call. `cntr` is either the counter of all of `data` or one
+    per sample, as returned by `ArtifactBlanker.process`.
+    """
+    if np.ndim(cntr) == 0:
+        yield data, cntr
+        return
+    if cntr[0] == cntr[-1]:
+        # the usual case - all samples are from one packet
+        yield data, int(cntr[0])
+        return
+    bounds = [0, *(np.flatnonzero(np.diff(cntr)) + 1), len(cntr)]
+    for j, k in zip(bounds[:-1], bounds[1:]):
+        yield data[j:k], int(cntr[j])
+
+
+class ArtifactBlanker:
+    """
+    Parameters
+    ----------
+    pre_n : int
+        samples before a stimulation onset to blank, this is also the delay
+        the blanker adds to the data path
+    post_n : int
+        samples after a stimulation offset (or a finished stimulation
+        function) to blank
+    mode : str
+        "mark" - only set the artifact flag, keep the data
+        "hold" - replace blanked samples with the last clean sample
+        "zero" - replace blanked samples with zeros
+    n_channels : int
+        number of data channels, the output has one more for the flag
+    """
+
+    def __init__(
+        self,
+        pre_n: int = 2,
+        post_n: int = 10,
+        mode: str = "hold",
+        n_channels: int = 32,
+    ):
+        assert pre_n >= 0 and post_n >= 0, "Need pre_n >= 0 and post_n >= 0"
+        assert mode in BLANKING_MODES, f"{mode=} not in {BLANKING_MODES}"
+        self.pre_n = pre_n
+        self.post_n = post_n
+        self.mode = mode
+        self.n_channels = n_channels
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear the delay line and all stimulation intervals"""
+        with self._lock:
+            # [first_cntr, last_cntr] to blank, last is inf while stimulating
+            self.intervals: list[list[float]] = []
+        self.is_stimulating = False
+        self.last_cntr = -1
+        self.n_blanked = 0
+
+        # delay line + new packet, output rows incl. the flag channel
+        self._work = np.zeros(
+            (self.pre_n + 1, self.n_channels + 1), dtype=np.float32
+        )
+        self._work_cntr = np.full(self.pre_n + 1, -1, dtype=np.int64)
+        self._n_filled = 0
+        self._last_clean = np.zeros(self.n_channels, dtype=np.float32)
+
+    def on_stimulation_state_changed(self, is_stimulating: bool):
+        if is_stimulating == self.is_stimulating:
+            return
+        self.is_stimulating = is_stimulating
+        with self._lock:
+            if is_stimulating:
+                # the stimulation affects samples after the last received one
+                self.intervals.append(
+                    [self.last_cntr + 1 - self.pre_n, np.inf]
+                )
+            elif self.intervals:
+                self.intervals[-1][1] = self.last_cntr + self.post_n
+
+    def on_stimulation_function_finished(self, num_executed_functions: int):
+        # extend the post window in case the state callback came earlier
+        with self._lock:
+            if self.intervals and np.isfinite(self.intervals[-1][1]):
+                self.intervals[-1][1] = max(
+                    self.intervals[-1][1], self.last_cntr + self.post_n
+                )
+
+    def process(
+        self, data: np.ndarray, cntr: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pass a packet of shape (n_samples, n_channels) through the delay line
+
+        Returns
+        -------
+        np.ndarray
+            the blanked samples which left the delay line, shape
+            (n_out, n_channels + 1) with the flag (1 = artifact) in the last
+            column. n_out < n_samples during the first `pre_n` samples only.
+        np.ndarray
+            the measurement counters of these samples, shape (n_out,) - i.e.
+            of the packets they arrived with, `pre_n` samples ago
+        """
+        n, p = len(data), self.pre_n
+        if len(self._work) < p + n:
+            self._grow(p + n)
+
+        work = self._work[: p + n]
+        wcntr = self._work_cntr[: p + n]
+        work[p:, : self.n_channels] = data
+        wcntr[p:] = cntr
+        self.last_cntr = cntr
+
+        out = work[:n]
+        ocntr = wcntr[:n]
+        flags = self._get_flags(ocntr)
+        out[:, -1] = flags
+
+        if flags.any():
+            self.n_blanked += int(flags.sum())
+            if self.mode == "zero":
+                out[flags, : self.n_channels] = 0
+            elif self.mode == "hold":
+                # index of the last clean row, -1 -> from the previous packet
+                idx = np.where(flags, -1, np.arange(n))
+                np.maximum.accumulate(idx, out=idx)
+                src = np.vstack([out[:, : self.n_channels], self._last_clean])
+                out[:, : self.n_channels] = src[idx]
+
+        self._last_clean[:] = out[-1, : self.n_channels]
+
+        # samples not yet through the delay line are not returned
+        n_skip = max(0, min(n, p - self._n_filled))
+        self._n_filled += n
+
+        # copy, as the delay line overlaps with the output rows
+        res = out[n_skip:].copy()
+        res_cntr = ocntr[n_skip:].copy()
+        # shift the delay line
+        work[:p] = work[n:]
+        wcntr[:p] = wcntr[n:]
+        return res, res_cntr
+
+    def _grow(self, n: int):
+        work = np.zeros((n, self.n_channels + 1), dtype=np.float32)
+        wcntr = np.full(n, -1, dtype=np.int64)
+        work[: self.pre_n] = self._work[: self.pre_n]
+        wcntr[: self.pre_n] = self._work_cntr[: self.pre_n]
+        self._work, self._work_cntr = work, wcntr
+
+    def _get_flags(self, cntr: np.ndarray) -> np.ndarray:
+        flags = np.zeros(len(cntr), dtype=bool)
+        with self._lock:
+            for lo, hi in self.intervals:
+                flags |= (cntr >= lo) & (cntr <= hi)
+
+            # drop intervals which are completely in the past
+            n_old = len(self.intervals)
+            self.intervals = [iv for iv in self.intervals if iv[1] >= cntr[-1]]
+            if len(self.intervals) < n_old:
+                logger.debug(f"Blanking done up to counter {cntr[-1]}")
+
+        return flags
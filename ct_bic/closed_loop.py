@@ -0,0 +1,187 @@
+# In process closed loop: a biomarker is evaluated on the implant's own data
+# as the packets arrive in the CTListener, and stimulation is started without
+# the round trip through LSL and an external process. The threshold logic is
+# the same as for the LSL controller (see ThresholdControl).
+#
+#   SDK callback thread                        trigger thread
+#   CTListener -> ClosedLoopStage.process  --> callback (start_stimulation)
+#                 biomarker(window) > threshold
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+from ct_bic.controller import ControlParams, ThresholdControl
+from ct_bic.events import EventCode, EventOutlet
+from ct_bic.scheduling import SchedulingPolicy, apply_policy
+from ct_bic.spectral import BandPowerStage
+from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
+
+BIOMARKERS = ("value", "rms", "band_power")
+
+
+def latest_value(channel: int = 0) -> Callable[[np.ndarray], float]:
+    def biomarker(window: np.ndarray) -> float:
+        return float(window[-1, channel])
+
+    return biomarker
+
+
+def rms(channel: int = 0) -> Callable[[np.ndarray], float]:
+    def biomarker(window: np.ndarray) -> float:
+        x = window[:, channel]
+        return float(np.sqrt(np.dot(x, x) / len(x)))
+
+    return biomarker
+
+
+def band_power(
+    features: BandPowerStage, band: str, channel: int = 0
+) -> Callable[[np.ndarray], float]:
+    """Latest band power of a BandPowerStage running before the loop"""
+    i_band = list(features.bands).index(band)
+
+    def biomarker(window: np.ndarray) -> float:
+        return float(features.latest[i_band, channel])
+
+    return biomarker
+
+
+class ClosedLoopStage:
+    """
+    CTListener stage evaluating `biomarker` on the latest `window_n` samples
+    after every packet. If the threshold control fires, the callback is run
+    by a separate trigger thread, so that the SDK callback thread never
+    blocks on the implant.
+
+    Parameters
+    ----------
+    biomarker : Callable[[np.ndarray], float]
+        maps a window of shape (window_n, n_channels) to a scalar
+    callback : Callable
+        e.g. CTManager.start_stimulation
+    params : ControlParams
+        threshold and grace period, the channel is up to the biomarker.
+        Changes of the attributes take effect immediately.
+    window_n : int
+        samples passed to the biomarker
+    n_channels : int
+        number of input channels
+    events : EventOutlet | None
+        FIRING_CALLBACK and CALLBACK_FIRED are pushed here if provided
+    scheduling : SchedulingPolicy | None
+        applied to the trigger thread, which calls the callback
+
+    Attributes
+    ----------
+    latencies_us : deque[float]
+        time from the arrival of the packet which crossed the threshold to
+        the callback being called
+    """
+
+    # part of the control path - keeps running when degraded
+    optional = False
+
+    def __init__(
+        self,
+        biomarker: Callable[[np.ndarray], float],
+        callback: Callable,
+        params: ControlParams | None = None,
+        window_n: int = 1,
+        n_channels: int = 32,
+        events: EventOutlet | None = None,
+        max_history: int = 1000,
+        scheduling: SchedulingPolicy | None = None,
+    ):
+        self.biomarker = biomarker
+        self.callback = callback
+        self.params = params if params is not None else ControlParams()
+        self.control = ThresholdControl(self.params)
+        self.window_n = window_n
+        self.events = events
+        self.scheduling = scheduling
+
+        # mirrored buffer, see BandPowerStage - the window is always a view
+        self._buf = np.zeros((2 * window_n, n_channels), dtype=np.float32)
+        self._i = 0
+        self.latest_value = np.nan
+        self.n_evaluated = 0
+        self.n_fired = 0
+        self.latencies_us: deque[float] = deque(maxlen=max_history)
+
+        self._t_arrival_ns = 0
+        self._trigger = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def add(self, samples: np.ndarray):
+        for s in samples[-self.window_n :]:
+            self._buf[self._i] = s
+            self._buf[self._i + self.window_n] = s
+            self._i = (self._i + 1) % self.window_n
+
+    def process(self, data: np.ndarray, cntr: int):
+        t_arrival_ns = time.perf_counter_ns()
+        self.add(data)
+        window = self._buf[self._i : self._i + self.window_n]
+        self.latest_value = self.biomarker(window)
+        self.n_evaluated += 1
+
+        if self.control.step(self.latest_value, t_arrival_ns * 1e-9):
+            self._t_arrival_ns = t_arrival_ns
+            self._trigger.set()
+
+    def _run(self):
+        logger.debug(f"Closed loop trigger thread running - {self.params=}")
+        if self.scheduling is not None:
+            apply_policy(self.scheduling, "closed loop")
+        while not self.stop_event.is_set():
+            if not self._trigger.wait(0.1):
+                continue
+            self._trigger.clear()
+            if self.events is not None:
+                self.events.add(
+                    EventCode.FIRING_CALLBACK, value=self.latest_value
+                )
+            self.latencies_us.append(
+                (time.perf_counter_ns() - self._t_arrival_ns) * 1e-3
+            )
+            self.callback()
+            self.n_fired += 1
+            if self.events is not None:
+                self.events.add(EventCode.CALLBACK_FIRED)
+                self.events.flush()
+        logger.debug("Closed loop trigger thread stopped")
+
+    def start(self) -> tuple[threading.Thread, threading.Event]:
+        self.stop()
+        self.stop_event.clear()
+        self._trigger.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="closed_loop", daemon=True
+        )
+        self.thread.start()
+        return self.thread, self.stop_event
+
+    def stop(self, timeout: float = 0.5) -> bool:
+        return stop_thread(self.thread, self.stop_event, timeout=timeout)
+
+    def summary(self) -> dict:
+        lat = np.asarray(self.latencies_us, dtype=float)
+        return {
+            "n_evaluated": self.n_evaluated,
+            "n_fired": self.n_fired,
+            "latest_value": float(self.latest_value),
+            "latency_us": (
+                {
+                    "p50": float(np.median(lat)),
+                    "max": float(lat.max()),
+                    "last": float(lat[-1]),
+                }
+                if len(lat)
+                else None
+            ),
+        }
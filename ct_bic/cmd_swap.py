@@ -0,0 +1,235 @@
+# Double buffered update of the stimulation command. The next command is
+# validated ahead of time and kept as pending, so that only the swap itself
+# is left for the moment of the update. While stimulating, the swap is a
+# stop -> enqueue -> start sequence, i.e. the stimulation IS interrupted. It
+# is triggered by the next on_stimulation_function_finished - which reaches
+# Python only after the next function has started, so the stop lands
+# somewhere within that function and can cut it short. The boundary merely
+# bounds when the swap happens, it does not align it. Each swap records:
+#
+#   boundary_to_stop_us  - from the boundary callback to the stop, i.e. how
+#                          far into the next function the stop was issued
+#   gap_us               - from the stop to the return of the start, the
+#                          actual interruption as seen by the host
+#   boundary_to_start_us - both of the above, boundary callback to restart
+#   stim_off_us          - between the state callbacks of the SDK
+#
+#   SDK callback thread                     swap thread
+#   on_stimulation_function_finished  -->   stop, enqueue pending, start
+#   on_stimulation_state_changed      -->   (time stamps of the gap)
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+from ct_bic.scheduling import apply_policy
+from ct_bic.utils.global_setup import pyapi
+from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
+
+
+def validate_stim_cmd(
+    implant: pyapi.implant.Implant,
+    cmd: pyapi.stimulationcommand.StimulationCommand,
+):
+    cmd_check = implant.is_stimulation_command_valid(cmd)
+    # cmd_check will be a tuple with the last element being an ''
+    if not all([e or e == "" for e in cmd_check]):
+        raise ValueError(f"Stim command not valid: {cmd_check=}")
+
+
+class CommandSwapper:
+    """
+    Parameters
+    ----------
+    implant : pyapi.implant.Implant
+        the implant to swap the commands on
+    on_swap : Callable[[StimulationCommand, dict], None] | None
+        called after each swap with the new command and the swap timings,
+        see `swaps`
+    boundary_timeout_s : float
+        swap anyway if no function finishes within this time after the
+        command was prepared
+    max_history : int
+        number of swaps kept in `swaps`
+    """
+
+    def __init__(
+        self,
+        implant: pyapi.implant.Implant,
+        on_swap: Callable | None = None,
+        boundary_timeout_s: float = 1,
+        max_history: int = 1000,
+    ):
+        self.implant = implant
+        self.on_swap = on_swap
+        self.boundary_timeout_s = boundary_timeout_s
+
+        self.is_stimulating = False
+        self.active: pyapi.stimulationcommand.StimulationCommand | None = None
+        self.pending: pyapi.stimulationcommand.StimulationCommand | None = None
+        # one dict of timings per swap in us, see the module header
+        self.swaps: deque[dict] = deque(maxlen=max_history)
+
+        self._lock = threading.Lock()  # one pending command at a time
+        self._boundary = threading.Event()
+        self._t_boundary_ns = 0
+        self._t_stim_off_ns = 0
+        self._in_swap = False
+        # set and cleared under _lock together with `pending`, so that a
+        # command prepared while the worker swaps is picked up by it
+        self._worker_running = False
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    # --- SDK callbacks, forwarded by the CTListener -------------------------
+    def on_stimulation_function_finished(self, num_executed_functions: int):
+        if self.pending is not None:
+            self._t_boundary_ns = time.perf_counter_ns()
+            self._boundary.set()
+
+    def on_stimulation_state_changed(self, is_stimulating: bool):
+        t = time.perf_counter_ns()
+        self.is_stimulating = is_stimulating
+        if not self._in_swap or not self.swaps:
+            return
+        if not is_stimulating:
+            self._t_stim_off_ns = t
+        elif self._t_stim_off_ns:
+            # the state callbacks bracket the actual interruption
+            self.swaps[-1]["stim_off_us"] = (t - self._t_stim_off_ns) * 1e-3
+            self._in_swap = False
+
+    # --- main process side --------------------------------------------------
+    def prepare(self, cmd: pyapi.stimulationcommand.StimulationCommand) -> int:
+        """
+        Validate `cmd` and swap it in once the next function finished, or
+        right away if not stimulating. While stimulating, the swap stops and
+        restarts the stimulation. A command which is still pending is
+        replaced.
+        """
+        validate_stim_cmd(self.implant, cmd)
+        with self._lock:
+            self.pending = cmd
+            if self._worker_running:
+                # also while it stops and restarts the stimulation itself
+                return 0
+            start_worker = self._worker_running = self.is_stimulating
+
+        if not start_worker:
+            self._swap(running=False)
+            return 0
+
+        self._boundary.clear()
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self._wait_and_swap, name="cmd_swap", daemon=True
+        )
+        self.thread.start()
+        return 0
+
+    def _wait_and_swap(self):
+        t0 = time.perf_counter()
+        apply_policy(None, "cmd_swap")
+        while not self.stop_event.is_set():
+            if self._boundary.wait(0.01):
+                self._swap(running=True)
+            elif time.perf_counter() - t0 > self.boundary_timeout_s:
+                logger.warning(
+                    f"No stimulation function finished within"
+                    f" {self.boundary_timeout_s}s - swapping anyway"
+                )
+                self._t_boundary_ns = time.perf_counter_ns()
+                self._swap(running=True, timed_out=True)
+            else:
+                continue
+            with self._lock:
+                # a command prepared during the swap waits for the next
+                # function boundary
+                if self.pending is None:
+                    self._worker_running = False
+                    return
+            t0 = time.perf_counter()
+
+        with self._lock:
+            self._worker_running = False
+
+    def _swap(self, running: bool, timed_out: bool = False):
+        with self._lock:
+            cmd, self.pending = self.pending, None
+        if cmd is None:
+            return
+
+        timing = {
+            "running": running,
+            "timed_out": timed_out,
+            "boundary_to_stop_us": None,
+            "gap_us": None,
+            "boundary_to_start_us": None,
+            "stim_off_us": None,
+        }
+        if running:
+            self._t_stim_off_ns = 0
+            self._in_swap = True
+            self.swaps.append(timing)
+            t_stop = time.perf_counter_ns()
+            self.implant.stop_stimulation()
+
+        self.implant.enqueue_stimulation_command(
+            cmd, pyapi.StimulationMode.STIMMODE_PERSISTENT_CMD_PRELOADING
+        )
+
+        if running:
+            self.implant.start_stimulation()
+            t_start = time.perf_counter_ns()
+            timing["boundary_to_stop_us"] = (
+                t_stop - self._t_boundary_ns
+            ) * 1e-3
+            timing["gap_us"] = (t_start - t_stop) * 1e-3
+            timing["boundary_to_start_us"] = (
+                t_start - self._t_boundary_ns
+            ) * 1e-3
+            self._boundary.clear()
+        else:
+            self.swaps.append(timing)
+
+        self.active = cmd
+        if self.on_swap is not None:
+            self.on_swap(cmd, timing)
+
+    def cancel(self, timeout: float = 0.5):
+        """Drop a pending command and stop waiting for a boundary"""
+        with self._lock:
+            self.pending = None
+        stop_thread(self.thread, self.stop_event, timeout=timeout)
+
+    def summary(self) -> dict:
+        """Gaps of the swaps done while stimulating, in us"""
+        running = [s for s in self.swaps if s["running"]]
+        summary = {
+            "n_swaps": len(self.swaps),
+            "n_running": len(running),
+            "n_timed_out": sum(s["timed_out"] for s in running),
+            "pending": self.pending is not None,
+        }
+        for key in (
+            "boundary_to_stop_us",
+            "gap_us",
+            "boundary_to_start_us",
+            "stim_off_us",
+        ):
+            vals = np.array(
+                [s[key] for s in running if s[key] is not None], dtype=float
+            )
+            summary[key] = (
+                {
+                    "last": float(vals[-1]),
+                    "mean": float(vals.mean()),
+                    "max": float(vals.max()),
+                }
+                if len(vals)
+                else None
+            )
+        return summary
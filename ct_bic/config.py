@@ -0,0 +1,386 @@
+# Loading, validation and hot reloading of ./config/config.toml
+import copy
+import threading
+import tomllib
+from pathlib import Path
+from typing import Callable
+
+from ct_bic.blanking import BLANKING_MODES
+from ct_bic.closed_loop import BIOMARKERS
+from ct_bic.scheduling import (
+    SCHEDULING_ROLES,
+    SchedulingPolicy,
+    apply_policy,
+)
+from ct_bic.sinks import OVERFLOW_POLICIES
+from ct_bic.utils.logging import logger
+
+CONFIG_PATH = Path("./config/config.toml")
+
+
+class ConfigError(ValueError):
+    pass
+
+
+# pyapi.RecordingAmplificationFactor.AMPLIFICATION_<name>
+AMPLIFICATIONS = ("39_5dB", "57_5dB")
+
+# Settings of the LSL outlets in [outlets], push_chunk_n only for "data"
+OUTLET_KEYS = ("max_buffered", "chunk_size")
+
+
+# Expected types per (section, key). Keys not listed here are not validated.
+CONFIG_SCHEMA: dict[tuple[str, str], type | tuple[type, ...]] = {
+    ("lsl", "stream_name"): str,
+    ("lsl", "buffer_size_s"): (int, float),
+    ("stim_control", "stream_name"): str,
+    ("stim_control", "buffer_size_s"): (int, float),
+    ("stim_control", "threshold"): (int, float),
+    ("stim_control", "channel"): int,
+    ("stim_control", "grace_period_s"): (int, float),
+    ("closed_loop", "biomarker"): str,
+    ("closed_loop", "channel"): int,
+    ("closed_loop", "window_s"): (int, float),
+    ("closed_loop", "band"): str,
+    ("closed_loop", "threshold"): (int, float),
+    ("closed_loop", "grace_period_s"): (int, float),
+    ("features", "enabled"): bool,
+    ("features", "stream_name"): str,
+    ("features", "window_s"): (int, float),
+    ("features", "hop_s"): (int, float),
+    ("features", "bands"): dict,
+    ("blanking", "enabled"): bool,
+    ("blanking", "pre_s"): (int, float),
+    ("blanking", "post_s"): (int, float),
+    ("blanking", "mode"): str,
+    ("stats", "enabled"): bool,
+    ("stats", "stream_name"): str,
+    ("stats", "publish_interval_s"): (int, float),
+    ("degradation", "enabled"): bool,
+    ("degradation", "hold_s"): (int, float),
+    ("degradation", "recover_s"): (int, float),
+    ("degradation", "levels"): list,
+    ("outlets", "data"): dict,
+    ("outlets", "features"): dict,
+    ("outlets", "events"): dict,
+    ("outlets", "stats"): dict,
+    ("outlets", "quality"): dict,
+    ("sinks", "queue_n"): int,
+    ("sinks", "policy"): str,
+    ("sinks", "block_timeout_s"): (int, float),
+    ("sinks", "ring_buffer"): bool,
+    ("sinks", "features"): bool,
+    ("watchdog", "enabled"): bool,
+    ("watchdog", "stall_s"): (int, float),
+    ("watchdog", "startup_s"): (int, float),
+    ("watchdog", "check_s"): (int, float),
+    ("watchdog", "auto_restart"): bool,
+    ("watchdog", "max_restarts"): int,
+    ("quality", "enabled"): bool,
+    ("quality", "stream_name"): str,
+    ("quality", "tau_s"): (int, float),
+    ("quality", "publish_interval_s"): (int, float),
+    ("quality", "line_freq"): (int, float),
+    ("quality", "flat_eps"): (int, float),
+    ("quality", "saturation_level"): (int, float),
+    ("quality", "max_flat"): (int, float),
+    ("quality", "max_saturated"): (int, float),
+    ("quality", "max_line_ratio"): (int, float),
+    ("scheduling", "callback"): dict,
+    ("scheduling", "controller"): dict,
+    ("scheduling", "server"): dict,
+    ("scheduling", "probe_interval_s"): (int, float),
+    ("recording", "ref_channels"): list,
+    ("recording", "amplification"): str,
+    ("config_watcher", "poll_s"): (int, float),
+}
+
+
+def validate_config(cfg: dict) -> list[str]:
+    """Return a list of problems found in the config, empty if valid"""
+    errors = []
+    for (section, key), tp in CONFIG_SCHEMA.items():
+        if key not in cfg.get(section, {}):
+            errors.append(f"Missing [{section}] {key}")
+            continue
+
+        val = cfg[section][key]
+        # bool is a subclass of int, but never a valid numeric value
+        if not isinstance(val, tp) or (
+            isinstance(val, bool) and tp is not bool
+        ):
+            errors.append(f"[{section}] {key}={val!r} is not of type {tp}")
+
+    def positive(section, key):
+        val = cfg.get(section, {}).get(key)
+        if isinstance(val, (int, float)) and val <= 0:
+            errors.append(f"[{section}] {key}={val!r} must be > 0")
+
+    positive("lsl", "buffer_size_s")
+    positive("stim_control", "buffer_size_s")
+    positive("config_watcher", "poll_s")
+    positive("closed_loop", "window_s")
+    positive("features", "window_s")
+    positive("features", "hop_s")
+    positive("stats", "publish_interval_s")
+    positive("degradation", "recover_s")
+    positive("sinks", "queue_n")
+    positive("sinks", "block_timeout_s")
+    positive("watchdog", "stall_s")
+    positive("watchdog", "startup_s")
+    positive("watchdog", "check_s")
+    positive("quality", "tau_s")
+    positive("quality", "publish_interval_s")
+    positive("quality", "line_freq")
+    positive("quality", "saturation_level")
+    positive("scheduling", "probe_interval_s")
+
+    policy = cfg.get("sinks", {}).get("policy")
+    if isinstance(policy, str) and policy not in OVERFLOW_POLICIES:
+        errors.append(f"[sinks] {policy=} not in {OVERFLOW_POLICIES}")
+
+    wd = cfg.get("watchdog", {})
+    if isinstance(wd.get("max_restarts"), int) and wd["max_restarts"] < 0:
+        errors.append(
+            f"[watchdog] max_restarts={wd['max_restarts']} must be >= 0"
+        )
+    if isinstance(wd.get("check_s"), (int, float)) and isinstance(
+        wd.get("stall_s"), (int, float)
+    ):
+        if wd["check_s"] > wd["stall_s"]:
+            errors.append("[watchdog] check_s must be <= stall_s")
+
+    qcfg = cfg.get("quality", {})
+    if isinstance(qcfg.get("flat_eps"), (int, float)) and qcfg["flat_eps"] < 0:
+        errors.append(f"[quality] flat_eps={qcfg['flat_eps']!r} must be >= 0")
+    for key in ("max_flat", "max_saturated", "max_line_ratio"):
+        val = qcfg.get(key)
+        if isinstance(val, (int, float)) and not 0 <= val <= 1:
+            errors.append(f"[quality] {key}={val!r} must be in [0, 1]")
+
+    for role in SCHEDULING_ROLES:
+        pol = cfg.get("scheduling", {}).get(role)
+        if not isinstance(pol, dict):
+            continue
+        if not (
+            set(pol) == {"cpus", "nice", "realtime_priority"}
+            and isinstance(pol["cpus"], list)
+            and all(isinstance(c, int) and c >= 0 for c in pol["cpus"])
+            and isinstance(pol["nice"], int)
+            and -20 <= pol["nice"] <= 19
+            and isinstance(pol["realtime_priority"], int)
+            and 0 <= pol["realtime_priority"] <= 99
+        ):
+            errors.append(
+                f"[scheduling] {role}={pol} needs cpus >= 0, nice in"
+                " -20..19 and realtime_priority in 0..99"
+            )
+
+    levels = cfg.get("degradation", {}).get("levels")
+    if isinstance(levels, list):
+        if not levels:
+            errors.append("[degradation] levels must not be empty")
+        for lvl in levels:
+            if not (
+                isinstance(lvl, dict)
+                and {"chunk_n", "stages"}
+                <= set(lvl)
+                <= {"chunk_n", "stages", "paused_sinks"}
+                and isinstance(lvl["chunk_n"], int)
+                and not isinstance(lvl["chunk_n"], bool)
+                and lvl["chunk_n"] > 0
+                and isinstance(lvl["stages"], bool)
+                and isinstance(lvl.get("paused_sinks", []), list)
+                and all(
+                    isinstance(n, str) for n in lvl.get("paused_sinks", [])
+                )
+            ):
+                errors.append(
+                    f"[degradation] level {lvl} needs chunk_n > 0 and stages,"
+                    " optionally a list of paused_sinks"
+                )
+
+    for name, ocfg in cfg.get("outlets", {}).items():
+        if not isinstance(ocfg, dict):
+            continue
+        keys = OUTLET_KEYS + (("push_chunk_n",) if name == "data" else ())
+        if set(ocfg) != set(keys) or not all(
+            isinstance(ocfg[k], int) and not isinstance(ocfg[k], bool)
+            for k in keys
+        ):
+            errors.append(f"[outlets] {name}={ocfg} needs integer {keys}")
+            continue
+        if ocfg["max_buffered"] <= 0 or ocfg["chunk_size"] < 0:
+            errors.append(
+                f"[outlets] {name} needs max_buffered > 0 and chunk_size >= 0"
+            )
+        if ocfg.get("push_chunk_n", 1) <= 0:
+            errors.append(f"[outlets] {name} push_chunk_n must be > 0")
+
+    feat = cfg.get("features", {})
+    if isinstance(feat.get("hop_s"), (int, float)) and isinstance(
+        feat.get("window_s"), (int, float)
+    ):
+        if feat["hop_s"] > feat["window_s"]:
+            errors.append("[features] hop_s must be <= window_s")
+
+    for band, edges in (feat.get("bands") or {}).items():
+        if not (
+            isinstance(edges, list) and len(edges) == 2 and edges[0] < edges[1]
+        ):
+            errors.append(f"[features] bands.{band}={edges} is no [low, high]")
+
+    blk = cfg.get("blanking", {})
+    for key in ("pre_s", "post_s"):
+        if isinstance(blk.get(key), (int, float)) and blk[key] < 0:
+            errors.append(f"[blanking] {key}={blk[key]!r} must be >= 0")
+    if isinstance(blk.get("mode"), str) and blk["mode"] not in BLANKING_MODES:
+        errors.append(
+            f"[blanking] mode={blk['mode']!r} not in {BLANKING_MODES}"
+        )
+
+    ch = cfg.get("stim_control", {}).get("channel")
+    if isinstance(ch, int) and ch < 0:
+        errors.append(f"[stim_control] channel={ch} must be >= 0")
+
+    cl = cfg.get("closed_loop", {})
+    if isinstance(cl.get("biomarker"), str):
+        if cl["biomarker"] not in BIOMARKERS:
+            errors.append(
+                f"[closed_loop] biomarker={cl['biomarker']!r} not in"
+                f" {BIOMARKERS}"
+            )
+        elif cl["biomarker"] == "band_power" and cl.get("band") not in (
+            feat.get("bands") or {}
+        ):
+            errors.append(
+                f"[closed_loop] band={cl.get('band')!r} is not one of the"
+                " [features] bands"
+            )
+    if isinstance(cl.get("channel"), int) and not 0 <= cl["channel"] < 32:
+        errors.append(f"[closed_loop] channel={cl['channel']} not in 0..31")
+
+    refs = cfg.get("recording", {}).get("ref_channels")
+    if isinstance(refs, list) and not all(
+        isinstance(r, int) and 0 <= r < 32 for r in refs
+    ):
+        errors.append(f"[recording] ref_channels={refs} must be within 0..31")
+    amp = cfg.get("recording", {}).get("amplification")
+    if isinstance(amp, str) and amp not in AMPLIFICATIONS:
+        errors.append(f"[recording] {amp=} not in {AMPLIFICATIONS}")
+
+    return errors
+
+
+def get_outlet_params(cfg: dict, name: str) -> dict[str, int]:
+    """Keyword arguments for pylsl.StreamOutlet of the outlet `name`"""
+    return {k: cfg["outlets"][name][k] for k in OUTLET_KEYS}
+
+
+def get_scheduling_policy(cfg: dict, role: str) -> SchedulingPolicy:
+    """Policy of the threads of `role`, one of SCHEDULING_ROLES"""
+    pol = cfg["scheduling"][role]
+    return SchedulingPolicy(
+        cpus=list(pol["cpus"]),
+        nice=pol["nice"],
+        realtime_priority=pol["realtime_priority"],
+    )
+
+
+def load_config(path: Path | str = CONFIG_PATH) -> dict:
+    with open(path, "rb") as f:
+        cfg = tomllib.load(f)
+
+    errors = validate_config(cfg)
+    if errors:
+        raise ConfigError(f"Invalid config {path}: {errors}")
+
+    return cfg
+
+
+def diff_config(old: dict, new: dict) -> dict[tuple[str, str], tuple]:
+    """Changed values as {(section, key): (old_value, new_value)}"""
+    changes = {}
+    for section in old.keys() | new.keys():
+        o = old.get(section, {})
+        n = new.get(section, {})
+        for key in o.keys() | n.keys():
+            if o.get(key) != n.get(key):
+                changes[(section, key)] = (o.get(key), n.get(key))
+    return changes
+
+
+class ConfigWatcher:
+    """
+    Poll the config file for modifications. A modified config is validated
+    and the changes are passed to `apply`, which returns a report of
+    {"section.key": status} describing what could be applied live.
+    Invalid configs are rejected as a whole.
+    """
+
+    def __init__(
+        self,
+        cfg: dict,
+        apply: Callable[[dict[tuple[str, str], tuple], dict], dict[str, str]],
+        path: Path | str = CONFIG_PATH,
+        poll_s: float = 1,
+    ):
+        self.cfg = copy.deepcopy(cfg)
+        self.apply = apply
+        self.path = Path(path)
+        self.poll_s = poll_s
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.last_report: dict[str, str] = {}
+        self._mtime = self._get_mtime()
+
+    def _get_mtime(self) -> int:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def check(self, force: bool = False) -> dict[str, str]:
+        """Reload if the file changed (or if forced) and apply the changes"""
+        mtime = self._get_mtime()
+        if mtime == self._mtime and not force:
+            return {}
+        self._mtime = mtime
+
+        try:
+            new_cfg = load_config(self.path)
+        except (ConfigError, tomllib.TOMLDecodeError, OSError) as err:
+            logger.error(f"Config reload rejected: {err}")
+            self.last_report = {"config": f"rejected: {err}"}
+            return self.last_report
+
+        changes = diff_config(self.cfg, new_cfg)
+        if not changes:
+            return {}
+
+        report = self.apply(changes, new_cfg)
+        for k, status in report.items():
+            logger.info(f"Config change {k}: {status}")
+
+        # Only keep values which are in effect, so that a change which was
+        # not applied is reported again on the next modification
+        for (section, key), (old, new) in changes.items():
+            if report.get(f"{section}.{key}", "").startswith("rejected"):
+                continue
+            self.cfg.setdefault(section, {})[key] = new
+
+        self.last_report = report
+        return report
+
+    def _run(self):
+        apply_policy(None, "config_watcher")
+        while not self.stop_event.wait(self.poll_s):
+            self.check()
+
+    def start(self) -> tuple[threading.Thread, threading.Event]:
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="config_watcher", daemon=True
+        )
+        self.thread.start()
+        return self.thread, self.stop_event
@@ -1,23 +1,58 @@
 import time
 from dareplane_utils.default_server.server import threading
 from dareplane_utils.stream_watcher.lsl_stream_watcher import StreamWatcher
+from ct_bic.events import EventCode, EventOutlet
+from ct_bic.scheduling import SchedulingPolicy, apply_policy
 from ct_bic.utils.logging import logger
+from ct_bic.utils.ringbuffer import get_latest, get_window, join_window
+from ct_bic.utils.threads import wait_for_stream
 
-import pylsl
 
+from dataclasses import dataclass
 from typing import Callable
 import threading
 
 
-def get_marker_outlet():
-    info = pylsl.StreamInfo(
-        name="CTBicControl",
-        type="Markers",
-        channel_count=1,
-        nominal_srate=pylsl.IRREGULAR_RATE,
-        channel_format="string",
-    )
-    return pylsl.StreamOutlet(info)
+@dataclass
+class ControlParams:
+    """
+    Parameters of the threshold control. The controller reads them on every
+    evaluation, so changing the attributes of a running controller's params
+    takes effect immediately.
+    """
+
+    threshold: float = 128
+    channel: int = 0
+    grace_period_s: float = 1.5
+
+
+class ThresholdControl:
+    """
+    The threshold logic of all controllers - `threshold_single_control`,
+    ClosedLoopStage and replays - evaluated step-wise on a given time base.
+    Fires if the value exceeds the threshold, then waits until the grace
+    period has passed and the value dropped below the threshold again.
+    """
+
+    def __init__(self, params: ControlParams):
+        self.params = params
+        self.t_fired: float | None = None  # None -> listening
+
+    def step(self, value: float, t_s: float) -> bool:
+        """Evaluate a new value at time t_s, return True if firing"""
+        if self.t_fired is not None:
+            if (
+                t_s - self.t_fired > self.params.grace_period_s
+                and value < self.params.threshold
+            ):
+                self.t_fired = None
+            return False
+
+        if value > self.params.threshold:
+            self.t_fired = t_s
+            return True
+
+        return False
 
 
 def threshold_single_control(
@@ -28,58 +63,70 @@ def threshold_single_control(
     channel: int = 0,
     dt_s: float = 0.0002,
     grace_period_s: float = 1.5,  # the device seems rather slow after a stimulation was trigggered -> have a larger grace period
+    params: ControlParams | None = None,
+    events: EventOutlet | None = None,
+    scheduling: SchedulingPolicy | None = None,
 ):
     """
     Single threshold control which will fire the callback if value is above
     threshold for the specified channel at the last position in the
-    StreamWatchers buffer
+    StreamWatchers buffer. If `params` are provided, they take precedence
+    over threshold, channel and grace_period_s and can be changed while the
+    controller is running. Events are pushed to `events`, or to a new event
+    outlet if None (see ct_bic.events). The `scheduling` policy is applied
+    to the calling thread.
     """
-    moutlet = get_marker_outlet()
+    if scheduling is not None:
+        apply_policy(scheduling, "threshold control")
+
+    if params is None:
+        params = ControlParams(threshold, channel, grace_period_s)
 
-    logger.debug(f"Starting threshold control - {grace_period_s=}")
+    if events is None:
+        events = EventOutlet()
+
+    logger.debug(f"Starting threshold control - {params=}")
     # Connecting has to happen here - so that only the sub thread waits for the
     # LSL stream and not the main
-    if not stop_event.is_set():
-        sw.connect_to_stream()
-
-    i = 0
+    if not wait_for_stream(sw.name, stop_event):
+        logger.debug("Threshold control stopped before stream was found")
+        return
+    sw.connect_to_stream()
+    events.push(EventCode.LISTENING, channel=params.channel)
 
-    t0 = time.time_ns()
+    control = ThresholdControl(params)
     while not stop_event.is_set():
-        if time.time_ns() - t0 > dt_s * 1e9:
-            sw.update()
-            lastn = sw.unfold_buffer()[-10:, channel]
-            cval = lastn[-1]
-            t0 = time.time_ns()
-            time.sleep(0.001)
-
-            if cval > threshold:
-                t0 = time.time_ns()
-                logger.debug(
-                    f"Threshold control firing callback: {lastn=} -{callback}"
-                )
-                moutlet.push_sample(["firing_callback"])
-                callback()
-                t_gp = time.time_ns()
-                moutlet.push_sample(["callback_fired"])
-
-                # now wait for the grace period to pass by
-                dtt = time.time_ns() - t_gp
-                while not (dtt > grace_period_s * 1e9 and cval < threshold):
-                    dtt = time.time_ns() - t_gp
-
-                    # grab new data with the same frequency to be able to evaluate
-                    # the second condition in the why statement
-                    if dtt > dt_s * 1e9:
-                        sw.update()
-                        cval = sw.unfold_buffer()[-1:, channel]
-                        t0 = time.time_ns()
-                        time.sleep(0.001)
-
-                    pass
-
-
-                moutlet.push_sample(["listening"])
-                logger.debug("Grace period passed - looking for control again")
-
+        sw.update()
+        cval = get_latest(sw.ring_buffer, params.channel)
+        in_grace_period = control.t_fired is not None
+
+        if control.step(cval, time.perf_counter()):
+            lastn = join_window(get_window(sw.ring_buffer, 10)[0])[
+                :, params.channel
+            ]
+            logger.debug(
+                f"Threshold control firing callback: {lastn=} -{callback}"
+            )
+            # only stamped here, pushed together after the callback
+            events.add(
+                EventCode.FIRING_CALLBACK, value=cval, channel=params.channel
+            )
+            callback()
+            # the device seems rather slow after a stimulation was triggered,
+            # so the grace period starts once the callback returned
+            control.t_fired = time.perf_counter()
+            events.add(EventCode.CALLBACK_FIRED, channel=params.channel)
+            events.flush()
+
+        elif in_grace_period and control.t_fired is None:
+            events.push(
+                EventCode.LISTENING, value=cval, channel=params.channel
+            )
+            logger.debug("Grace period passed - looking for control again")
+
+        # grab new data with about the rate of the stream
+        time.sleep(max(dt_s, 0.001))
+
+    sw.disconnect()
+    events.push(EventCode.CONTROLLER_STOPPED, channel=params.channel)
     logger.debug("Threshold control done")
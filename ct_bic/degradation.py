@@ -0,0 +1,115 @@
+# Adaptive degradation of the listener's work load. Every
+# on_data_processing_too_slow from the SDK escalates to the next level, which
+# pushes larger chunks to the outlet, pauses the optional processing stages
+# and / or pauses named sinks - which do not receive the packets while
+# paused, e.g. an archive then has a gap in its counters. Without further too
+# slow events, levels are stepped back down one at a time. Pushing the raw
+# data is never skipped.
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from ct_bic.utils.logging import logger
+
+
+@dataclass
+class DegradationLevel:
+    chunk_n: int = 1  # samples per push to the outlet
+    stages: bool = True  # run the optional processing stages
+    # names of sinks which do not get packets, see SinkRegistry
+    paused_sinks: list[str] = field(default_factory=list)
+
+
+DEFAULT_LEVELS = [
+    DegradationLevel(chunk_n=1, stages=True),
+    DegradationLevel(chunk_n=10, stages=True),
+    DegradationLevel(chunk_n=10, stages=False),
+    DegradationLevel(chunk_n=50, stages=False, paused_sinks=["features"]),
+]
+
+
+class DegradationPolicy:
+    """
+    Parameters
+    ----------
+    levels : list[DegradationLevel]
+        ordered from normal operation (index 0) to most degraded
+    hold_s : float
+        minimal time between two escalations, as the SDK can report a
+        burst of too slow events for a single overload
+    recover_s : float
+        time without too slow events before stepping one level down
+    on_change : Callable[[int, int], None] | None
+        called with (old_level, new_level) on every transition
+    check_every : int
+        packets between two checks for recovery, to keep the clock out of
+        the per packet path
+    """
+
+    def __init__(
+        self,
+        levels: list[DegradationLevel] = DEFAULT_LEVELS,
+        hold_s: float = 1,
+        recover_s: float = 10,
+        on_change: Callable[[int, int], None] | None = None,
+        check_every: int = 100,
+    ):
+        assert len(levels) > 0, "Need at least one level"
+        self.levels = list(levels)
+        self.hold_s = hold_s
+        self.recover_s = recover_s
+        self.on_change = on_change
+        self.check_every = check_every
+
+        self.level = 0
+        self.n_transitions = 0
+        self._t_last_change = float("-inf")
+        self._t_last_slow = float("-inf")
+        self._n_packets = 0
+        self._apply()
+
+    def _apply(self):
+        # plain attributes, read by the listener on every packet
+        lvl = self.levels[self.level]
+        self.chunk_n = lvl.chunk_n
+        self.stages = lvl.stages
+        self.paused_sinks = frozenset(lvl.paused_sinks)
+
+    def _set_level(self, level: int, t: float):
+        old = self.level
+        self.level = level
+        self._t_last_change = t
+        self.n_transitions += 1
+        self._apply()
+        logger.warning(
+            f"Degradation level {old} -> {level}: {self.levels[level]}"
+        )
+        if self.on_change is not None:
+            self.on_change(old, level)
+
+    def too_slow(self):
+        """Called from on_data_processing_too_slow"""
+        t = time.monotonic()
+        self._t_last_slow = t
+        if (
+            self.level < len(self.levels) - 1
+            and t - self._t_last_change > self.hold_s
+        ):
+            self._set_level(self.level + 1, t)
+
+    def tick(self):
+        """Called for every packet, steps down if the load is gone"""
+        self._n_packets += 1
+        if self.level == 0 or self._n_packets % self.check_every:
+            return
+
+        t = time.monotonic()
+        if (
+            t - self._t_last_slow > self.recover_s
+            and t - self._t_last_change > self.recover_s
+        ):
+            self._set_level(self.level - 1, t)
+
+    def reset(self):
+        if self.level != 0:
+            self._set_level(0, time.monotonic())
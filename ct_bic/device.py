@@ -1,6 +1,16 @@
 import contextlib
+from dataclasses import dataclass
+
+import pylsl
+
+from ct_bic.cmd_swap import CommandSwapper
+from ct_bic.listener import CTListener
+from ct_bic.quality import SignalQualityStage
+from ct_bic.sinks import SinkRegistry
+from ct_bic.spectral import BandPowerStage
 from ct_bic.utils.global_setup import pyapi, log_file_name, enable_log
 from ct_bic.utils.logging import logger
+from ct_bic.watchdog import DataWatchdog
 
 
 @contextlib.contextmanager
@@ -34,3 +44,28 @@ def get_device() -> pyapi.implant.Implant:
         except RuntimeError:
             logger.debug("Measurement already stopped")
         implant.set_implant_power(False)
+
+
+@dataclass
+class CTDevice:
+    """
+    Everything belonging to a single external unit / implant. Each device
+    has its own listener, ring buffer and outlet, so that the SDK callback
+    threads of different devices do not share any state.
+    """
+
+    device_id: str
+    ext_unit_info: pyapi.externalunitinfo.ExternalUnitInfo
+    implant_info: pyapi.implantinfo.ImplantInfo
+    implant: pyapi.implant.Implant
+    listener: CTListener | None = None
+    outlet: pylsl.StreamOutlet | None = None
+    stream_info: pylsl.StreamInfo | None = None
+    cmds: pyapi.stimulationcommand.StimulationCommand | None = None
+    cmd_key: int = -1  # incremented whenever new cmds are enqueued
+    features: BandPowerStage | None = None
+    swapper: CommandSwapper | None = None  # see CTManager.swap_stim_cmds
+    watchdog: DataWatchdog | None = None  # see CTManager.start_recording
+    sinks: SinkRegistry | None = None  # see CTManager.add_sink
+    quality: SignalQualityStage | None = None  # see get_signal_quality
+    is_recording: bool = False  # between start_recording and stop_recording
@@ -0,0 +1,169 @@
+# Incremental statistics on dropped packets, derived from the measurement
+# counter. Counters can be fed one by one (from CTListener.on_data) or in
+# chunks (offline analysis of recordings), memory use does not depend on the
+# length of the recording - apart from one entry per time window.
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class DropStats:
+    """
+    Parameters
+    ----------
+    window_s : float
+        length of the time windows for which drop rates are reported
+    sfreq : float
+        nominal packet rate, used to map counters to time windows
+    max_gap : int
+        gaps of `max_gap` or more packets share the last histogram bin
+    """
+
+    def __init__(
+        self, window_s: float = 1.0, sfreq: float = 1000, max_gap: int = 1000
+    ):
+        self.window_n = int(window_s * sfreq)  # counter ticks per window
+        self.window_s = window_s
+        self.max_gap = max_gap
+        self.reset()
+
+    def reset(self):
+        self.hist = np.zeros(self.max_gap + 1, dtype=np.int64)
+        self.first_cntr: int | None = None
+        self.last_cntr: int | None = None
+        self.n_received = 0
+        self.n_dropped = 0
+        self.n_resets = 0  # counter went backwards, e.g. measurement restart
+        self.longest_gap = 0
+        self.longest_gap_at = -1  # counter value after the longest gap
+        # received and dropped packets per time window
+        self.win_received = np.zeros(64, dtype=np.int64)
+        self.win_dropped = np.zeros(64, dtype=np.int64)
+        self.n_windows = 0
+
+    def _ensure_windows(self, i_max: int):
+        if i_max >= len(self.win_received):
+            n = max(i_max + 1, 2 * len(self.win_received))
+            self.win_received = np.resize(self.win_received, n)
+            self.win_dropped = np.resize(self.win_dropped, n)
+            self.win_received[self.n_windows :] = 0
+            self.win_dropped[self.n_windows :] = 0
+        self.n_windows = max(self.n_windows, i_max + 1)
+
+    def add(self, cntr: int):
+        """Add a single counter - scalar fast path for the callback thread"""
+        if self.last_cntr is None:
+            self.first_cntr = cntr
+        else:
+            gap = cntr - self.last_cntr - 1
+            if gap < 0:
+                self.n_resets += 1
+            elif gap > 0:
+                self.hist[min(gap, self.max_gap)] += 1
+                self.n_dropped += gap
+                if gap > self.longest_gap:
+                    self.longest_gap = gap
+                    self.longest_gap_at = cntr
+
+        i_win = max(cntr - self.first_cntr, 0) // self.window_n
+        self._ensure_windows(i_win)
+        self.win_received[i_win] += 1
+        if self.last_cntr is not None and cntr - self.last_cntr > 1:
+            self.win_dropped[i_win] += cntr - self.last_cntr - 1
+
+        self.last_cntr = cntr
+        self.n_received += 1
+
+    def update(self, cntr: np.ndarray | list[int]):
+        """Add a chunk of counters - vectorized"""
+        cntr = np.asarray(cntr, dtype=np.int64)
+        if len(cntr) == 0:
+            return
+
+        if self.last_cntr is None:
+            self.first_cntr = int(cntr[0])
+            prev = cntr[0] - 1
+        else:
+            prev = self.last_cntr
+
+        gaps = np.diff(cntr, prepend=prev) - 1
+        self.n_resets += int((gaps < 0).sum())
+        gaps = np.maximum(gaps, 0)
+
+        pos = gaps > 0
+        if pos.any():
+            g = gaps[pos]
+            self.hist += np.bincount(
+                np.minimum(g, self.max_gap), minlength=self.max_gap + 1
+            )
+            self.n_dropped += int(g.sum())
+            i_max = int(np.argmax(gaps))
+            if gaps[i_max] > self.longest_gap:
+                self.longest_gap = int(gaps[i_max])
+                self.longest_gap_at = int(cntr[i_max])
+
+        i_win = np.maximum(cntr - self.first_cntr, 0) // self.window_n
+        self._ensure_windows(int(i_win.max()))
+        self.win_received[: self.n_windows] += np.bincount(
+            i_win, minlength=self.n_windows
+        )[: self.n_windows]
+        self.win_dropped[: self.n_windows] += np.bincount(
+            i_win, weights=gaps, minlength=self.n_windows
+        )[: self.n_windows].astype(np.int64)
+
+        self.last_cntr = int(cntr[-1])
+        self.n_received += len(cntr)
+
+    @property
+    def drop_rate(self) -> float:
+        n = self.n_received + self.n_dropped
+        return self.n_dropped / n if n else 0.0
+
+    def window_drop_rates(self) -> np.ndarray:
+        rec = self.win_received[: self.n_windows]
+        drp = self.win_dropped[: self.n_windows]
+        tot = rec + drp
+        return np.divide(
+            drp, tot, out=np.zeros(len(tot), dtype=np.float64), where=tot > 0
+        )
+
+    def summary(self, with_windows: bool = False) -> dict:
+        nz = np.nonzero(self.hist)[0]
+        summary = {
+            "n_received": self.n_received,
+            "n_dropped": self.n_dropped,
+            "drop_rate": self.drop_rate,
+            "n_gaps": int(self.hist.sum()),
+            "n_resets": self.n_resets,
+            "longest_gap": self.longest_gap,
+            "longest_gap_at_cntr": self.longest_gap_at,
+            # {gap_size: n_occurrences}, last bin is >= max_gap
+            "gap_histogram": {int(i): int(self.hist[i]) for i in nz},
+            "window_s": self.window_s,
+            "max_window_drop_rate": (
+                float(self.window_drop_rates().max())
+                if self.n_windows
+                else 0.0
+            ),
+        }
+        if with_windows:
+            summary["window_drop_rates"] = self.window_drop_rates().tolist()
+        return summary
+
+    def to_json(self, path: Path | str, with_windows: bool = True):
+        Path(path).write_text(json.dumps(self.summary(with_windows), indent=2))
+
+
+def drop_stats_from_file(
+    path: Path | str,
+    chunksize: int = 1_000_000,
+    window_s: float = 1.0,
+    sfreq: float = 1000,
+) -> DropStats:
+    """Drop statistics of a recording csv (see buffers_to_df), read in chunks"""
+    ds = DropStats(window_s=window_s, sfreq=sfreq)
+    for chunk in pd.read_csv(path, usecols=["cntr"], chunksize=chunksize):
+        ds.update(chunk["cntr"].to_numpy())
+    return ds
@@ -0,0 +1,144 @@
+# Structured numeric events of the control path. Each event is a sample of
+# [code, value, channel, cmd_key] on an irregular rate LSL stream, time
+# stamped with the local_clock() at the time the event happened (not when it
+# was pushed). The code table is published in the stream's metadata.
+import threading
+from enum import IntEnum
+
+import numpy as np
+import pylsl
+
+EVENT_STREAM_NAME = "CTBicEvents"
+EVENT_CHANNELS = ["code", "value", "channel", "cmd_key"]
+
+
+class EventCode(IntEnum):
+    LISTENING = 1
+    FIRING_CALLBACK = 2
+    CALLBACK_FIRED = 3
+    CONTROLLER_STOPPED = 4
+    STIM_START = 10
+    STIM_STOP = 11
+    STIM_CMD_SWAP = 12  # value = us the stimulation was stopped for a swap
+    DEGRADATION_LEVEL = 20  # value = new level
+    DATA_STALL = 30  # value = ms from the last packet to the detection
+    DATA_RECOVERED = 31  # value = ms from the detection to the next packet
+    RECORDING_RECONFIGURED = 32  # value = ms without packets
+
+
+def get_event_outlet(
+    stream_name: str = EVENT_STREAM_NAME,
+    source_id: str | None = None,
+    max_buffered: int = 360,
+    chunk_size: int = 0,
+) -> pylsl.StreamOutlet:
+    info = pylsl.StreamInfo(
+        name=stream_name,
+        type="Events",
+        channel_count=len(EVENT_CHANNELS),
+        nominal_srate=pylsl.IRREGULAR_RATE,
+        channel_format="double64",
+        source_id=source_id if source_id is not None else f"{stream_name}_id",
+    )
+    chns = info.desc().append_child("channels")
+    for ch in EVENT_CHANNELS:
+        chns.append_child("channel").append_child_value("label", ch)
+
+    codes = info.desc().append_child("event_codes")
+    for code in EventCode:
+        ev = codes.append_child("event")
+        ev.append_child_value("code", str(int(code)))
+        ev.append_child_value("name", code.name)
+
+    return pylsl.StreamOutlet(
+        info, chunk_size=chunk_size, max_buffered=max_buffered
+    )
+
+
+def get_event_codes(info: pylsl.StreamInfo) -> dict[int, str]:
+    """Read the code table from the metadata of a resolved event stream"""
+    codes = {}
+    ev = info.desc().child("event_codes").child("event")
+    while not ev.empty():
+        codes[int(ev.child_value("code"))] = ev.child_value("name")
+        ev = ev.next_sibling("event")
+    return codes
+
+
+class EventOutlet:
+    """
+    Collect events with their time stamps and push them in batches. Adding an
+    event only writes to a preallocated array, so it is cheap enough to be
+    used right before time critical calls like starting a stimulation -
+    `flush` afterwards. Can be shared between threads.
+
+    Parameters
+    ----------
+    outlet : pylsl.StreamOutlet | None
+        if None, an outlet is created with `get_event_outlet`
+    max_batch : int
+        events kept before a flush is forced
+    """
+
+    def __init__(
+        self, outlet: pylsl.StreamOutlet | None = None, max_batch: int = 64
+    ):
+        self.outlet = outlet if outlet is not None else get_event_outlet()
+        self._rows = np.zeros((max_batch, len(EVENT_CHANNELS)))
+        self._ts = np.zeros(max_batch)
+        self._n = 0
+        self.n_pushed = 0
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        code: EventCode,
+        value: float = np.nan,
+        channel: int = -1,
+        cmd_key: int = -1,
+        t: float | None = None,
+    ):
+        t = pylsl.local_clock() if t is None else t
+        with self._lock:
+            if self._n == len(self._rows):
+                self._flush()
+            self._rows[self._n] = (code, value, channel, cmd_key)
+            self._ts[self._n] = t
+            self._n += 1
+
+    def flush(self) -> int:
+        """Push all collected events as a single chunk"""
+        with self._lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        n = self._n
+        if n:
+            self.outlet.push_chunk(self._rows[:n], self._ts[:n].tolist())
+            self._n = 0
+            self.n_pushed += n
+        return n
+
+    @property
+    def n_pending(self) -> int:
+        """Events added but not yet pushed"""
+        return self._n
+
+    def push(self, code: EventCode, **kwargs):
+        """Add a single event and push it immediately"""
+        self.add(code, **kwargs)
+        self.flush()
+
+
+def event_locked_indices(
+    t_data: np.ndarray, t_events: np.ndarray, pre_n: int, post_n: int
+) -> np.ndarray:
+    """
+    Indices into data with time stamps `t_data` (sorted) for epochs from
+    `pre_n` samples before to `post_n` samples after each event. Returns an
+    array of shape (n_events, pre_n + post_n), epochs exceeding the data are
+    dropped.
+    """
+    i_ev = np.searchsorted(t_data, t_events)
+    i_ev = i_ev[(i_ev >= pre_n) & (i_ev + post_n <= len(t_data))]
+    return i_ev[:, None] + np.arange(-pre_n, post_n)[None, :]
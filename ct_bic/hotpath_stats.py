@@ -0,0 +1,131 @@
+# Counters for the SDK callback (hot) path. Recording a callback is a few
+# integer operations, if disabled the listener only checks for None. The
+# summaries are computed on request from the reading thread, with the rates
+# since the previous summary of the same consumer - so that e.g. a manual
+# STATS request does not shorten the window of the periodic publisher.
+import json
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pylsl
+
+from ct_bic.scheduling import apply_policy
+from ct_bic.utils.logging import logger
+
+# callback durations are binned by powers of two in microseconds,
+# i.e. bin i holds durations in [2**(i-1), 2**i) us, bin 0 is < 1us
+N_DURATION_BINS = 24
+
+
+class HotPathStats:
+    """
+    Attributes
+    ----------
+    duration_hist : np.ndarray
+        number of callbacks per duration bin (see N_DURATION_BINS)
+    n_packets : int
+        number of on_data callbacks
+    n_samples : int
+        number of samples in these callbacks
+    n_too_slow : int
+        number of on_data_processing_too_slow events from the SDK
+    max_duration_ns : int
+        longest callback so far
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.duration_hist = np.zeros(N_DURATION_BINS, dtype=np.int64)
+        self.n_packets = 0
+        self.n_samples = 0
+        self.n_too_slow = 0
+        self.max_duration_ns = 0
+        self.t_start = time.perf_counter()
+        # {consumer: (time, n_packets, n_samples)} of its last summary, for
+        # the rates since then
+        self._last: dict[str, tuple[float, int, int]] = {}
+
+    def record(self, dt_ns: int, n_samples: int):
+        """Called from the callback thread after every on_data"""
+        self.duration_hist[
+            min((dt_ns // 1000).bit_length(), N_DURATION_BINS - 1)
+        ] += 1
+        self.n_packets += 1
+        self.n_samples += n_samples
+        if dt_ns > self.max_duration_ns:
+            self.max_duration_ns = dt_ns
+
+    def too_slow(self):
+        self.n_too_slow += 1
+
+    def duration_percentile_us(self, q: float) -> float:
+        """Upper bin edge of the q-th percentile (0..100) of durations"""
+        cs = np.cumsum(self.duration_hist)
+        if cs[-1] == 0:
+            return 0.0
+        i = int(np.searchsorted(cs, q / 100 * cs[-1]))
+        return float(2**i)
+
+    def summary(self, consumer: str = "default") -> dict:
+        """Rates are since the last summary for the same `consumer`"""
+        t = time.perf_counter()
+        t_last, n_packets_last, n_samples_last = self._last.get(
+            consumer, (self.t_start, 0, 0)
+        )
+        dt = t - t_last
+        n_packets, n_samples = self.n_packets, self.n_samples
+        summary = {
+            "n_packets": n_packets,
+            "n_samples": n_samples,
+            "n_too_slow": self.n_too_slow,
+            # rates since the last summary
+            "packets_per_s": (n_packets - n_packets_last) / dt,
+            "samples_per_s": (n_samples - n_samples_last) / dt,
+            "callback_p50_us": self.duration_percentile_us(50),
+            "callback_p99_us": self.duration_percentile_us(99),
+            "callback_max_us": self.max_duration_ns / 1000,
+            # {upper bin edge in us: n_callbacks}
+            "callback_hist_us": {
+                int(2**i): int(n)
+                for i, n in enumerate(self.duration_hist)
+                if n
+            },
+        }
+        self._last[consumer] = (t, n_packets, n_samples)
+        return summary
+
+
+def get_stats_outlet(
+    stream_name: str = "ct_bic_stats",
+    max_buffered: int = 360,
+    chunk_size: int = 0,
+) -> pylsl.StreamOutlet:
+    info = pylsl.StreamInfo(
+        name=stream_name,
+        type="Stats",
+        channel_count=1,
+        nominal_srate=pylsl.IRREGULAR_RATE,
+        channel_format="string",
+        source_id=f"{stream_name}_id",
+    )
+    return pylsl.StreamOutlet(
+        info, chunk_size=chunk_size, max_buffered=max_buffered
+    )
+
+
+def publish_stats(
+    get_stats: Callable[[], dict],
+    stop_event: threading.Event,
+    outlet: pylsl.StreamOutlet,
+    interval_s: float = 10,
+):
+    """Push the stats as a json string every `interval_s` seconds"""
+    apply_policy(None, "stats")
+    while not stop_event.wait(interval_s):
+        stats = get_stats()
+        outlet.push_sample([json.dumps(stats)])
+        logger.debug(f"Published stats: {stats}")
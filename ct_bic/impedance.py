@@ -0,0 +1,208 @@
+# Impedance measurements in background workers. The SDK measures one channel
+# per `implant.calculate_impedance(i)` call and blocks for the duration of it,
+# so each device gets its own worker thread -> devices are swept in parallel,
+# channels of a single device are swept sequentially.
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from ct_bic.scheduling import apply_policy
+from ct_bic.utils.global_setup import pyapi
+from ct_bic.utils.logging import logger
+
+
+@dataclass
+class ImpedanceSweep:
+    """Results of a single sweep, filled channel by channel"""
+
+    device_id: str
+    channels: list[int]
+    impedances: dict[int, float] = field(default_factory=dict)
+    t_start: float = field(default_factory=time.time)
+    t_end: float | None = None
+    error: str = ""
+
+    @property
+    def is_complete(self) -> bool:
+        return self.t_end is not None
+
+    def to_dict(self) -> dict:
+        return {
+            "device_id": self.device_id,
+            "channels": list(self.channels),
+            # json keys need to be str
+            "impedances": {str(k): v for k, v in self.impedances.items()},
+            "t_start": self.t_start,
+            "t_end": self.t_end,
+            "is_complete": self.is_complete,
+            "error": self.error,
+        }
+
+
+class ImpedanceCache:
+    """
+    Latest sweep per device. Reads never wait for a running sweep, they get
+    the (potentially partial) results which are available at that time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sweeps: dict[str, ImpedanceSweep] = {}
+
+    def set(self, sweep: ImpedanceSweep):
+        with self._lock:
+            self._sweeps[sweep.device_id] = sweep
+
+    def update(self, device_id: str, channel: int, value: float):
+        with self._lock:
+            self._sweeps[device_id].impedances[channel] = value
+
+    def finish(self, device_id: str, error: str = ""):
+        with self._lock:
+            self._sweeps[device_id].t_end = time.time()
+            self._sweeps[device_id].error = error
+
+    def get(self, device_id: str | None = None) -> dict:
+        """Snapshot of the cache as dict, for all devices if device_id is None"""
+        with self._lock:
+            if device_id is not None:
+                sweep = self._sweeps.get(device_id)
+                return {device_id: sweep.to_dict() if sweep else None}
+            return {k: v.to_dict() for k, v in self._sweeps.items()}
+
+
+class ImpedanceSweeper:
+    """
+    Background worker running impedance sweeps for a single implant, over
+    `n_channels` if no channels are requested - see CTDevice.implant_info
+    """
+
+    def __init__(
+        self,
+        implant: pyapi.implant.Implant,
+        device_id: str,
+        cache: ImpedanceCache,
+        is_busy: Callable[[], bool] = lambda: False,
+        n_channels: int = 32,
+    ):
+        self.implant = implant
+        self.device_id = device_id
+        self.cache = cache
+        self.n_channels = n_channels
+        # sweeps are not started while this returns True, e.g. during a
+        # recording - the request stays queued until the device is free
+        self.is_busy = is_busy
+
+        self.requests: queue.Queue = queue.Queue()
+        self.stop_event = threading.Event()
+        # guards idle_event against requests arriving while a sweep finishes
+        self._idle_lock = threading.Lock()
+        self.idle_event = threading.Event()
+        self.idle_event.set()
+        self.thread: threading.Thread | None = None
+
+    def request_sweep(self, channels: list[int] | None = None) -> int:
+        """Queue a sweep and return immediately"""
+        if channels is None:
+            channels = list(range(self.n_channels))
+
+        with self._idle_lock:
+            self.idle_event.clear()
+            self.requests.put(channels)
+        self.start()
+        return 0
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self._run, name=f"impedance_{self.device_id}", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        """
+        Stop after the channel currently measured (the SDK call cannot be
+        interrupted)
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            if self.thread.is_alive():
+                logger.warning(
+                    f"Impedance worker {self.device_id} did not stop within"
+                    f" {timeout=}s"
+                )
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until all queued sweeps are done"""
+        return self.idle_event.wait(timeout=timeout)
+
+    def _run(self):
+        apply_policy(None, f"impedance {self.device_id}")
+        while not self.stop_event.is_set():
+            try:
+                channels = self.requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            while self.is_busy() and not self.stop_event.is_set():
+                time.sleep(0.05)
+
+            self._sweep(channels)
+
+            with self._idle_lock:
+                self.requests.task_done()
+                if self.requests.unfinished_tasks == 0:
+                    self.idle_event.set()
+
+        # requests left in the queue are processed on the next start()
+        self.idle_event.set()
+
+    def _sweep(self, channels: list[int]):
+        logger.debug(
+            f"Starting impedance sweep {self.device_id} - {channels=}"
+        )
+        self.cache.set(ImpedanceSweep(self.device_id, channels))
+        error = ""
+        for ch in channels:
+            if self.stop_event.is_set():
+                error = "sweep was stopped"
+                break
+            try:
+                self.cache.update(
+                    self.device_id, ch, self.implant.calculate_impedance(ch)
+                )
+            except RuntimeError as err:
+                logger.error(
+                    f"Impedance {self.device_id}, {ch=} failed: {err}"
+                )
+                error = str(err)
+                break
+
+        self.cache.finish(self.device_id, error=error)
+        logger.debug(f"Impedance sweep done {self.device_id}")
+
+
+def periodic_sweeps(
+    request_sweep: Callable[[], int],
+    is_busy: Callable[[], bool],
+    stop_event: threading.Event,
+    interval_s: float = 600,
+    dt_s: float = 0.1,
+):
+    """
+    Request a sweep every `interval_s`. If the devices are busy at that
+    point in time (recording), the sweep is requested as soon as they are
+    free again, i.e. between recording blocks.
+    """
+    t_last = float("-inf")  # first sweep right away
+    while not stop_event.is_set():
+        if time.monotonic() - t_last > interval_s and not is_busy():
+            request_sweep()
+            t_last = time.monotonic()
+        stop_event.wait(dt_s)
@@ -0,0 +1,313 @@
+# Run the implant session and its listener in a dedicated process, so that
+# the SDK callback thread does not compete for the GIL with the controller
+# and the server of the main process. Only the control path is isolated -
+# the samples reach other processes through the LSL outlets as usual.
+#
+# Commands and their replies go through a pipe. Starting and stopping the
+# stimulation has a pipe and a thread of its own in the device process, so
+# that a trigger of the controller never waits behind a long running
+# command like reconfigure_recording or measure_jitter.
+#
+#   main process                        device process
+#   DeviceProcess.start_stimulation --> stim pipe --> CTManager
+#   DeviceProcess.reconfigure...    --> pipe      --> CTManager
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing.connection import Connection
+from typing import Any, Callable
+
+from ct_bic.config import (
+    get_outlet_params,
+    get_scheduling_policy,
+    load_config,
+)
+from ct_bic.controller import ControlParams, threshold_single_control
+from ct_bic.events import EventOutlet, get_event_outlet
+from ct_bic.scheduling import SCHEDULING_ROLES, apply_policy
+from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
+
+# methods of CTManager which can be called through the pipe, arguments and
+# return values need to be picklable
+ALLOWED_COMMANDS = (
+    "start_recording",
+    "stop_recording",
+    "init_stim_cmds",
+    "get_drop_stats",
+    "get_signal_quality",
+    "measure_jitter",
+    "stats",
+    "stop",
+    "restart",
+    "reconfigure_recording",
+)
+# served on the stimulation pipe only
+STIM_COMMANDS = ("start_stimulation", "stop_stimulation")
+
+
+def serve_commands(
+    conn: Connection,
+    target: Any,
+    poll_s: float = 0.1,
+    allowed: tuple[str, ...] = ALLOWED_COMMANDS,
+):
+    """
+    Execute (seq, command, kwargs) messages from the pipe on `target` and
+    reply with (seq, "ok", result) or (seq, "error", message), until "close"
+    is received or the other end is gone. The sequence id lets the caller
+    tell a late reply to a timed out command from the one it waits for.
+    """
+    while True:
+        try:
+            if not conn.poll(poll_s):
+                continue
+            seq, cmd, kwargs = conn.recv()
+        except (EOFError, OSError):
+            logger.warning("Command pipe closed - shutting down")
+            return
+
+        if cmd == "close":
+            conn.send((seq, "ok", None))
+            return
+
+        if cmd not in allowed:
+            conn.send((seq, "error", f"Unknown command {cmd!r}"))
+            continue
+
+        try:
+            conn.send((seq, "ok", getattr(target, cmd)(**kwargs)))
+        except Exception as err:
+            logger.exception(f"Command {cmd} failed")
+            conn.send((seq, "error", repr(err)))
+
+
+def serve_stim_commands(conn: Connection, ctm: Any, poll_s: float = 0.01):
+    """Thread of the stimulation pipe, scheduled like the controller"""
+    apply_policy(ctm.get_scheduling_policy("controller"), "stim commands")
+    serve_commands(conn, ctm, poll_s=poll_s, allowed=STIM_COMMANDS)
+
+
+def run_device_process(
+    conn: Connection,
+    stim_conn: Connection,
+    device_id: str | None = None,
+):
+    """Entry point of the device process"""
+    # imported here, so that the main process does not load the SDK
+    from ct_bic.main import CTManager
+
+    device_ids = [device_id] if device_id is not None else None
+    try:
+        ctm = CTManager(device_ids=device_ids)
+    except Exception as err:
+        conn.send((0, "error", repr(err)))
+        return
+
+    stim_th = threading.Thread(
+        target=serve_stim_commands,
+        args=(stim_conn, ctm),
+        name="stim_commands",
+        daemon=True,
+    )
+    stim_th.start()
+    # sequence id 0 is the start up, commands count from 1
+    conn.send((0, "ok", ctm.get_device().device_id))
+
+    try:
+        serve_commands(conn, ctm)
+    finally:
+        ctm.close()
+
+
+class CommandPipe:
+    """
+    Caller side of `serve_commands` - one command at a time, late replies
+    to commands which timed out are dropped
+    """
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._seq = 0  # id of the latest command, see serve_commands
+
+    def recv(self, timeout: float) -> Any:
+        """Reply to the latest command, late replies to earlier are dropped"""
+        t_end = time.perf_counter() + timeout
+        while True:
+            if not self.conn.poll(max(t_end - time.perf_counter(), 0)):
+                raise TimeoutError(
+                    f"No reply from device process in {timeout}s"
+                )
+            seq, status, result = self.conn.recv()
+            if seq == self._seq:
+                break
+            logger.warning(
+                f"Dropping late reply to command {seq} ({status})"
+                f" while waiting for {self._seq}"
+            )
+        if status != "ok":
+            raise RuntimeError(f"Device process: {result}")
+        return result
+
+    def call(self, cmd: str, timeout: float = 5, **kwargs) -> Any:
+        with self._lock:
+            self._seq += 1
+            self.conn.send((self._seq, cmd, kwargs))
+            return self.recv(timeout)
+
+
+class DeviceProcess:
+    """
+    Main process side of a device running in its own process. Commands are
+    forwarded to the CTManager of the device process (see ALLOWED_COMMANDS
+    and STIM_COMMANDS), the data is available from the LSL outlets.
+
+    Parameters
+    ----------
+    device_id : str | None
+        external unit to use, first found if None
+    target : Callable
+        entry point of the process, see `run_device_process`
+    """
+
+    def __init__(
+        self,
+        device_id: str | None = None,
+        target: Callable = run_device_process,
+    ):
+        self.device_id = device_id
+        self.target = target
+        self.process: mp.Process | None = None
+        self.pipe: CommandPipe | None = None
+        self.stim_pipe: CommandPipe | None = None
+
+        # the controller runs in the main process
+        self.cfg = load_config()
+        self.control_params = ControlParams(
+            threshold=self.cfg["stim_control"]["threshold"],
+            channel=self.cfg["stim_control"]["channel"],
+            grace_period_s=self.cfg["stim_control"]["grace_period_s"],
+        )
+        self.events: EventOutlet | None = None
+        self.listen_th: threading.Thread | None = None
+        self.trigger_stop_event = threading.Event()
+
+    def start(self, timeout: float = 30) -> str:
+        """Spawn the process and wait until the device is initialized"""
+        conn, child_conn = mp.Pipe()
+        stim_conn, child_stim_conn = mp.Pipe()
+        self.pipe = CommandPipe(conn)
+        self.stim_pipe = CommandPipe(stim_conn)
+        # spawn - a forked SDK / LSL state is not safe to use
+        ctx = mp.get_context("spawn")
+        self.process = ctx.Process(
+            target=self.target,
+            args=(child_conn, child_stim_conn),
+            kwargs={"device_id": self.device_id},
+            name="ct_bic_device",
+            daemon=True,
+        )
+        self.process.start()
+        self.device_id = self.pipe.recv(timeout)
+        logger.info(f"Device process {self.process.pid} running")
+        return self.device_id
+
+    def call(self, cmd: str, timeout: float = 5, **kwargs) -> Any:
+        pipe = self.stim_pipe if cmd in STIM_COMMANDS else self.pipe
+        return pipe.call(cmd, timeout=timeout, **kwargs)
+
+    def start_recording(self) -> int:
+        return self.call("start_recording")
+
+    def stop_recording(self) -> int:
+        return self.call("stop_recording")
+
+    def start_stimulation(self) -> int:
+        return self.call("start_stimulation")
+
+    def stop_stimulation(self) -> int:
+        return self.call("stop_stimulation")
+
+    def init_stim_cmds(self) -> int:
+        # stimulation commands are SDK objects and cannot be sent, the
+        # default command is created in the device process
+        return self.call("init_stim_cmds")
+
+    def get_drop_stats(self) -> dict:
+        return self.call("get_drop_stats")
+
+    def get_signal_quality(self) -> dict:
+        return self.call("get_signal_quality")
+
+    def measure_jitter(
+        self, role: str | None = None, duration_s: float = 2
+    ) -> dict:
+        """Of probe threads in the device process, i.e. next to the callback"""
+        # one probe per role plus the default, see CTManager.measure_jitter
+        n = 2 if role is not None else len(SCHEDULING_ROLES) + 1
+        return self.call(
+            "measure_jitter",
+            timeout=n * duration_s + 5,
+            role=role,
+            duration_s=duration_s,
+        )
+
+    def reconfigure_recording(self, **kwargs) -> dict:
+        # waits for the first packet after the restart, up to timeout_s
+        return self.call("reconfigure_recording", timeout=10, **kwargs)
+
+    def listen_for_stim_trigger(
+        self,
+    ) -> tuple[threading.Thread, threading.Event]:
+        """Same as CTManager.listen_for_stim_trigger, but in this process"""
+        # imported here, the StreamWatcher is not needed in the device process
+        from dareplane_utils.stream_watcher.lsl_stream_watcher import (
+            StreamWatcher,
+        )
+
+        self.stop_listening()
+        self.trigger_stop_event.clear()
+        if self.events is None:
+            self.events = EventOutlet(
+                get_event_outlet(**get_outlet_params(self.cfg, "events"))
+            )
+        sw = StreamWatcher(
+            name=self.cfg["stim_control"]["stream_name"],
+            buffer_size_s=self.cfg["stim_control"]["buffer_size_s"],
+        )
+        self.listen_th = threading.Thread(
+            target=threshold_single_control,
+            args=(sw, self.start_stimulation, self.trigger_stop_event),
+            kwargs={
+                "params": self.control_params,
+                "events": self.events,
+                "scheduling": get_scheduling_policy(self.cfg, "controller"),
+            },
+            name="threshold_control",
+        )
+        self.listen_th.start()
+        return self.listen_th, self.trigger_stop_event
+
+    def stop_listening(self, timeout: float = 0.5) -> int:
+        stop_thread(self.listen_th, self.trigger_stop_event, timeout=timeout)
+        return 0
+
+    def stats(self) -> dict:
+        return self.call("stats")
+
+    def close(self, timeout: float = 5):
+        self.stop_listening()
+        if self.process is None:
+            return
+        for pipe in (self.stim_pipe, self.pipe):
+            try:
+                pipe.call("close", timeout=timeout)
+            except (TimeoutError, RuntimeError, OSError, EOFError) as err:
+                logger.warning(f"Device process did not close cleanly: {err}")
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+        for pipe in (self.stim_pipe, self.pipe):
+            pipe.conn.close()
+        self.process = None
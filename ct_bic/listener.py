@@ -1,9 +1,21 @@
+import threading
+import time
+
 import pylsl
 import numpy as np
 from dataclasses import dataclass, field
 import pandas as pd
+from ct_bic.blanking import ArtifactBlanker, split_by_counter
+from ct_bic.cmd_swap import CommandSwapper
+from ct_bic.degradation import DegradationPolicy
+from ct_bic.drop_stats import DropStats
+from ct_bic.hotpath_stats import HotPathStats
+from ct_bic.scheduling import SchedulingPolicy, apply_policy
+from ct_bic.sinks import SinkRegistry
 from ct_bic.utils.global_setup import pyapi
 from ct_bic.utils.logging import logger
+from ct_bic.utils.ringbuffer import get_window, join_window, reset_ringbuffer
+from ct_bic.watchdog import DataWatchdog
 
 # Using a streamwatcher instance for its ring buffer
 from dareplane_utils.stream_watcher.lsl_stream_watcher import (
@@ -29,37 +41,161 @@ def buffers_to_df(
 class CTListener(pyapi.ImplantListener):
     def __init__(
         self,
-        buffer: RingBuffer = RingBuffer((1000, 32)),
+        buffer: RingBuffer | None = None,
         is_measument_active: bool = False,
         n_new: int = 0,
-        news: list[int] = [],
-        latest_samples: list[float] = [],
-        outlet: pylsl.StreamOutlet | None = None
+        news: list[int] | None = None,
+        latest_samples: list[float] | None = None,
+        outlet: pylsl.StreamOutlet | None = None,
+        drop_stats: DropStats | None = None,
+        stages: list | None = None,
+        blanker: ArtifactBlanker | None = None,
+        stats: HotPathStats | None = None,
+        degradation: DegradationPolicy | None = None,
+        chunk_n: int = 1,
+        swapper: CommandSwapper | None = None,
+        watchdog: DataWatchdog | None = None,
+        sinks: SinkRegistry | None = None,
+        scheduling: SchedulingPolicy | None = None,
     ):
-        self.ringbuffer = buffer
+        # NOTE: no mutable defaults - each listener runs in the callback thread
+        # of its own device and must not share buffers with other listeners
+        self.ringbuffer = buffer if buffer is not None else RingBuffer((1000, 32))
         self.is_measument_active = is_measument_active
         self.n_new = n_new
-        self.news = news
-        self.latest_samples = latest_samples
+        self.news = news if news is not None else []
+        self.latest_samples = latest_samples if latest_samples is not None else []
         self.outlet = outlet
+        self.drop_stats = drop_stats
+        # optional processing stages, anything with a
+        # `.process(data: np.ndarray, cntr: int)` method, data is of shape
+        # (n_samples, 32) and called in the callback thread
+        self.stages = stages if stages is not None else []
+        # optional stimulation artifact blanking before the outlet, adds the
+        # artifact flag as an additional channel
+        self.blanker = blanker
+        # optional counters of the callback durations and rates
+        self.stats = stats
+        # optional load shedding on on_data_processing_too_slow
+        self.degradation = degradation
+        # samples collected per push to the outlet, degradation can only
+        # increase it
+        self.chunk_n = chunk_n
+        # optional double buffered stimulation command updates, which need
+        # the stimulation callbacks
+        self.swapper = swapper
+        # optional detection of stalls of the data flow
+        self.watchdog = watchdog
+        # optional consumers running in their own worker threads, fed after
+        # the stages
+        self.sinks = sinks
+        # the sink filling `ringbuffer`, set by RingBufferSink - new samples
+        # are counted by what it has written, `n_read` of which are consumed
+        self.ringbuffer_sink = None
+        self.n_read = 0
+        # optional affinity / priority of the SDK callback thread, applied
+        # with the first packet of each new callback thread
+        self.scheduling = scheduling
+        self.scheduling_report: dict[str, str] = {}
+        self._scheduled_tid: int | None = None
+        self._chunk: np.ndarray | None = None  # for chunked pushes
+        self._n_chunk = 0
 
     def reset_buffers(self):
-        # clear values
-        self.ringbuffer.buffer = np.zeros(self.ringbuffer.buffer.shape)
-        self.ringbuffer.buffer_t = np.zeros(self.ringbuffer.buffer.shape[0])
-        self.last_t = 0
-        self.curr_i = 0
+        # clear values in place - readers might hold views of the buffer
+        reset_ringbuffer(self.ringbuffer)
+        if self.ringbuffer_sink is not None:
+            # what was not read yet is gone
+            self.n_read = self.ringbuffer_sink.n_written
 
     def on_measurement_state_changed(self, is_measuring: bool):
         self.is_measument_active = is_measuring
+        if is_measuring and self.blanker is not None:
+            # counters restart with a new measurement
+            self.blanker.reset()
+        if not is_measuring and self._n_chunk:
+            self.flush_chunk()
 
     def on_data(self, sample: pyapi.Sample):
-        samples = sample.measurements
+        if (
+            self.scheduling is not None
+            and self._scheduled_tid != threading.get_native_id()
+        ):
+            self.apply_scheduling()
+
+        # local reference, stats might be swapped from another thread
+        stats = self.stats
+        if stats is None:
+            self.process_sample(sample)
+            return
+
+        t0 = time.perf_counter_ns()
+        self.process_sample(sample)
+        stats.record(
+            time.perf_counter_ns() - t0, len(sample.measurements) // 32
+        )
+
+    def set_scheduling(self, policy: SchedulingPolicy | None):
+        """Applied with the next packet"""
+        self.scheduling = policy
+        self._scheduled_tid = None
 
-        samples = [samples[i : i + 32] for i in range(0, len(samples), 32)]
+    def apply_scheduling(self):
+        """Apply `scheduling` to the calling, i.e. the SDK callback thread"""
+        self._scheduled_tid = threading.get_native_id()
+        self.scheduling_report = apply_policy(
+            self.scheduling, f"callback thread {self._scheduled_tid}"
+        )
 
-        self.latest_samples = samples
-        self.n_new = self.push_to_outlet()
+    def process_sample(self, sample: pyapi.Sample):
+        data = None
+        cntr = sample.measurement_counter
+        if self.blanker is not None:
+            data = np.asarray(sample.measurements, dtype=np.float32).reshape(
+                -1, 32
+            )
+            self.latest_samples, cntr = self.blanker.process(data, cntr)
+            self.n_new = self.push_to_outlet()
+            # stages get the blanked data, without the flag channel, with the
+            # counters of the delayed samples
+            data = self.latest_samples[:, :32]
+        else:
+            samples = sample.measurements
+            samples = [samples[i : i + 32] for i in range(0, len(samples), 32)]
+
+            self.latest_samples = samples
+            self.n_new = self.push_to_outlet()
+
+        if self.drop_stats is not None:
+            self.drop_stats.add(sample.measurement_counter)
+        if self.watchdog is not None:
+            self.watchdog.feed(sample.measurement_counter)
+
+        dgr = self.degradation
+        run_optional = True
+        paused_sinks = frozenset()
+        if dgr is not None:
+            dgr.tick()
+            run_optional = dgr.stages
+            paused_sinks = dgr.paused_sinks
+
+        sinks = self.sinks
+        if self.stages or sinks:
+            if data is None:
+                data = np.asarray(
+                    sample.measurements, dtype=np.float32
+                ).reshape(-1, 32)
+            elif len(data) == 0:
+                # all samples are still in the delay line of the blanker
+                return
+            # `data` is a new array per packet - all sinks share it
+            for d, c in split_by_counter(data, cntr):
+                for stage in self.stages:
+                    # stages are optional unless they set `optional = False`
+                    if run_optional or not getattr(stage, "optional", True):
+                        stage.process(d, c)
+                if sinks:
+                    sinks.dispatch(d, c, paused_sinks)
 
         # # The stream watcher tracks data and times, use the times ring buffer
         # # for tracking the package count - second arg here
@@ -69,21 +205,70 @@ class CTListener(pyapi.ImplantListener):
 
         # self.n_new += len(samples)
 
+    def get_window(
+        self, n: int
+    ) -> tuple[tuple[np.ndarray, ...], tuple[np.ndarray, ...]]:
+        """Latest n samples and counters as views, see `get_window`"""
+        return get_window(self.ringbuffer, n)
+
+    @property
+    def n_unread(self) -> int:
+        """Samples written to the ring buffer and not consumed yet"""
+        sink = self.ringbuffer_sink
+        return sink.n_written - self.n_read if sink is not None else 0
+
     def get_new_data(self):
-        n = self.n_new
+        """Samples written to the ring buffer since the last call"""
+        sink = self.ringbuffer_sink
+        if sink is None:
+            return get_window(self.ringbuffer, 0)[0][0]
+        # the window ends where the count was taken, the sink might have
+        # written more since
+        n_written, end = sink.written
+        n = n_written - self.n_read
+        self.n_read = n_written
         self.news.append(n)
-        self.n_new = 0
-        return self.ringbuffer.unfold_buffer()[-n:]
+        data, _ = get_window(self.ringbuffer, n, end=end)
+        return join_window(data)
 
     def push_to_outlet(self) -> int:
-        for s in self.latest_samples:
-            # logger.debug(f"Pushing {len(self.latest_samples)} samples - {s=}")
-            self.outlet.push_sample(s)
+        dgr = self.degradation
+        chunk_n = self.chunk_n
+        if dgr is not None and dgr.chunk_n > chunk_n:
+            chunk_n = dgr.chunk_n
+        if chunk_n > 1 or self._n_chunk:
+            self.push_chunked(chunk_n)
+        else:
+            for s in self.latest_samples:
+                # logger.debug(f"Pushing {len(self.latest_samples)} samples - {s=}")
+                self.outlet.push_sample(s)
 
         return len(self.latest_samples)
 
+    def push_chunked(self, chunk_n: int):
+        """Collect samples and push them once `chunk_n` are available"""
+        for s in self.latest_samples:
+            if self._chunk is None or len(self._chunk) < chunk_n:
+                chunk = np.zeros((max(chunk_n, 1), len(s)), dtype=np.float32)
+                if self._chunk is not None:
+                    chunk[: self._n_chunk] = self._chunk[: self._n_chunk]
+                self._chunk = chunk
+            self._chunk[self._n_chunk] = s
+            self._n_chunk += 1
+            if self._n_chunk >= chunk_n:
+                self.flush_chunk()
+
+    def flush_chunk(self):
+        if self._n_chunk:
+            self.outlet.push_chunk(self._chunk[: self._n_chunk])
+            self._n_chunk = 0
+
     def on_data_processing_too_slow(self):
-        pass
+        stats = self.stats
+        if stats is not None:
+            stats.too_slow()
+        if self.degradation is not None:
+            self.degradation.too_slow()
 
     def on_humidity_changed(self, humidity):
         pass
@@ -98,10 +283,20 @@ class CTListener(pyapi.ImplantListener):
         pass
 
     def on_stimulation_function_finished(self, num_executed_functions):
-        pass
+        if self.blanker is not None:
+            self.blanker.on_stimulation_function_finished(
+                num_executed_functions
+            )
+        if self.swapper is not None:
+            self.swapper.on_stimulation_function_finished(
+                num_executed_functions
+            )
 
     def on_stimulation_state_changed(self, is_stimulating):
-        pass
+        if self.blanker is not None:
+            self.blanker.on_stimulation_state_changed(is_stimulating)
+        if self.swapper is not None:
+            self.swapper.on_stimulation_state_changed(is_stimulating)
 
     def on_temperature_changed(self, temperature):
         pass
@@ -178,7 +373,6 @@ class TestListener(pyapi.ImplantListener):
 
 if __name__ == "__main__":
     from ct_bic.device import get_device
-    import time
 
     with get_device() as implant:
         listener = CTListener()
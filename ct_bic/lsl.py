@@ -5,6 +5,7 @@ import pylsl
 from ct_bic.listener import CTListener
 from ct_bic.utils.global_setup import pyapi
 from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
 
 from dareplane_utils.general.time import sleep_s
 
@@ -17,6 +18,8 @@ def get_stream_outlet(
     sfreq: int = 1000,
     n_channels: int = 32,
     max_buffer_s: int = 2,
+    source_id: str | None = None,
+    chunk_size: int = 0,
 ) -> tuple[pylsl.StreamOutlet, pylsl.StreamInfo]:
     info = pylsl.StreamInfo(
         name=stream_name,
@@ -24,10 +27,12 @@ def get_stream_outlet(
         channel_count=n_channels,
         nominal_srate=sfreq,
         channel_format="float32",
-        source_id=f"{stream_name}_id",
+        source_id=source_id if source_id is not None else f"{stream_name}_id",
     )
 
-    outlet = pylsl.StreamOutlet(info, max_buffered=max_buffer_s)
+    outlet = pylsl.StreamOutlet(
+        info, chunk_size=chunk_size, max_buffered=max_buffer_s
+    )
 
     return outlet, info
 
@@ -43,7 +48,7 @@ def stream_results(
 
     while not stop_event.is_set():
         t0 = time.time_ns()
-        if listener.n_new > 0 and (time.time_ns() - t0) >= dt_ns:
+        if listener.n_unread > 0 and (time.time_ns() - t0) >= dt_ns:
             ndata = listener.get_new_data()
             logger.info(f"Pushing new samples: {len(ndata)}")
             for s in ndata:
@@ -89,9 +94,8 @@ class CTtoLSLStream:
         # )
         # self.thread.start()
 
-    def stop_streaming_thread(self):
-        self.stop_event.set()
-        self.thread.join()
+    def stop_streaming_thread(self, timeout: float = 0.5):
+        stop_thread(self.thread, self.stop_event, timeout=timeout)
 
     def __del__(self):
         pass
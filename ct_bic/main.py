@@ -1,40 +1,94 @@
+import copy
 import threading
+import time
+from typing import Callable
+
 import numpy as np
-import tomllib
+import pylsl
 from pathlib import Path
 
 from ct_bic.utils.global_setup import pyapi, log_file_name, enable_log
 from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
+from ct_bic.archive import ArchiveWriter
+from ct_bic.blanking import ArtifactBlanker
+from ct_bic.closed_loop import ClosedLoopStage, band_power, latest_value, rms
+from ct_bic.cmd_swap import CommandSwapper
+from ct_bic.degradation import DegradationLevel, DegradationPolicy
+from ct_bic.device import CTDevice
+from ct_bic.events import EventCode, EventOutlet, get_event_outlet
+from ct_bic.drop_stats import DropStats
 from ct_bic.listener import CTListener
-from ct_bic.lsl import CTtoLSLStream, get_stream_outlet
-from ct_bic.stimulation_cmds import (
-    get_single_pulse_stim_cmd,
-    get_nsec_130Hz_stim,
+from ct_bic.lsl import get_stream_outlet
+from ct_bic.stimulation_cmds import get_single_pulse_stim_cmd
+from ct_bic.config import (
+    AMPLIFICATIONS,
+    ConfigWatcher,
+    get_outlet_params,
+    get_scheduling_policy,
+    load_config,
+)
+from ct_bic.controller import ControlParams, threshold_single_control
+from ct_bic.spectral import BandPowerStage, get_feature_outlet
+from ct_bic.hotpath_stats import HotPathStats, get_stats_outlet, publish_stats
+from ct_bic.impedance import ImpedanceCache, ImpedanceSweeper, periodic_sweeps
+from ct_bic.quality import SignalQualityStage, get_quality_outlet
+from ct_bic.scheduling import (
+    SCHEDULING_ROLES,
+    SchedulingPolicy,
+    measure_jitter,
 )
-from ct_bic.controller import threshold_single_control
+from ct_bic.sinks import RingBufferSink, SinkRegistry
+from ct_bic.watchdog import DataWatchdog
 
 
 from dareplane_utils.stream_watcher.lsl_stream_watcher import StreamWatcher
 from dareplane_utils.general.ringbuffer import RingBuffer
 
 
-CFG = tomllib.load(open("./config/config.toml", "rb"))
+CFG = load_config()
+
+
+def get_amplification_factor(
+    name: str,
+) -> pyapi.RecordingAmplificationFactor:
+    """E.g. "57_5dB" -> RecordingAmplificationFactor.AMPLIFICATION_57_5dB"""
+    if name not in AMPLIFICATIONS:
+        raise ValueError(f"Unknown {name=}, use one of {AMPLIFICATIONS}")
+    return getattr(pyapi.RecordingAmplificationFactor, f"AMPLIFICATION_{name}")
+
+
+# statuses of CTManager.apply_config shared by several sections
+CONTROLLER_RECONNECTED = "applied: controller reconnected"
+OUTLETS_REJECTED = (
+    "rejected: outlets cannot be changed while running, requires a restart"
+    " of the module"
+)
 
 
 class CTManager:
     """
     The manager class to provide interaction functionality with the CorTec BIC
-    device.
+    device. Multiple external units can be managed at once, each device gets
+    its own listener, ring buffer and LSL outlet. Methods taking a `device_id`
+    act on the default (first) device if None is provided, unless stated
+    otherwise.
     """
 
     def __init__(
         self,
         buffer_size_s: float = CFG["lsl"]["buffer_size_s"],
         stream_name: str = CFG["lsl"]["stream_name"],
-        ref_channels: list[int] = [4],  # if empty -> global ref is used
+        ref_channels: list[int] = CFG["recording"]["ref_channels"],
+        device_ids: list[str] | None = None,  # if None -> use all found
+        amplification: str = CFG["recording"]["amplification"],
     ):
-        self.ref_channels = ref_channels
+        # the config in effect, changes are applied via `apply_config`
+        self.cfg = copy.deepcopy(CFG)
+        self.ref_channels = list(ref_channels)  # if empty -> global ref is used
+        self.amplification = get_amplification_factor(amplification)
         self.buffer_size_s = buffer_size_s
+        self.stream_name = stream_name
         self.stop_event = threading.Event()
         self.trigger_stop_event = threading.Event()
         self.i_pulse = 0
@@ -44,17 +98,31 @@ class CTManager:
         # using a function call just returning the implant does not work
         # most likely the info object is required to share a life time with
         # the implant ... (indeed event the factory needs to be kept alive)
-        self.implant = None
-        self.init_implant()
-
-        # CT BIC samples at 1kHz
-        rb = RingBuffer(shape=(buffer_size_s * 1000, 32))
+        self.devices: dict[str, CTDevice] = {}
+        self.init_implant(device_ids=device_ids)
 
-        self.outlet, self.stream_info = get_stream_outlet(
-            stream_name, sfreq=1000, n_channels=32
+        # numeric events of the controller, stimulation and data path, see
+        # ct_bic.events
+        self.events = EventOutlet(
+            get_event_outlet(**get_outlet_params(self.cfg, "events"))
         )
-        self.listener = CTListener(rb, outlet=self.outlet)
-        self.implant.register_listener(self.listener)
+
+        for dev in self.devices.values():
+            self.init_data_path(dev)
+
+        # impedances are measured in background workers, one per device
+        self.impedance_cache = ImpedanceCache()
+        self.impedance_sweepers = {
+            device_id: ImpedanceSweeper(
+                dev.implant,
+                device_id,
+                self.impedance_cache,
+                is_busy=lambda dev=dev: dev.listener.is_measument_active,
+                n_channels=dev.implant_info.channel_count,
+            )
+            for device_id, dev in self.devices.items()
+        }
+        self.impedance_stop_event = threading.Event()
 
         # # LSL
         # self.stop_event = threading.Event()
@@ -66,45 +134,285 @@ class CTManager:
         #
         # stim control
         self.trigger_stop_event = threading.Event()
+        self.listen_th: threading.Thread | None = None
+        self.listen_device_id: str | None = None
+        self.control_params = ControlParams(
+            threshold=self.cfg["stim_control"]["threshold"],
+            channel=self.cfg["stim_control"]["channel"],
+            grace_period_s=self.cfg["stim_control"]["grace_period_s"],
+        )
+        # in process closed loop on the implant data, see ct_bic.closed_loop
+        self.closed_loop: ClosedLoopStage | None = None
+        self.closed_loop_device_id: str | None = None
+        self.closed_loop_params = ControlParams(
+            threshold=self.cfg["closed_loop"]["threshold"],
+            channel=self.cfg["closed_loop"]["channel"],
+            grace_period_s=self.cfg["closed_loop"]["grace_period_s"],
+        )
+        self.config_watcher: ConfigWatcher | None = None
+        self.stats_th: threading.Thread | None = None
+        self.stats_stop_event = threading.Event()
+        self.impedance_th: threading.Thread | None = None
+        self.is_closed = False
 
-    def init_implant(self):
+    def init_implant(self, device_ids: list[str] | None = None):
         log_file_pth = Path(log_file_name)
         log_file_pth.parent.mkdir(exist_ok=True)
         factory = pyapi.ImplantFactory(enable_log, log_file_name)
         ext_unit_infos = factory.load_external_unit_infos()
-        implant_info = None
-        ext_unit_info = None
+
+        # Keep all to ensure object life time
+        self.factory = factory
 
         # You have to load the info - else creating the implant object will fail
-        for info in ext_unit_infos:
+        for i, info in enumerate(ext_unit_infos):
+            device_id = self._get_device_id(info, i)
+            if device_ids is not None and device_id not in device_ids:
+                logger.debug(f"Skipping external unit {device_id=}")
+                continue
+
             try:
                 implant_info = factory.load_implant_info(info)
-                ext_unit_info = info
             except RuntimeError as e:
                 raise e
 
+            self.devices[device_id] = CTDevice(
+                device_id=device_id,
+                ext_unit_info=info,
+                implant_info=implant_info,
+                implant=factory.create(info, implant_info),
+            )
+
         assert (
-            implant_info is not None
+            len(self.devices) > 0
         ), "No implant info found - is implant connected with other process?"
 
-        # Keep all to ensure object life time
-        self.factory = factory
-        self.implant_info = implant_info
-        self.ext_unit_info = ext_unit_info
-        self.implant = factory.create(ext_unit_info, implant_info)
+        logger.info(f"Initialized implants for {list(self.devices)}")
+
+    def _get_device_id(
+        self, info: pyapi.externalunitinfo.ExternalUnitInfo, i: int
+    ) -> str:
+        """
+        The device_id of the external unit (as in the CorTec examples), or
+        its index if the SDK does not provide a usable one
+        """
+        device_id = str(getattr(info, "device_id", "") or "")
+        if not device_id or device_id in self.devices:
+            logger.warning(
+                f"No unique device_id for external unit {i} ({device_id=}),"
+                " using the index instead"
+            )
+            device_id = str(i)
+        return device_id
+
+    def get_stream_name(self, stream_name: str, device_id: str) -> str:
+        # Keep the plain stream name if only a single device is used, so that
+        # downstream consumers do not need to know the device id
+        if len(self.devices) == 1:
+            return stream_name
+        return f"{stream_name}_{device_id}"
+
+    def init_data_path(self, dev: CTDevice):
+        """Create ring buffer, outlet and listener for a single device"""
+        # CT BIC samples at 1kHz
+        rb = RingBuffer(shape=(int(self.buffer_size_s * 1000), 32))
+
+        bcfg = self.cfg["blanking"]
+        blanker = None
+        if bcfg["enabled"]:
+            blanker = ArtifactBlanker(
+                pre_n=int(bcfg["pre_s"] * 1000),
+                post_n=int(bcfg["post_s"] * 1000),
+                mode=bcfg["mode"],
+            )
+
+        dev.outlet, dev.stream_info = get_stream_outlet(
+            self.get_stream_name(self.stream_name, dev.device_id),
+            sfreq=1000,
+            # the artifact flag is pushed as an additional channel
+            n_channels=33 if blanker is not None else 32,
+            max_buffer_s=self.cfg["outlets"]["data"]["max_buffered"],
+            source_id=f"{self.stream_name}_{dev.device_id}",
+            chunk_size=self.cfg["outlets"]["data"]["chunk_size"],
+        )
+        dev.swapper = CommandSwapper(
+            dev.implant,
+            on_swap=lambda cmd, timing: self._on_cmd_swap(dev, cmd, timing),
+        )
+        dev.watchdog = self.get_watchdog(dev)
+        scfg = self.cfg["sinks"]
+        dev.sinks = SinkRegistry(
+            queue_n=scfg["queue_n"],
+            policy=scfg["policy"],
+            block_timeout_s=scfg["block_timeout_s"],
+        )
+        dev.listener = CTListener(
+            rb,
+            outlet=dev.outlet,
+            drop_stats=DropStats(),
+            blanker=blanker,
+            stats=HotPathStats() if self.cfg["stats"]["enabled"] else None,
+            degradation=self.get_degradation_policy(dev.device_id),
+            chunk_n=self.cfg["outlets"]["data"]["push_chunk_n"],
+            swapper=dev.swapper,
+            watchdog=dev.watchdog,
+            sinks=dev.sinks,
+            scheduling=self.get_scheduling_policy("callback"),
+        )
+        if scfg["ring_buffer"]:
+            dev.sinks.add("ring_buffer", RingBufferSink(dev.listener))
+
+        fcfg = self.cfg["features"]
+        if fcfg["enabled"]:
+            dev.features = BandPowerStage(
+                bands={k: tuple(v) for k, v in fcfg["bands"].items()},
+                window_s=fcfg["window_s"],
+                hop_s=fcfg["hop_s"],
+                outlet=get_feature_outlet(
+                    self.get_stream_name(fcfg["stream_name"], dev.device_id),
+                    bands=fcfg["bands"],
+                    sfreq=1 / fcfg["hop_s"],
+                    source_id=f"{fcfg['stream_name']}_{dev.device_id}",
+                    **get_outlet_params(self.cfg, "features"),
+                ),
+            )
+            if scfg["features"]:
+                dev.sinks.add("features", dev.features)
+            else:
+                dev.listener.stages.append(dev.features)
+
+        qcfg = self.cfg["quality"]
+        if qcfg["enabled"]:
+            dev.quality = SignalQualityStage(
+                tau_s=qcfg["tau_s"],
+                line_freq=qcfg["line_freq"],
+                flat_eps=qcfg["flat_eps"],
+                saturation_level=qcfg["saturation_level"],
+                max_flat=qcfg["max_flat"],
+                max_saturated=qcfg["max_saturated"],
+                max_line_ratio=qcfg["max_line_ratio"],
+                publish_interval_s=qcfg["publish_interval_s"],
+                outlet=get_quality_outlet(
+                    self.get_stream_name(qcfg["stream_name"], dev.device_id),
+                    sfreq=1 / qcfg["publish_interval_s"],
+                    source_id=f"{qcfg['stream_name']}_{dev.device_id}",
+                    **get_outlet_params(self.cfg, "quality"),
+                ),
+            )
+            dev.listener.stages.append(dev.quality)
+
+        dev.implant.register_listener(dev.listener)
+
+    def get_scheduling_policy(self, role: str) -> SchedulingPolicy:
+        """
+        The [scheduling] policy of `role` - also if it is the default, so
+        that the thread is reset instead of inheriting e.g. the server policy
+        """
+        return get_scheduling_policy(self.cfg, role)
+
+    def get_degradation_policy(
+        self, device_id: str
+    ) -> DegradationPolicy | None:
+        dcfg = self.cfg["degradation"]
+        if not dcfg["enabled"]:
+            return None
+
+        def on_change(old: int, new: int):
+            logger.info(f"Degradation level {old} -> {new} - {device_id}")
+            self.events.push(EventCode.DEGRADATION_LEVEL, value=new)
+
+        return DegradationPolicy(
+            levels=[DegradationLevel(**lvl) for lvl in dcfg["levels"]],
+            hold_s=dcfg["hold_s"],
+            recover_s=dcfg["recover_s"],
+            on_change=on_change,
+        )
+
+    def get_watchdog(self, dev: CTDevice) -> DataWatchdog:
+        wcfg = self.cfg["watchdog"]
+
+        def on_stall(stall: dict):
+            self.events.push(EventCode.DATA_STALL, value=stall["detect_ms"])
+
+        def on_recover(stall: dict):
+            logger.info(f"Data flow recovered {stall} - {dev.device_id}")
+            self.events.push(
+                EventCode.DATA_RECOVERED, value=stall["recover_ms"]
+            )
+
+        return DataWatchdog(
+            restart=lambda: self._restart_measurement(dev),
+            stall_s=wcfg["stall_s"],
+            startup_s=wcfg["startup_s"],
+            check_s=wcfg["check_s"],
+            auto_restart=wcfg["auto_restart"],
+            max_restarts=wcfg["max_restarts"],
+            on_stall=on_stall,
+            on_recover=on_recover,
+        )
+
+    def get_device(self, device_id: str | None = None) -> CTDevice:
+        if device_id is None:
+            return next(iter(self.devices.values()))
+        try:
+            return self.devices[str(device_id)]
+        except KeyError:
+            raise KeyError(
+                f"Unknown {device_id=}, available are {list(self.devices)}"
+            )
+
+    def _select_devices(self, device_id: str | None) -> list[CTDevice]:
+        """All devices if device_id is None, else only the selected one"""
+        if device_id is None:
+            return list(self.devices.values())
+        return [self.get_device(device_id)]
+
+    # Properties of the default device, kept for the single device use case
+    @property
+    def implant(self) -> pyapi.implant.Implant:
+        return self.get_device().implant
+
+    @property
+    def implant_info(self) -> pyapi.implantinfo.ImplantInfo:
+        return self.get_device().implant_info
+
+    @property
+    def ext_unit_info(self) -> pyapi.externalunitinfo.ExternalUnitInfo:
+        return self.get_device().ext_unit_info
+
+    @property
+    def listener(self) -> CTListener:
+        return self.get_device().listener
+
+    @property
+    def outlet(self) -> pylsl.StreamOutlet:
+        return self.get_device().outlet
+
+    @property
+    def stream_info(self) -> pylsl.StreamInfo:
+        return self.get_device().stream_info
+
+    @property
+    def cmds(self) -> pyapi.stimulationcommand.StimulationCommand | None:
+        return self.get_device().cmds
 
     def start_recording(
         self,
+        device_id: str | None = None,  # if None -> start all devices
         ) -> int:
         #-> tuple[threading.Thread | None, threading.Event]:
         self.stop_event.clear()
 
-        self.implant.start_measurement(
-            self.ref_channels,
-            # amplification_factor=pyapi.RecordingAmplificationFactor.AMPLIFICATION_57_5dB,
-            amplification_factor=pyapi.RecordingAmplificationFactor.AMPLIFICATION_39_5dB,
-            use_ground_electrode=True,
-        )
+        for dev in self._select_devices(device_id):
+            dev.listener.drop_stats.reset()
+            if dev.quality is not None:
+                dev.quality.reset()
+            dev.sinks.start()
+            self._start_measurement(dev)
+            dev.is_recording = True
+            if self.cfg["watchdog"]["enabled"]:
+                dev.watchdog.arm()
+                dev.watchdog.start()
 
         # # start streaming to LSL
         # self.streamer.start_streaming_thread()
@@ -113,85 +421,866 @@ class CTManager:
         # return self.streamer.thread, self.stop_event
         return 0
 
-    def stop_recording(self):
-        self.implant.stop_measurement()
-        self.stop_event.set()
+    def _start_measurement(self, dev: CTDevice):
+        dev.implant.start_measurement(
+            self.ref_channels,
+            amplification_factor=self.amplification,
+            use_ground_electrode=True,
+        )
+
+    def reconfigure_recording(
+        self,
+        ref_channels: list[int] | None = None,
+        amplification: str | None = None,  # see config.AMPLIFICATIONS
+        device_id: str | None = None,  # if None -> all devices
+        timeout_s: float = 2,
+    ) -> dict:
+        """
+        Change the reference channels and / or the amplification. Devices
+        which are measuring are restarted with stop_measurement followed by
+        start_measurement only - listeners, buffers, outlets and sinks stay
+        alive, so downstream consumers do not reconnect. The settings are
+        kept for all later starts, also of the other devices.
+
+        Returns
+        -------
+        dict
+            timings in ms per restarted device, see `_reconfigure_measurement`
+        """
+        if ref_channels is not None:
+            refs = [int(r) for r in ref_channels]
+            if not all(0 <= r < 32 for r in refs):
+                raise ValueError(f"{ref_channels=} must be within 0..31")
+            self.ref_channels = refs
+        if amplification is not None:
+            self.amplification = get_amplification_factor(amplification)
+
+        timings = {
+            dev.device_id: self._reconfigure_measurement(dev, timeout_s)
+            for dev in self._select_devices(device_id)
+            if dev.listener.is_measument_active
+        }
+        self.last_reconfigure_timing_ms = timings
+        logger.info(
+            f"Recording reconfigured {self.ref_channels=},"
+            f" {self.amplification=} - {timings}"
+        )
+        return timings
+
+    def _reconfigure_measurement(
+        self, dev: CTDevice, timeout_s: float
+    ) -> dict:
+        """
+        Restart the measurement with the current settings and wait for the
+        first packet. Timings in ms:
+
+            stop_ms         - the stop_measurement call
+            start_ms        - the start_measurement call (incl. re-arming
+                              the watchdog)
+            first_packet_ms - from issuing the start to the first packet,
+                              which can arrive before start_measurement
+                              returns
+            blackout_ms     - last packet before the stop to the first packet
+                              after the start
+
+        first_packet_ms and blackout_ms are None if no packet arrived within
+        `timeout_s`.
+        """
+        wd = dev.watchdog
+        armed = wd.armed
+        wd.disarm()  # the blackout is no stall
+        t_last_ns = wd.t_last_ns
+
+        t0 = time.perf_counter_ns()
+        try:
+            dev.implant.stop_measurement()
+        except RuntimeError:
+            logger.debug(f"Measurement already stopped - {dev.device_id}")
+        t1 = time.perf_counter_ns()
+        if armed:
+            wd.arm()
+        else:
+            wd.mark()
+        self._start_measurement(dev)
+        t2 = time.perf_counter_ns()
+
+        t_end = t2 + timeout_s * 1e9
+        while not wd.t_first_ns and time.perf_counter_ns() < t_end:
+            time.sleep(0.001)
+        t_first_ns = wd.t_first_ns
+
+        timing = {
+            "stop_ms": (t1 - t0) * 1e-6,
+            "start_ms": (t2 - t1) * 1e-6,
+            "first_packet_ms": (
+                (t_first_ns - t1) * 1e-6 if t_first_ns else None
+            ),
+            "blackout_ms": (
+                (t_first_ns - t_last_ns) * 1e-6
+                if t_first_ns and t_last_ns
+                else None
+            ),
+        }
+        if timing["blackout_ms"] is None:
+            logger.warning(
+                f"No packet within {timeout_s}s after reconfiguring"
+                f" - {dev.device_id}"
+            )
+        self.events.push(
+            EventCode.RECORDING_RECONFIGURED,
+            value=(
+                timing["blackout_ms"]
+                if timing["blackout_ms"] is not None
+                else np.nan
+            ),
+        )
+        return timing
+
+    def _restart_measurement(self, dev: CTDevice):
+        """Called by the watchdog of the device on a stall"""
+        logger.warning(f"Restarting the measurement - {dev.device_id}")
+        try:
+            dev.implant.stop_measurement()
+        except RuntimeError:
+            logger.debug(f"Measurement already stopped - {dev.device_id}")
+        self._start_measurement(dev)
+
+    def stop_recording(self, device_id: str | None = None):
+        for dev in self._select_devices(device_id):
+            dev.watchdog.disarm()
+            dev.implant.stop_measurement()
+            dev.is_recording = False
+        if not any(dev.is_recording for dev in self.devices.values()):
+            self.stop_event.set()
+
+    def add_sink(
+        self,
+        name: str,
+        sink,
+        device_id: str | None = None,
+        queue_n: int | None = None,
+        policy: str | None = None,
+    ) -> int:
+        """
+        Feed the packets of a device to `sink.process(data, cntr)` in a worker
+        thread of its own, see ct_bic.sinks. queue_n and policy default to
+        the [sinks] config.
+        """
+        dev = self.get_device(device_id)
+        dev.sinks.add(name, sink, queue_n=queue_n, policy=policy)
+        logger.info(f"Added sink {name} - {dev.device_id}")
+        return 0
+
+    def remove_sink(
+        self, name: str, device_id: str | None = None, timeout: float = 0.5
+    ):
+        """Process the queued packets and return the sink"""
+        return self.get_device(device_id).sinks.remove(name, timeout=timeout)
+
+    def start_archive(
+        self,
+        path: str | Path,
+        device_id: str | None = None,  # if None -> all devices
+    ) -> int:
+        """
+        Write the packets to a compressed archive (ct_bic.archive). With
+        multiple devices, the device id is appended to the file name.
+        """
+        path = Path(path)
+        devs = self._select_devices(device_id)
+        # before opening any file - a new writer would truncate a running
+        # archive of the same path
+        for dev in devs:
+            if "archive" in dev.sinks.workers:
+                raise KeyError(f"Archive already running - {dev.device_id}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for dev in devs:
+            pth = (
+                path
+                if len(self.devices) == 1
+                else path.with_stem(f"{path.stem}_{dev.device_id}")
+            )
+            self.add_sink(
+                "archive", ArchiveWriter(pth), device_id=dev.device_id
+            )
+        return 0
+
+    def stop_archive(self, device_id: str | None = None) -> int:
+        for dev in self._select_devices(device_id):
+            if "archive" in dev.sinks.workers:
+                # closed after the last queued packet is written
+                dev.sinks.remove("archive", close=True)
+        return 0
 
     def listen_for_stim_trigger(
         self,
+        device_id: str | None = None,
     ) -> tuple[threading.Thread, threading.Event]:
-        # TODO: If the listener is started, the module does not stop properly
-        # implement a better stopping for this
+        # only ever have one controller running
+        self.stop_listening()
         self.trigger_stop_event.clear()
         sw = StreamWatcher(
-            name=CFG["stim_control"]["stream_name"],
-            buffer_size_s=CFG["stim_control"]["buffer_size_s"],
+            name=self.cfg["stim_control"]["stream_name"],
+            buffer_size_s=self.cfg["stim_control"]["buffer_size_s"],
         )
 
-        callback = self.start_stimulation
+        def callback():
+            return self.start_stimulation(device_id=device_id)
 
         th = threading.Thread(
             target=threshold_single_control,
             args=(sw, callback, self.trigger_stop_event),
-            kwargs={"threshold": 127},
+            kwargs={
+                "params": self.control_params,
+                "events": self.events,
+                "scheduling": self.get_scheduling_policy("controller"),
+            },
+            name="threshold_control",
         )
         th.start()
 
         self.listen_th = th
+        self.listen_device_id = device_id
         self.sw = sw
 
         return th, self.trigger_stop_event
 
-    def is_recording(self) -> bool:
-        return not self.stop_event.isSet()
+    def stop_listening(self, timeout: float = 0.5) -> int:
+        stop_thread(self.listen_th, self.trigger_stop_event, timeout=timeout)
+        return 0
+
+    def get_biomarker(self, dev: CTDevice) -> Callable[[np.ndarray], float]:
+        ccfg = self.cfg["closed_loop"]
+        ch = ccfg["channel"]
+        if ccfg["biomarker"] == "value":
+            return latest_value(ch)
+        if ccfg["biomarker"] == "rms":
+            return rms(ch)
+        if dev.features is None:
+            raise ValueError(
+                "biomarker='band_power' requires [features] enabled = true"
+            )
+        return band_power(dev.features, ccfg["band"], ch)
+
+    def start_closed_loop(
+        self,
+        biomarker: Callable[[np.ndarray], float] | None = None,
+        device_id: str | None = None,
+    ) -> tuple[threading.Thread, threading.Event]:
+        """
+        Evaluate a biomarker on the packets of a device as they arrive and
+        start the stimulation on that device if it exceeds the threshold.
+        The biomarker is configured in [closed_loop] if None, or any
+        callable mapping a window of shape (window_n, 32) to a float.
+        """
+        self.stop_closed_loop()
+        dev = self.get_device(device_id)
+        biomarker = (
+            biomarker if biomarker is not None else self.get_biomarker(dev)
+        )
+
+        ch = self.cfg["closed_loop"]["channel"]
+        bad = dev.quality.bad_channels() if dev.quality is not None else {}
+        if ch in bad:
+            logger.warning(
+                f"Closed loop on channel {ch}, which is currently flagged as"
+                f" bad: {bad[ch]} - {dev.device_id}"
+            )
+
+        stage = ClosedLoopStage(
+            biomarker,
+            callback=lambda: self.start_stimulation(device_id=dev.device_id),
+            params=self.closed_loop_params,
+            window_n=max(int(self.cfg["closed_loop"]["window_s"] * 1000), 1),
+            events=self.events,
+            scheduling=self.get_scheduling_policy("controller"),
+        )
+        th, stop_event = stage.start()
+        # after the feature stage, so band powers are up to date
+        dev.listener.stages.append(stage)
+        self.closed_loop = stage
+        self.closed_loop_device_id = dev.device_id
+        logger.info(f"Closed loop running - {dev.device_id}")
+        return th, stop_event
+
+    def stop_closed_loop(self, timeout: float = 0.5) -> int:
+        if self.closed_loop is None:
+            return 0
+        stages = self.get_device(self.closed_loop_device_id).listener.stages
+        if self.closed_loop in stages:
+            stages.remove(self.closed_loop)
+        self.closed_loop.stop(timeout=timeout)
+        self.closed_loop = None
+        return 0
+
+    def is_recording(self, device_id: str | None = None) -> bool:
+        """
+        True if any of the selected devices (all if None) records, False if
+        none does or if the data flow of a recording one is stalled
+        """
+        devs = [d for d in self._select_devices(device_id) if d.is_recording]
+        return len(devs) > 0 and not any(d.watchdog.is_stalled for d in devs)
 
     def init_stim_cmds(
         self,
         cmds: list[pyapi.stimulationcommand.StimulationCommand] | None = None,
+        device_id: str | None = None,  # if None -> all devices
     ):
-        if cmds is not None:
-            self.cmds = cmds
-        else:
-            self.cmds = get_single_pulse_stim_cmd(self.implant)
+        for dev in self._select_devices(device_id):
+            if cmds is not None:
+                dev.cmds = cmds
+            else:
+                dev.cmds = get_single_pulse_stim_cmd(dev.implant)
+            dev.cmd_key += 1
 
-        # Enqueue directly to not require another function call
-        # --> Note the preloading version should give the fastest response time
-        self.implant.enqueue_stimulation_command(
-            self.cmds,
-            pyapi.StimulationMode.STIMMODE_PERSISTENT_CMD_PRELOADING,
-        )
+            # Enqueue directly to not require another function call
+            # --> Note the preloading version should give the fastest response time
+            dev.implant.enqueue_stimulation_command(
+                dev.cmds,
+                pyapi.StimulationMode.STIMMODE_PERSISTENT_CMD_PRELOADING,
+            )
+
+    def swap_stim_cmds(
+        self,
+        cmds: pyapi.stimulationcommand.StimulationCommand,
+        device_id: str | None = None,  # if None -> all devices
+    ) -> int:
+        """
+        Validate the new command now and swap it in once the next function
+        finished. While stimulating, the swap stops and restarts the
+        stimulation, within the function following the boundary - see
+        ct_bic.cmd_swap. Timings are reported in `stats()`.
+        """
+        for dev in self._select_devices(device_id):
+            dev.swapper.prepare(cmds)
+        return 0
 
-    def start_stimulation(self) -> int:
+    def _on_cmd_swap(
+        self,
+        dev: CTDevice,
+        cmds: pyapi.stimulationcommand.StimulationCommand,
+        timing: dict,
+    ):
+        dev.cmds = cmds
+        dev.cmd_key += 1
+        if timing["running"]:
+            logger.debug(f"Swapped stim cmds {timing} - {dev.device_id}")
+            self.events.push(
+                EventCode.STIM_CMD_SWAP,
+                value=timing["gap_us"],
+                cmd_key=dev.cmd_key,
+            )
+
+    def start_stimulation(self, device_id: str | None = None) -> int:
         self.i_pulse += 1
-        logger.debug("Starting stimulation - {self.i_pulse}")
-        self.implant.start_stimulation()
+        dev = self.get_device(device_id)
+        logger.debug(f"Starting stimulation - {self.i_pulse} - {dev.device_id}")
+        self.events.add(
+            EventCode.STIM_START, value=self.i_pulse, cmd_key=dev.cmd_key
+        )
+        dev.implant.start_stimulation()
+        self.events.flush()
         return 0
 
-    def stop_stimulation(self) -> int:
-        self.implant.stop_stimulation()
+    def stop_stimulation(self, device_id: str | None = None) -> int:
+        dev = self.get_device(device_id)
+        dev.implant.stop_stimulation()
+        self.events.push(EventCode.STIM_STOP, cmd_key=dev.cmd_key)
         return 0
 
-    def __del__(self):
-        logger.debug("CTManager closing implant")
-        self.stop_event.set()
-        self.trigger_stop_event.set()
-        if self.implant:
+    def get_drop_stats(self, device_id: str | None = None) -> dict:
+        """Summary of dropped packets since the last start_recording"""
+        return {
+            dev.device_id: dev.listener.drop_stats.summary()
+            for dev in self._select_devices(device_id)
+        }
+
+    def get_signal_quality(self, device_id: str | None = None) -> dict:
+        """
+        Running quality metrics per channel and the channels exceeding the
+        [quality] limits, None for devices without [quality] enabled
+        """
+        return {
+            dev.device_id: (
+                dev.quality.summary() if dev.quality is not None else None
+            )
+            for dev in self._select_devices(device_id)
+        }
+
+    def stats(
+        self, device_id: str | None = None, consumer: str = "request"
+    ) -> dict:
+        """
+        Hot path counters and queue depths per device. Rates are computed
+        since the previous call of the same `consumer`, the periodic
+        publisher (see publish_stats) has its own.
+        """
+        stats = {}
+        for dev in self._select_devices(device_id):
+            lst = dev.listener
+            sweeper = self.impedance_sweepers[dev.device_id]
+            stats[dev.device_id] = {
+                "callback": (
+                    lst.stats.summary(consumer)
+                    if lst.stats is not None
+                    else None
+                ),
+                "degradation_level": (
+                    lst.degradation.level
+                    if lst.degradation is not None
+                    else None
+                ),
+                "drop_rate": lst.drop_stats.drop_rate,
+                "cmd_swaps": dev.swapper.summary(),
+                # of the SDK callback thread, see [scheduling]
+                "scheduling": lst.scheduling_report,
+                "watchdog": dev.watchdog.summary(),
+                "sinks": dev.sinks.summary(),
+                "bad_channels": (
+                    dev.quality.bad_channels()
+                    if dev.quality is not None
+                    else None
+                ),
+                "queues": {
+                    # samples written to the ring buffer by its sink and
+                    # not consumed by get_new_data, at most the buffer size
+                    # as older ones are overwritten
+                    "ring_buffer_unread": min(
+                        lst.n_unread, len(lst.ringbuffer.buffer)
+                    ),
+                    # samples held back by the blanking delay line
+                    "blanking_delay": (
+                        lst.blanker.pre_n if lst.blanker is not None else 0
+                    ),
+                    "impedance_requests": sweeper.requests.qsize(),
+                },
+            }
+        stats["events_pending"] = self.events.n_pending
+        if self.closed_loop is not None:
+            stats["closed_loop"] = self.closed_loop.summary()
+        return stats
+
+    def publish_stats(
+        self, interval_s: float | None = None
+    ) -> tuple[threading.Thread, threading.Event]:
+        """Periodically push `stats()` as json to an LSL string stream"""
+        stop_thread(self.stats_th, self.stats_stop_event)
+        self.stats_stop_event.clear()
+        self.stats_th = threading.Thread(
+            target=publish_stats,
+            kwargs={
+                "get_stats": lambda: self.stats(consumer="publish"),
+                "stop_event": self.stats_stop_event,
+                "outlet": get_stats_outlet(
+                    self.cfg["stats"]["stream_name"],
+                    **get_outlet_params(self.cfg, "stats"),
+                ),
+                "interval_s": (
+                    interval_s
+                    if interval_s is not None
+                    else self.cfg["stats"]["publish_interval_s"]
+                ),
+            },
+            daemon=True,
+            name="publish_stats",
+        )
+        self.stats_th.start()
+        return self.stats_th, self.stats_stop_event
+
+    def measure_jitter(
+        self, role: str | None = None, duration_s: float = 2
+    ) -> dict:
+        """
+        Wake up latencies of a probe thread with the [scheduling] policy of
+        `role` (all roles if None) and, for comparison, reset to the process
+        defaults.
+        Takes duration_s per policy, see ct_bic.scheduling.measure_jitter
+        """
+        roles = [role] if role is not None else list(SCHEDULING_ROLES)
+        interval_s = self.cfg["scheduling"]["probe_interval_s"]
+        results = {
+            "default": measure_jitter(None, duration_s, interval_s),
+        }
+        for r in roles:
+            results[r] = measure_jitter(
+                get_scheduling_policy(self.cfg, r), duration_s, interval_s
+            )
+        return results
+
+    def start_impedance_sweep(
+        self,
+        device_id: str | None = None,  # if None -> all devices
+        channels: list[int] | None = None,  # if None -> all channels
+    ) -> int:
+        """
+        Queue an impedance sweep and return immediately. Sweeps only start
+        while a device is not measuring, results are available via
+        `get_impedances` as they come in.
+        """
+        for dev in self._select_devices(device_id):
+            self.impedance_sweepers[dev.device_id].request_sweep(channels)
+        return 0
+
+    def get_impedances(self, device_id: str | None = None) -> dict:
+        """Latest cached impedance sweep per device, never blocks"""
+        return self.impedance_cache.get(device_id)
+
+    def wait_for_impedances(
+        self, device_id: str | None = None, timeout: float | None = None
+    ) -> bool:
+        return all(
+            self.impedance_sweepers[dev.device_id].wait(timeout=timeout)
+            for dev in self._select_devices(device_id)
+        )
+
+    def schedule_impedance_sweeps(
+        self, interval_s: float = 600, device_id: str | None = None
+    ) -> tuple[threading.Thread, threading.Event]:
+        """Periodic sweeps, run in between recording blocks"""
+        self.impedance_stop_event.clear()
+        devs = self._select_devices(device_id)
+
+        th = threading.Thread(
+            target=periodic_sweeps,
+            kwargs={
+                "request_sweep": lambda: self.start_impedance_sweep(device_id),
+                "is_busy": lambda: any(
+                    d.listener.is_measument_active for d in devs
+                ),
+                "stop_event": self.impedance_stop_event,
+                "interval_s": interval_s,
+            },
+            daemon=True,
+            name="impedance_schedule",
+        )
+        th.start()
+        self.impedance_th = th
+
+        return th, self.impedance_stop_event
+
+    def apply_config(
+        self, changes: dict[tuple[str, str], tuple], new_cfg: dict
+    ) -> dict[str, str]:
+        """
+        Apply changes of a validated config without restarting the
+        measurement. Returns a report of {"section.key": status}, with status
+        starting with either "applied", "deferred" (takes effect with the
+        next start_recording) or "rejected" (requires a new CTManager).
+        Each section has a handler `_apply_<section>_config(key, old, new)`
+        returning the status, rejected changes are not taken over into
+        `self.cfg`.
+        """
+        handlers = {
+            "stim_control": self._apply_stim_control_config,
+            "closed_loop": self._apply_closed_loop_config,
+            "lsl": self._apply_lsl_config,
+            "recording": self._apply_recording_config,
+            "sinks": self._apply_sinks_config,
+            "watchdog": self._apply_watchdog_config,
+            "config_watcher": self._apply_config_watcher_config,
+            "blanking": self._apply_blanking_config,
+            "stats": self._apply_stats_config,
+            "degradation": self._apply_degradation_config,
+            "outlets": self._apply_outlets_config,
+            "quality": self._apply_quality_config,
+            "scheduling": self._apply_scheduling_config,
+            "features": self._apply_features_config,
+        }
+        report = {}
+        for (section, key), (old, new) in changes.items():
+            handler = handlers.get(section)
+            status = (
+                handler(key, old, new)
+                if handler is not None
+                else "ignored: unknown config key"
+            )
+            report[f"{section}.{key}"] = status
+            if status.startswith(("applied", "deferred")):
+                self.cfg.setdefault(section, {})[key] = new
+
+        if CONTROLLER_RECONNECTED in report.values():
+            # once all changes are in self.cfg
+            self.listen_for_stim_trigger(device_id=self.listen_device_id)
+
+        return report
+
+    def _apply_stim_control_config(self, key: str, old, new) -> str:
+        if key in ("threshold", "grace_period_s"):
+            setattr(self.control_params, key, new)
+            return "applied"
+        if key == "channel":
+            sw = getattr(self, "sw", None)
+            n_ch = len(getattr(sw, "channel_names", []))
+            if self.is_listening() and n_ch and new >= n_ch:
+                return f"rejected: control stream has only {n_ch} channels"
+            self.control_params.channel = new
+            return "applied"
+        # a running controller is reconnected by apply_config
+        return (
+            CONTROLLER_RECONNECTED
+            if self.is_listening()
+            else "applied: effective with the next LISTEN"
+        )
+
+    def _apply_closed_loop_config(self, key: str, old, new) -> str:
+        if key in ("threshold", "grace_period_s"):
+            setattr(self.closed_loop_params, key, new)
+            return "applied"
+        return "applied: effective with the next CLOSED_LOOP"
+
+    def _apply_lsl_config(self, key: str, old, new) -> str:
+        if key != "buffer_size_s":
+            return OUTLETS_REJECTED
+        for dev in self.devices.values():
+            # plain attribute swap - the callback thread either sees the old
+            # or the new buffer
+            dev.listener.ringbuffer = RingBuffer(shape=(int(new * 1000), 32))
+        self.buffer_size_s = new
+        return "applied: ring buffers were reset"
+
+    def _apply_recording_config(self, key: str, old, new) -> str:
+        timings = self.reconfigure_recording(**{key: new})
+        if not timings:
+            return "deferred: effective with the next start_recording"
+        return "applied: measurement restarted, blackout " + ", ".join(
+            (
+                f"{device_id}={t['blackout_ms']:.1f}ms"
+                if t["blackout_ms"] is not None
+                else f"{device_id}=no data"
+            )
+            for device_id, t in timings.items()
+        )
+
+    def _apply_sinks_config(self, key: str, old, new) -> str:
+        if key in ("policy", "block_timeout_s"):
+            for dev in self.devices.values():
+                setattr(dev.sinks, key, new)
+                for worker in dev.sinks.workers.values():
+                    setattr(worker, key, new)
+            return "applied"
+        if key == "queue_n":
+            for dev in self.devices.values():
+                dev.sinks.queue_n = new
+            return "applied: effective for sinks added later"
+        return (
+            "rejected: the default sinks cannot be changed while running,"
+            " requires a restart of the module"
+        )
+
+    def _apply_watchdog_config(self, key: str, old, new) -> str:
+        if key == "enabled" and new:
+            return "deferred: effective with the next start_recording"
+        for dev in self.devices.values():
+            if key == "enabled":
+                dev.watchdog.disarm()
+            else:
+                setattr(dev.watchdog, key, new)
+        return "applied"
+
+    def _apply_config_watcher_config(self, key: str, old, new) -> str:
+        if key == "poll_s" and self.config_watcher is not None:
+            self.config_watcher.poll_s = new
+        return "applied"
+
+    def _apply_blanking_config(self, key: str, old, new) -> str:
+        if key not in ("post_s", "mode") or not all(
+            d.listener.blanker for d in self.devices.values()
+        ):
+            return (
+                "rejected: the blanking delay and the outlet layout cannot"
+                " be changed while running, requires a restart of the module"
+            )
+        for dev in self.devices.values():
+            if key == "post_s":
+                dev.listener.blanker.post_n = int(new * 1000)
+            else:
+                dev.listener.blanker.mode = new
+        return "applied"
+
+    def _apply_stats_config(self, key: str, old, new) -> str:
+        if key != "enabled":
+            return "applied: effective with the next PUBLISH_STATS"
+        for dev in self.devices.values():
+            dev.listener.stats = HotPathStats() if new else None
+        return "applied"
+
+    def _apply_degradation_config(self, key: str, old, new) -> str:
+        self.cfg["degradation"][key] = new
+        for dev in self.devices.values():
+            # a new policy starts at level 0, pending chunks are still
+            # flushed by the listener
+            dev.listener.degradation = self.get_degradation_policy(
+                dev.device_id
+            )
+        return "applied: degradation level was reset"
+
+    def _apply_outlets_config(self, key: str, old, new) -> str:
+        if key == "stats":
+            return "applied: effective with the next PUBLISH_STATS"
+        if key == "data" and all(
+            (old or {}).get(k) == new[k] for k in new if k != "push_chunk_n"
+        ):
+            for dev in self.devices.values():
+                # a pending chunk is flushed with the next sample
+                dev.listener.chunk_n = new["push_chunk_n"]
+            return "applied"
+        return OUTLETS_REJECTED
+
+    def _apply_quality_config(self, key: str, old, new) -> str:
+        if key not in (
+            "flat_eps",
+            "saturation_level",
+            "max_flat",
+            "max_saturated",
+            "max_line_ratio",
+        ):
+            return (
+                "rejected: the quality stage and outlet cannot be changed"
+                " while running, requires a restart of the module"
+            )
+        for dev in self.devices.values():
+            if dev.quality is not None:
+                # plain attributes, read with the next packet
+                setattr(dev.quality, key, new)
+        return "applied"
+
+    def _apply_scheduling_config(self, key: str, old, new) -> str:
+        if key == "server":
+            return (
+                "rejected: the server loop is scheduled at startup,"
+                " requires a restart of the module"
+            )
+        if key == "controller":
+            return "applied: effective with the next LISTEN / CLOSED_LOOP"
+        if key == "callback":
+            self.cfg["scheduling"][key] = new
+            for dev in self.devices.values():
+                dev.listener.set_scheduling(
+                    self.get_scheduling_policy("callback")
+                )
+            return "applied: with the next packet"
+        return "applied"
+
+    def _apply_features_config(self, key: str, old, new) -> str:
+        return (
+            "rejected: feature outlets cannot be changed while running,"
+            " requires a restart of the module"
+        )
+
+    def _get_config_watcher(self) -> ConfigWatcher:
+        if self.config_watcher is None:
+            self.config_watcher = ConfigWatcher(
+                self.cfg,
+                self.apply_config,
+                poll_s=self.cfg["config_watcher"]["poll_s"],
+            )
+        return self.config_watcher
+
+    def reload_config(self) -> dict[str, str]:
+        """Check the config file now instead of waiting for the next poll"""
+        return self._get_config_watcher().check(force=True)
+
+    def watch_config(self) -> tuple[threading.Thread, threading.Event]:
+        """Poll the config file and apply changes as they appear"""
+        watcher = self._get_config_watcher()
+        stop_thread(watcher.thread, watcher.stop_event)
+        return watcher.start()
+
+    def is_listening(self) -> bool:
+        return self.listen_th is not None and self.listen_th.is_alive()
+
+    def stop(self, timeout: float = 0.5) -> float:
+        """
+        Stop all worker threads and measurements, but keep the implants
+        powered so that a restart via `start_recording` and
+        `listen_for_stim_trigger` is fast.
+
+        Returns
+        -------
+        float
+            time in seconds it took to stop everything
+        """
+        t0 = time.perf_counter()
+        self.stop_listening(timeout=timeout)
+        self.stop_closed_loop(timeout=timeout)
+        if self.config_watcher is not None:
+            stop_thread(
+                self.config_watcher.thread,
+                self.config_watcher.stop_event,
+                timeout,
+            )
+        stop_thread(self.impedance_th, self.impedance_stop_event, timeout)
+        stop_thread(self.stats_th, self.stats_stop_event, timeout)
+        for sweeper in self.impedance_sweepers.values():
+            sweeper.stop(timeout=timeout)
+
+        for dev in self.devices.values():
+            dev.swapper.cancel(timeout=timeout)
+            dev.watchdog.stop(timeout=timeout)
             try:
-                self.implant.stop_measurement()
+                dev.implant.stop_measurement()
             except RuntimeError:
-                logger.debug("Measurement already stopped")
-            self.implant.set_implant_power(False)
+                logger.debug(f"Measurement already stopped - {dev.device_id}")
+            # after the measurement, so that the last packets are processed
+            dev.sinks.stop(timeout=timeout)
+            dev.is_recording = False
+        self.stop_event.set()
+
+        dt = time.perf_counter() - t0
+        logger.debug(f"CTManager stopped in {dt * 1e3:.1f}ms")
+        return dt
+
+    def restart(self, timeout: float = 0.5) -> int:
+        """
+        Stop and restart recording, and the trigger listener if it was
+        running. Timings are kept in `self.last_restart_timing_s`.
+        """
+        was_listening = self.is_listening()
+        dt_stop = self.stop(timeout=timeout)
+
+        t0 = time.perf_counter()
+        self.start_recording()
+        if was_listening:
+            self.listen_for_stim_trigger(device_id=self.listen_device_id)
+        dt_start = time.perf_counter() - t0
+
+        self.last_restart_timing_s = {"stop": dt_stop, "start": dt_start}
+        logger.info(
+            f"Restarted in {(dt_stop + dt_start) * 1e3:.1f}ms - "
+            f"stop={dt_stop * 1e3:.1f}ms, start={dt_start * 1e3:.1f}ms"
+        )
+        return 0
+
+    def close(self, timeout: float = 0.5):
+        """Stop all threads and power down the implants, safe to call twice"""
+        if self.is_closed:
+            return
+
+        logger.debug("CTManager closing implants")
+        self.stop(timeout=timeout)
+        for dev in self.devices.values():
+            dev.sinks.close(timeout=timeout)
+            dev.implant.set_implant_power(False)
+        self.is_closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # only a fallback - use close() or the context manager
+        if hasattr(self, "is_closed"):
+            self.close()
 
 
 if __name__ == "__main__":
 
     logger.setLevel(10)
 
-    # Using ch4 as ref, 1 = stim, 2 = ret, 3 = sinus input
-    ctm = CTManager(ref_channels=[4])
-
-    # cmds = get_nsec_130Hz_stim(ctm.implant, 0.5)
-    # ctm.init_stim_cmds(cmds=cmds)
+    # Using ch4 as ref (see config.toml), 1 = stim, 2 = ret, 3 = sinus input
+    ctm = CTManager()
 
     # Default single stimulation pulse
     ctm.init_stim_cmds()
@@ -214,21 +1303,10 @@ if __name__ == "__main__":
     print("Stopping recording")
     ctm.stop_recording()
 
-    print("Closing threads")
-    ctm.stop_event.set()
-    ctm.trigger_stop_event.set()
-
-    # waiting for the threads to stop
-    import time
-
-    time.sleep(5)
-    print("setting power to false")
-    ctm.implant.set_implant_power(False)
-
-    print("deleting variable")
-    del ctm
+    print("Closing threads and setting power to false")
+    ctm.close()
 
-    print("deleted")
+    print("closed")
 
     # Run full time
     # import time
@@ -0,0 +1,251 @@
+# Running signal quality metrics per channel, to spot flat, saturated or line
+# noise dominated contacts while recording. Packets are only copied to a
+# small block in the callback, every `block_s` the block is folded into
+# exponential averages over `tau_s` with a few vectorized operations - so the
+# cost per packet is constant and independent of the averaging time:
+#
+#   rms         - standard deviation, i.e. without the DC offset
+#   flat        - fraction of samples which did not change (|diff| <= eps)
+#   saturated   - fraction of samples at or above the clipping level
+#   line_ratio  - power at the line frequency over the total power, from a
+#                 single bin demodulation (a sliding Goertzel filter)
+import numpy as np
+import pylsl
+
+from ct_bic.utils.logging import logger
+
+QUALITY_METRICS = ("rms", "flat", "saturated", "line_ratio")
+
+
+def get_quality_outlet(
+    stream_name: str,
+    n_channels: int = 32,
+    sfreq: float = 1,
+    source_id: str | None = None,
+    max_buffered: int = 10,
+    chunk_size: int = 0,
+) -> pylsl.StreamOutlet:
+    """One channel per metric and input channel, labeled <metric>_Ch_<i>"""
+    info = pylsl.StreamInfo(
+        name=stream_name,
+        type="Quality",
+        channel_count=len(QUALITY_METRICS) * n_channels,
+        nominal_srate=sfreq,
+        channel_format="float32",
+        source_id=source_id if source_id is not None else f"{stream_name}_id",
+    )
+    chns = info.desc().append_child("channels")
+    for metric in QUALITY_METRICS:
+        for i in range(n_channels):
+            ch = chns.append_child("channel")
+            ch.append_child_value("label", f"{metric}_Ch_{i}")
+
+    return pylsl.StreamOutlet(
+        info, chunk_size=chunk_size, max_buffered=max_buffered
+    )
+
+
+class SignalQualityStage:
+    """
+    Parameters
+    ----------
+    sfreq : float
+        sampling rate of the input data
+    n_channels : int
+        number of input channels
+    tau_s : float
+        time constant of the exponential averages
+    line_freq : float
+        frequency of the line noise, 50 or 60Hz
+    flat_eps : float
+        largest change between two samples which still counts as flat
+    saturation_level : float
+        absolute value from which a sample counts as clipped
+    max_flat, max_saturated, max_line_ratio : float
+        limits of the fractions / ratio above which a channel is bad
+    block_s : float
+        samples are collected and folded into the averages in blocks of this
+        duration, i.e. the delay of the metrics
+    publish_interval_s : float
+        time between two pushes to the outlet, a multiple of block_s
+    outlet : pylsl.StreamOutlet | None
+        if provided, the metrics are pushed here, see `get_quality_outlet`
+
+    Attributes
+    ----------
+    latest : np.ndarray
+        metrics of shape (len(QUALITY_METRICS), n_channels), updated with
+        every publish interval - see `compute` for the latest block
+    """
+
+    def __init__(
+        self,
+        sfreq: float = 1000,
+        n_channels: int = 32,
+        tau_s: float = 1,
+        line_freq: float = 50,
+        flat_eps: float = 0,
+        saturation_level: float = np.inf,
+        max_flat: float = 0.5,
+        max_saturated: float = 0.01,
+        max_line_ratio: float = 0.5,
+        block_s: float = 0.1,
+        publish_interval_s: float = 1,
+        outlet: pylsl.StreamOutlet | None = None,
+    ):
+        self.sfreq = sfreq
+        self.n_channels = n_channels
+        self.alpha = 1 / (tau_s * sfreq)  # weight of a new sample
+        self.omega = 2 * np.pi * line_freq / sfreq
+        self.flat_eps = flat_eps
+        self.saturation_level = saturation_level
+        self.max_flat = max_flat
+        self.max_saturated = max_saturated
+        self.max_line_ratio = max_line_ratio
+        self.block_n = max(int(block_s * sfreq), 1)
+        self.publish_n = max(int(publish_interval_s * sfreq), 1)
+        self.outlet = outlet
+
+        # exponential averages per channel. Rows are the mean, mean square,
+        # flat and saturated fractions and the real and imaginary part of the
+        # demodulated line frequency, and the number of samples folded into
+        # them. Replaced as a whole with every block and never changed in
+        # place, so that other threads always read a consistent pair
+        self._state: tuple[np.ndarray, int] = (np.zeros((6, n_channels)), 0)
+        self._prev = np.zeros(n_channels)  # last sample, for the flat check
+        # decay of the old averages and weights of the samples of a block,
+        # the same as single sample updates avg += alpha * (x - avg)
+        a = self.alpha
+        self._decay = (1 - a) ** self.block_n
+        self._w = a * (1 - a) ** np.arange(self.block_n - 1, -1, -1)
+
+        # the block being collected in the callback, with the sample index
+        # of each sample for the phase of the line frequency
+        self._block = np.zeros((self.block_n, n_channels))
+        self._block_i = np.zeros(self.block_n, dtype=np.int64)
+        self._block_fill = 0
+        self._i = 0
+        self._last_cntr: int | None = None
+        self._n_since_publish = 0
+        self.n_samples = 0
+        self.latest = np.zeros((len(QUALITY_METRICS), n_channels))
+
+    def add(self, data: np.ndarray, cntr: int | None = None):
+        """Add samples of shape (n_samples, n_channels)"""
+        n = len(data)
+        if cntr is not None and self._last_cntr is not None:
+            # keep the phase of the line frequency across dropped packets
+            gap = cntr - self._last_cntr - 1
+            if gap > 0:
+                self._i += gap * n
+        self._last_cntr = cntr
+
+        j = 0
+        while j < n:
+            f = self._block_fill
+            k = min(n - j, self.block_n - f)
+            self._block[f : f + k] = data[j : j + k]
+            self._block_i[f : f + k] = range(self._i + j, self._i + j + k)
+            self._block_fill += k
+            j += k
+            if self._block_fill == self.block_n:
+                self._fold_block()
+        self._i += n
+        self.n_samples += n
+
+    def _fold_block(self):
+        x = self._block
+        flat = np.abs(np.diff(x, axis=0, prepend=self._prev[None, :])) <= (
+            self.flat_eps
+        )
+        old, n_avg = self._state
+        if n_avg == 0:
+            flat[0] = False
+        # demodulate without the offset, which would leak into the line bin
+        mean = old[0] / self._w_sum(n_avg) if n_avg > 0 else x[0]
+        phase = -self.omega * self._block_i
+        w = self._w
+        line = np.stack((w * np.cos(phase), w * np.sin(phase))) @ (x - mean)
+
+        avg = old * self._decay
+        avg[0] += w @ x
+        avg[1] += w @ (x * x)
+        avg[2] += w @ flat
+        avg[3] += w @ (np.abs(x) >= self.saturation_level)
+        avg[4:] += line
+        self._state = (avg, n_avg + self.block_n)
+
+        self._prev[:] = x[-1]
+        self._block_fill = 0
+        self._n_since_publish += self.block_n
+        if self._n_since_publish >= self.publish_n:
+            self._n_since_publish = 0
+            self.latest = self.compute()
+            if self.outlet is not None:
+                self.outlet.push_sample(self.latest.ravel())
+
+    def _w_sum(self, n_avg: int) -> float:
+        # total weight of the averages - dividing by it avoids that they are
+        # underestimated at the start, while the zeros they start from count
+        return 1 - (1 - self.alpha) ** n_avg
+
+    def compute(self) -> np.ndarray:
+        """
+        Metrics of shape (len(QUALITY_METRICS), n_channels) as of the last
+        block, a new array - so it can be called from other threads
+        """
+        m = np.zeros((len(QUALITY_METRICS), self.n_channels))
+        avg, n_avg = self._state
+        if n_avg == 0:
+            return m
+        mean, sq, flat, sat, re, im = avg / self._w_sum(n_avg)
+        var = sq - mean**2
+        # rounding errors of the difference, e.g. of a flat channel
+        var[var <= 1e-9 * sq] = 0
+        # |line|^2 is a quarter of the squared amplitude of the sinusoid,
+        # whose power is half of its squared amplitude
+        line_power = 2 * (re**2 + im**2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(var > 0, line_power / var, 0)
+        m[0] = np.sqrt(var)
+        m[1] = flat
+        m[2] = sat
+        m[3] = np.minimum(ratio, 1)
+        return m
+
+    def process(self, data: np.ndarray, cntr: int):
+        """Entry point for CTListener stages"""
+        self.add(data, cntr)
+
+    def bad_channels(
+        self, m: np.ndarray | None = None
+    ) -> dict[int, list[str]]:
+        """{channel: [reasons]} for channels exceeding any of the limits"""
+        m = m if m is not None else self.compute()
+        bad = {}
+        for name, i, limit in (
+            ("flat", 1, self.max_flat),
+            ("saturated", 2, self.max_saturated),
+            ("line_ratio", 3, self.max_line_ratio),
+        ):
+            for ch in np.flatnonzero(m[i] > limit):
+                bad.setdefault(int(ch), []).append(name)
+        return dict(sorted(bad.items()))
+
+    def summary(self) -> dict:
+        m = self.compute()
+        summary = {
+            metric: m[i].round(4).tolist()
+            for i, metric in enumerate(QUALITY_METRICS)
+        }
+        summary["n_samples"] = self.n_samples
+        summary["bad_channels"] = self.bad_channels(m)
+        return summary
+
+    def reset(self):
+        logger.debug("Resetting signal quality metrics")
+        self._state = (np.zeros((6, self.n_channels)), 0)
+        self._block_fill = 0
+        self._last_cntr = None
+        self._n_since_publish = 0
+        self.n_samples = 0
@@ -0,0 +1,212 @@
+# Replay recorded sessions (csv dumps of `buffers_to_df`) through the
+# pyapi.ImplantListener interface, i.e. into a CTListener and whatever is
+# consuming its data, in real time, N x real time or as fast as possible.
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from ct_bic.archive import SUFFIX as ARCHIVE_SUFFIX
+from ct_bic.archive import ArchiveReader
+from ct_bic.utils.global_setup import pyapi
+from ct_bic.utils.logging import logger
+
+
+@dataclass
+class ReplaySample:
+    """
+    Duck-typed stand-in for pyapi.Sample with the attributes used in
+    on_data - for replays, synthetic data and tests alike
+    """
+
+    measurements: list[float]
+    measurement_counter: int
+
+
+def load_recording(path: Path | str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load a csv written from `buffers_to_df`, or an archive (see
+    ct_bic.archive)
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        (data of shape (n_samples, n_channels) as float32, counters as int64)
+    """
+    if Path(path).suffix == ARCHIVE_SUFFIX:
+        with ArchiveReader(path) as rd:
+            data, cntr, _ = rd.read_all()
+        return data, cntr
+
+    df = pd.read_csv(path)
+    ch_cols = [c for c in df.columns if c.startswith("Ch_")]
+    data = df[ch_cols].to_numpy(dtype=np.float32)
+    cntr = df["cntr"].to_numpy(dtype=np.int64)
+    return data, cntr
+
+
+@dataclass
+class ReplayStats:
+    n_packets: int = 0
+    wall_time_s: float = 0
+    replay_time_s: float = 0  # time span covered by the replayed counters
+    max_lateness_s: float = 0  # worst delay against the schedule (paced only)
+
+    @property
+    def speed(self) -> float:
+        return self.replay_time_s / self.wall_time_s if self.wall_time_s else 0
+
+
+class ReplayEngine:
+    """
+    Feed recorded samples and counters to listeners.
+
+    Timing is derived from the measurement counter, i.e. packet i is due at
+    (cntr[i] - cntr[0]) / (sfreq * speed) after the start, so gaps of dropped
+    packets are replayed as gaps. With `speed=0` packets are pushed as fast
+    as possible. Either way `t_replay` always holds the recording time of
+    the current packet, so that consumers can evaluate on the recording's
+    time base and results do not depend on the replay speed.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        samples of shape (n_samples, n_channels)
+    cntr : np.ndarray
+        measurement counters, one per sample
+    listeners : list[pyapi.ImplantListener]
+        listeners which get `on_data` called for every packet
+    speed : float
+        1 = real time, N = N x real time, 0 = as fast as possible
+    sfreq : float
+        sampling frequency of the recording
+    on_packet : Callable[[np.ndarray, int, float], None] | None
+        optional callback with (sample, counter, t_replay) called after the
+        listeners, e.g. to evaluate a controller
+    """
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        cntr: np.ndarray,
+        listeners: list[pyapi.ImplantListener],
+        speed: float = 1,
+        sfreq: float = 1000,
+        on_packet: Callable[[np.ndarray, int, float], None] | None = None,
+    ):
+        assert len(data) == len(cntr), "Need one counter per sample"
+        self.data = data
+        self.cntr = cntr
+        self.listeners = listeners
+        self.speed = speed
+        self.sfreq = sfreq
+        self.on_packet = on_packet
+
+        self.t_replay = 0.0
+        self.stats = ReplayStats()
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def run(self) -> ReplayStats:
+        """Blocking replay of all samples"""
+        self.stop_event.clear()
+        stats = ReplayStats()
+
+        # converting in one go is much faster than per sample
+        samples = self.data.tolist()
+        t_rel = (self.cntr - self.cntr[0]) / self.sfreq
+
+        for listener in self.listeners:
+            listener.on_measurement_state_changed(True)
+
+        t0 = time.perf_counter()
+        for i, (s, c) in enumerate(zip(samples, self.cntr.tolist())):
+            if self.stop_event.is_set():
+                break
+
+            if self.speed > 0:
+                t_due = t0 + t_rel[i] / self.speed
+                while (dt := t_due - time.perf_counter()) > 0:
+                    # sleep coarse, then spin for the last ms
+                    if dt > 0.002:
+                        time.sleep(dt - 0.001)
+
+                lateness = time.perf_counter() - t_due
+                stats.max_lateness_s = max(stats.max_lateness_s, lateness)
+
+            self.t_replay = t_rel[i]
+            sample = ReplaySample(measurements=s, measurement_counter=c)
+            for listener in self.listeners:
+                listener.on_data(sample)
+
+            if self.on_packet is not None:
+                self.on_packet(self.data[i], c, self.t_replay)
+
+            stats.n_packets += 1
+
+        stats.wall_time_s = time.perf_counter() - t0
+        stats.replay_time_s = (
+            float(t_rel[stats.n_packets - 1]) if stats.n_packets else 0
+        )
+
+        for listener in self.listeners:
+            listener.on_measurement_state_changed(False)
+
+        self.stats = stats
+        logger.debug(
+            f"Replayed {stats.n_packets} packets in {stats.wall_time_s:.2f}s"
+            f" - {stats.speed:.1f}x real time"
+        )
+        return stats
+
+    def start(self) -> tuple[threading.Thread, threading.Event]:
+        """Replay in a background thread, as the SDK callback thread would"""
+        self.thread = threading.Thread(target=self.run, name="replay")
+        self.thread.start()
+        return self.thread, self.stop_event
+
+
+def replay_files(
+    paths: list[Path | str],
+    listeners: list[pyapi.ImplantListener],
+    speed: float = 0,
+    sfreq: float = 1000,
+    on_packet: Callable[[np.ndarray, int, float], None] | None = None,
+) -> list[ReplayStats]:
+    """Replay several recordings one after the other"""
+    stats = []
+    for pth in paths:
+        data, cntr = load_recording(pth)
+        logger.info(f"Replaying {pth} - {len(cntr)} samples")
+        engine = ReplayEngine(
+            data,
+            cntr,
+            listeners,
+            speed=speed,
+            sfreq=sfreq,
+            on_packet=on_packet,
+        )
+        stats.append(engine.run())
+    return stats
+
+
+if __name__ == "__main__":
+    from fire import Fire
+
+    from ct_bic.listener import CTListener
+    from ct_bic.lsl import get_stream_outlet
+
+    def main(
+        *paths: str, speed: float = 1, stream_name: str = "ct_bic_replay"
+    ):
+        """Replay csv recordings to an LSL stream, e.g. for downstream tests"""
+        outlet, _ = get_stream_outlet(stream_name, sfreq=1000, n_channels=32)
+        listener = CTListener(outlet=outlet)
+        for st in replay_files(list(paths), [listener], speed=speed):
+            print(st)
+
+    Fire(main)
@@ -0,0 +1,192 @@
+# Scheduling of the latency critical threads - the SDK callback thread of
+# each device, the controllers and the server loop. A SchedulingPolicy pins
+# the calling thread to a set of cores and raises its priority, as far as the
+# OS and the privileges of the process allow. Refused settings are logged and
+# reported, never raised, so that a missing privilege cannot stop a session.
+#
+# New threads inherit affinity, nice value and scheduling class of the thread
+# which starts them, e.g. a probe or sink worker started from the server loop
+# would run with the server policy. So every setting is always applied - the
+# defaults of a SchedulingPolicy reset the thread to the state the process
+# was started with, i.e. normally SCHED_OTHER, nice 0 and all cores.
+#
+#   Linux   - sched_setaffinity, setpriority (nice) and SCHED_FIFO act on the
+#             calling thread, a negative nice or SCHED_FIFO need root or
+#             CAP_SYS_NICE
+#   Windows - SetThreadAffinityMask and SetThreadPriority of the calling
+#             thread, realtime_priority maps to THREAD_PRIORITY_TIME_CRITICAL
+#
+# `measure_jitter` runs a probe thread with a policy and reports how late its
+# periodic wake ups are - the scheduling latency the controller and the
+# callback thread see under the same load.
+import ctypes
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+
+from ct_bic.utils.logging import logger
+
+SCHEDULING_ROLES = ("callback", "controller", "server")
+
+# nice -> Windows thread priority, the first matching upper bound wins
+WINDOWS_PRIORITIES = (
+    (-10, 2),  # THREAD_PRIORITY_HIGHEST
+    (-1, 1),  # THREAD_PRIORITY_ABOVE_NORMAL
+    (0, 0),  # THREAD_PRIORITY_NORMAL
+    (9, -1),  # THREAD_PRIORITY_BELOW_NORMAL
+    (19, -2),  # THREAD_PRIORITY_LOWEST
+)
+THREAD_PRIORITY_TIME_CRITICAL = 15
+
+# the state the process was started with - taken while importing, i.e. by a
+# thread which has no policy applied yet
+if hasattr(os, "sched_getaffinity"):
+    PROCESS_CPUS = sorted(os.sched_getaffinity(0))
+else:
+    PROCESS_CPUS = list(range(os.cpu_count() or 1))
+PROCESS_NICE = (
+    os.getpriority(os.PRIO_PROCESS, 0) if sys.platform == "linux" else 0
+)
+
+
+@dataclass
+class SchedulingPolicy:
+    cpus: list[int] = field(default_factory=list)  # empty -> PROCESS_CPUS
+    nice: int = 0  # -20..19, 0 -> PROCESS_NICE
+    realtime_priority: int = 0  # 1..99, 0 -> no real time scheduling
+
+    @property
+    def is_default(self) -> bool:
+        return not self.cpus and self.nice == 0 and self.realtime_priority == 0
+
+
+def _set_affinity(cpus: list[int]):
+    if sys.platform == "win32":
+        kernel32 = ctypes.windll.kernel32
+        mask = sum(1 << c for c in cpus)
+        if not kernel32.SetThreadAffinityMask(
+            kernel32.GetCurrentThread(), mask
+        ):
+            raise ctypes.WinError()
+    elif hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(threading.get_native_id(), cpus)
+    else:
+        raise NotImplementedError(f"not supported on {sys.platform}")
+
+
+def _set_windows_priority(priority: int):
+    kernel32 = ctypes.windll.kernel32
+    if not kernel32.SetThreadPriority(kernel32.GetCurrentThread(), priority):
+        raise ctypes.WinError()
+
+
+def _set_nice(nice: int):
+    if sys.platform == "win32":
+        _set_windows_priority(
+            next(p for n, p in WINDOWS_PRIORITIES if nice <= n)
+        )
+    elif sys.platform == "linux":
+        # the nice value is per thread on Linux
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    else:
+        raise NotImplementedError(f"not supported on {sys.platform}")
+
+
+def _set_realtime(priority: int):
+    if sys.platform == "win32":
+        # 0 -> the priority of the nice value, which is set before
+        if priority:
+            _set_windows_priority(THREAD_PRIORITY_TIME_CRITICAL)
+    elif hasattr(os, "sched_setscheduler"):
+        os.sched_setscheduler(
+            threading.get_native_id(),
+            os.SCHED_FIFO if priority else os.SCHED_OTHER,
+            os.sched_param(priority),
+        )
+    elif priority:
+        raise NotImplementedError(f"not supported on {sys.platform}")
+
+
+def apply_policy(
+    policy: SchedulingPolicy | None = None, name: str = ""
+) -> dict[str, str]:
+    """
+    Apply the policy to the calling thread. Settings left at their default,
+    or all of them for None, are reset to the process defaults instead of
+    being inherited from the thread which started the calling one.
+
+    Returns
+    -------
+    dict[str, str]
+        "applied" or "failed: <reason>" per setting
+    """
+    policy = policy if policy is not None else SchedulingPolicy()
+    report = {}
+    for key, setter, default in (
+        ("cpus", _set_affinity, PROCESS_CPUS),
+        ("nice", _set_nice, PROCESS_NICE),
+        ("realtime_priority", _set_realtime, 0),
+    ):
+        value = getattr(policy, key) or default
+        try:
+            setter(value)
+            report[key] = "applied"
+        except (OSError, NotImplementedError) as err:
+            report[key] = f"failed: {err!r}"
+
+    if any(r != "applied" for r in report.values()):
+        logger.warning(f"Scheduling of {name} not fully applied: {report}")
+    else:
+        logger.debug(f"Scheduling of {name} applied: {policy}")
+    return report
+
+
+def measure_jitter(
+    policy: SchedulingPolicy | None = None,
+    duration_s: float = 2,
+    interval_s: float = 0.001,
+) -> dict:
+    """
+    Sleep periodically for `duration_s` in a probe thread running with the
+    policy and summarize how late each wake up was, in microseconds.
+    Without a policy, the probe is reset to the process defaults - a
+    baseline independent of the thread calling this. Blocks until the probe
+    is done.
+    """
+    policy = policy if policy is not None else SchedulingPolicy()
+    n = max(int(duration_s / interval_s), 1)
+    late_ns = np.zeros(n, dtype=np.int64)
+    report = {}
+
+    def probe():
+        report.update(apply_policy(policy, "jitter_probe"))
+        interval_ns = int(interval_s * 1e9)
+        t0 = time.perf_counter_ns()
+        for i in range(n):
+            target = t0 + (i + 1) * interval_ns
+            dt = target - time.perf_counter_ns()
+            if dt > 0:
+                time.sleep(dt * 1e-9)
+            late_ns[i] = time.perf_counter_ns() - target
+
+    th = threading.Thread(target=probe, name="jitter_probe", daemon=True)
+    th.start()
+    th.join()
+
+    late_us = late_ns * 1e-3
+    return {
+        "policy": asdict(policy),
+        "applied": report,
+        "n": n,
+        "interval_us": interval_s * 1e6,
+        "p50_us": float(np.percentile(late_us, 50)),
+        "p99_us": float(np.percentile(late_us, 99)),
+        "p999_us": float(np.percentile(late_us, 99.9)),
+        "max_us": float(late_us.max()),
+        # wake ups later than a full interval, i.e. a missed 1kHz packet slot
+        "n_late": int((late_us > interval_s * 1e6).sum()),
+    }
@@ -0,0 +1,321 @@
+# Fan-out of the implant packets to consumers which run in their own worker
+# threads - disk, shared memory, features, ... A sink is anything with a
+# `process(data: np.ndarray, cntr: int)` method, like the CTListener stages.
+# The callback thread only enqueues the packet once per sink, so a slow sink
+# can fall behind or drop packets, but never stalls the SDK callback.
+#
+#   SDK callback thread              worker per sink
+#   CTListener -> dispatch --> queue --> sink.process(data, cntr)
+#                          --> queue --> sink.process(data, cntr)
+import queue
+import threading
+import time
+
+import numpy as np
+
+from ct_bic.scheduling import apply_policy
+from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
+
+# What to do with a new packet if the queue of a sink is full:
+#   block       - wait up to block_timeout_s in the callback, then drop it
+#   drop_oldest - drop the oldest queued packet to make room
+#   drop_newest - drop the new packet
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class RingBufferSink:
+    """
+    Writes the packets to the ring buffer of a CTListener. The buffer is
+    looked up on every packet, as it is swapped on config changes.
+
+    The buffer is filled by the worker thread, behind the callback - readers
+    of new samples diff against `written` (see CTListener.get_new_data)
+    instead of counting the packets of the callback.
+    """
+
+    def __init__(self, listener):
+        self.listener = listener
+        # samples written so far and the write index after them. Replaced as
+        # one tuple, so that readers on other threads get a consistent pair
+        self.written: tuple[int, int] = (0, 0)
+        listener.ringbuffer_sink = self
+
+    @property
+    def n_written(self) -> int:
+        return self.written[0]
+
+    def process(self, data: np.ndarray, cntr: int):
+        rb = self.listener.ringbuffer
+        rb.add_samples(data, [cntr] * len(data))
+        self.written = (self.written[0] + len(data), rb.curr_i)
+
+
+class SinkWorker:
+    """
+    Bounded queue and worker thread of a single sink.
+
+    Parameters
+    ----------
+    name : str
+        used for the thread and in the summaries
+    sink : object
+        anything with a `process(data: np.ndarray, cntr: int)` method. The
+        data is shared between the sinks and must not be modified in place
+    queue_n : int
+        packets which can be queued before the overflow policy applies
+    policy : str
+        one of OVERFLOW_POLICIES
+    block_timeout_s : float
+        longest wait of the callback thread for the "block" policy
+    """
+
+    def __init__(
+        self,
+        name: str,
+        sink,
+        queue_n: int = 1000,
+        policy: str = "drop_oldest",
+        block_timeout_s: float = 0.01,
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"{policy=} not in {OVERFLOW_POLICIES}")
+        self.name = name
+        self.sink = sink
+        self.policy = policy
+        self.block_timeout_s = block_timeout_s
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_n)
+
+        self.n_queued = 0
+        self.n_processed = 0
+        self.n_dropped = 0
+        self.n_paused = 0  # not put while paused, see SinkRegistry.dispatch
+        self.n_errors = 0
+        self.last_cntr_in = -1
+        self.last_cntr_out = -1
+        # time from the enqueue to the start of processing
+        self.lag_us = 0.0
+        self.max_lag_us = 0.0
+
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        # close the sink when the worker is done, see stop
+        self.close_sink = False
+        self._close_lock = threading.Lock()
+        self._is_closed = False
+
+    def put(self, data: np.ndarray, cntr: int):
+        """Called from the callback thread, never blocks unless "block" """
+        item = (data, cntr, time.perf_counter_ns())
+        q = self.queue
+        if self.policy == "drop_oldest":
+            while True:
+                try:
+                    q.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                        self.n_dropped += 1
+                    except queue.Empty:
+                        pass
+        else:
+            try:
+                if self.policy == "block":
+                    q.put(item, timeout=self.block_timeout_s)
+                else:
+                    q.put_nowait(item)
+            except queue.Full:
+                self.n_dropped += 1
+                return
+        self.n_queued += 1
+        self.last_cntr_in = cntr
+
+    def _run(self):
+        logger.debug(f"Sink worker {self.name} running - {self.policy=}")
+        # not the policy of the thread which started the worker
+        apply_policy(None, f"sink {self.name}")
+        q = self.queue
+        # drain the queue on stop, e.g. so that a disk sink gets everything
+        while not self.stop_event.is_set() or not q.empty():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:  # wake up call from stop
+                continue
+            data, cntr, t_in = item
+            self.lag_us = (time.perf_counter_ns() - t_in) * 1e-3
+            if self.lag_us > self.max_lag_us:
+                self.max_lag_us = self.lag_us
+            try:
+                self.sink.process(data, cntr)
+            except Exception as err:
+                # a faulty sink must not take down its worker
+                self.n_errors += 1
+                if self.n_errors == 1:
+                    logger.error(f"Sink {self.name} failed: {err!r}")
+            self.n_processed += 1
+            self.last_cntr_out = cntr
+        if self.close_sink:
+            self._close()
+        logger.debug(f"Sink worker {self.name} stopped")
+
+    def _close(self):
+        # from the worker after draining or from stop, whoever is last
+        with self._close_lock:
+            if self._is_closed or not hasattr(self.sink, "close"):
+                return
+            self._is_closed = True
+        try:
+            self.sink.close()
+        except Exception as err:
+            logger.error(f"Closing sink {self.name} failed: {err!r}")
+
+    def start(self) -> tuple[threading.Thread, threading.Event]:
+        if self.thread is not None and self.thread.is_alive():
+            return self.thread, self.stop_event
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self._run, name=f"sink_{self.name}", daemon=True
+        )
+        self.thread.start()
+        return self.thread, self.stop_event
+
+    def stop(self, timeout: float = 0.5, close: bool = False) -> bool:
+        """
+        With `close`, the sink is closed once the queue is drained - by
+        the worker itself if it is still busy after `timeout`, so that a
+        writer is never closed while packets are still written to it
+        """
+        if close:
+            # set before the worker can finish, it checks it on exit
+            self.close_sink = True
+        self.stop_event.set()
+        try:
+            # a full queue keeps the worker busy anyway
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        stopped = stop_thread(self.thread, self.stop_event, timeout=timeout)
+        if close and stopped:
+            self._close()
+        elif close:
+            logger.warning(
+                f"Sink {self.name} still busy after {timeout}s, it is closed"
+                " by its worker once the queue is drained"
+            )
+        return stopped
+
+    def summary(self) -> dict:
+        return {
+            "policy": self.policy,
+            "queued": self.queue.qsize(),
+            "queue_n": self.queue.maxsize,
+            "n_queued": self.n_queued,
+            "n_processed": self.n_processed,
+            "n_dropped": self.n_dropped,
+            "n_paused": self.n_paused,
+            "n_errors": self.n_errors,
+            # packets between the latest enqueued and the latest processed
+            "cntr_lag": (
+                self.last_cntr_in - self.last_cntr_out
+                if self.last_cntr_out >= 0
+                else None
+            ),
+            "lag_us": self.lag_us,
+            "max_lag_us": self.max_lag_us,
+        }
+
+
+class SinkRegistry:
+    """
+    Named sinks of a single listener. Sinks can be added and removed while
+    the listener is running.
+
+    Parameters
+    ----------
+    queue_n, policy, block_timeout_s
+        defaults for `add`, see SinkWorker
+    """
+
+    def __init__(
+        self,
+        queue_n: int = 1000,
+        policy: str = "drop_oldest",
+        block_timeout_s: float = 0.01,
+    ):
+        self.queue_n = queue_n
+        self.policy = policy
+        self.block_timeout_s = block_timeout_s
+        self.workers: dict[str, SinkWorker] = {}
+        # plain attribute swap on add / remove - the callback thread
+        # iterates this tuple without a lock
+        self._workers: tuple[SinkWorker, ...] = ()
+        self.is_running = False
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def add(
+        self,
+        name: str,
+        sink,
+        queue_n: int | None = None,
+        policy: str | None = None,
+    ) -> SinkWorker:
+        if name in self.workers:
+            raise KeyError(f"Sink {name=} already registered")
+        worker = SinkWorker(
+            name,
+            sink,
+            queue_n=queue_n if queue_n is not None else self.queue_n,
+            policy=policy if policy is not None else self.policy,
+            block_timeout_s=self.block_timeout_s,
+        )
+        if self.is_running:
+            worker.start()
+        self.workers[name] = worker
+        self._workers = tuple(self.workers.values())
+        return worker
+
+    def remove(self, name: str, timeout: float = 0.5, close: bool = False):
+        """
+        Unregister a sink, process what is queued and return the sink. With
+        `close`, the sink is closed after the last packet, see SinkWorker.stop
+        """
+        worker = self.workers.pop(name)
+        self._workers = tuple(self.workers.values())
+        worker.stop(timeout=timeout, close=close)
+        return worker.sink
+
+    def dispatch(
+        self, data: np.ndarray, cntr: int, paused: frozenset[str] = frozenset()
+    ):
+        """
+        Called from the callback thread for every packet. Sinks named in
+        `paused` do not get it, e.g. while degraded (see ct_bic.degradation)
+        """
+        for worker in self._workers:
+            if worker.name in paused:
+                worker.n_paused += 1
+                continue
+            worker.put(data, cntr)
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        self.is_running = True
+
+    def stop(self, timeout: float = 0.5) -> bool:
+        self.is_running = False
+        return all([w.stop(timeout=timeout) for w in self._workers])
+
+    def close(self, timeout: float = 0.5):
+        """Stop all workers and close the sinks which can be closed"""
+        self.stop(timeout=timeout)
+        for name in list(self.workers):
+            self.remove(name, timeout=timeout, close=True)
+
+    def summary(self) -> dict:
+        return {name: w.summary() for name, w in self.workers.items()}
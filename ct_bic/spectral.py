@@ -0,0 +1,162 @@
+# Online band power features on the CTListener data. Every `hop_n` samples a
+# Hann windowed FFT over the last `window_n` samples of all channels is
+# computed in a single vectorized call and reduced to band powers, which are
+# published on a low rate LSL outlet.
+import inspect
+
+import numpy as np
+import pylsl
+
+from ct_bic.utils.logging import logger
+
+# numpy >= 2.0 can write the FFT result into a preallocated array
+_RFFT_HAS_OUT = "out" in inspect.signature(np.fft.rfft).parameters
+
+DEFAULT_BANDS = {"beta": (13.0, 30.0)}
+
+
+def get_feature_outlet(
+    stream_name: str,
+    bands: dict[str, tuple[float, float]],
+    n_channels: int = 32,
+    sfreq: float = 10,
+    source_id: str | None = None,
+    max_buffered: int = 1,
+    chunk_size: int = 0,
+) -> pylsl.StreamOutlet:
+    """One channel per band and input channel, labeled <band>_Ch_<i>"""
+    info = pylsl.StreamInfo(
+        name=stream_name,
+        type="Features",
+        channel_count=len(bands) * n_channels,
+        nominal_srate=sfreq,
+        channel_format="float32",
+        source_id=source_id if source_id is not None else f"{stream_name}_id",
+    )
+    chns = info.desc().append_child("channels")
+    for band in bands:
+        for i in range(n_channels):
+            ch = chns.append_child("channel")
+            ch.append_child_value("label", f"{band}_Ch_{i}")
+            ch.append_child_value("unit", "uV^2")
+
+    return pylsl.StreamOutlet(
+        info, chunk_size=chunk_size, max_buffered=max_buffered
+    )
+
+
+class BandPowerStage:
+    """
+    Parameters
+    ----------
+    bands : dict[str, tuple[float, float]]
+        {name: (f_low, f_high)}, both edges inclusive
+    sfreq : float
+        sampling rate of the input data
+    n_channels : int
+        number of input channels
+    window_s : float
+        length of the FFT window
+    hop_s : float
+        time between two feature updates, windows overlap if hop_s < window_s
+    outlet : pylsl.StreamOutlet | None
+        if provided, features are pushed here, see `get_feature_outlet`
+
+    Attributes
+    ----------
+    latest : np.ndarray
+        the latest band powers of shape (n_bands, n_channels), for in process
+        consumers
+    n_updates : int
+        number of feature updates so far
+    """
+
+    def __init__(
+        self,
+        bands: dict[str, tuple[float, float]] = DEFAULT_BANDS,
+        sfreq: float = 1000,
+        n_channels: int = 32,
+        window_s: float = 0.5,
+        hop_s: float = 0.1,
+        outlet: pylsl.StreamOutlet | None = None,
+    ):
+        self.bands = dict(bands)
+        self.sfreq = sfreq
+        self.n_channels = n_channels
+        self.window_n = int(window_s * sfreq)
+        self.hop_n = int(hop_s * sfreq)
+        self.outlet = outlet
+        assert 0 < self.hop_n <= self.window_n, "Need 0 < hop_s <= window_s"
+
+        # Mirrored buffer: each sample is written at i and i + window_n, so
+        # the last window_n samples are always a contiguous view
+        self._buf = np.zeros((2 * self.window_n, n_channels), dtype=np.float32)
+        self._i = 0
+        self._n_since_hop = 0
+        self._n_seen = 0
+
+        self._taper = np.hanning(self.window_n).astype(np.float32)[:, None]
+        self._tapered = np.zeros((self.window_n, n_channels), dtype=np.float32)
+        n_freqs = self.window_n // 2 + 1
+        self._spec = np.zeros((n_freqs, n_channels), dtype=np.complex64)
+        self._power = np.zeros((n_freqs, n_channels), dtype=np.float32)
+
+        # band power = sum of the one sided PSD over the band * df, with the
+        # scaling folded into a (n_bands, n_freqs) matrix -> one matmul per hop
+        freqs = np.fft.rfftfreq(self.window_n, d=1 / sfreq)
+        df = freqs[1] - freqs[0]
+        scale = 2 / (sfreq * (self._taper**2).sum()) * df
+        self._band_matrix = np.zeros((len(bands), n_freqs), dtype=np.float32)
+        for i, (lo, hi) in enumerate(self.bands.values()):
+            msk = (freqs >= lo) & (freqs <= hi)
+            if not msk.any():
+                logger.warning(f"Band {lo}-{hi}Hz contains no frequency bin")
+            self._band_matrix[i, msk] = scale
+
+        self.latest = np.zeros((len(bands), n_channels), dtype=np.float32)
+        self.n_updates = 0
+
+    def add(self, samples: np.ndarray):
+        """Add samples of shape (n_samples, n_channels)"""
+        n = len(samples)
+        j = 0
+        while j < n:
+            # write up to the next hop boundary or the end of the ring
+            k = min(
+                n - j, self.hop_n - self._n_since_hop, self.window_n - self._i
+            )
+            chunk = samples[j : j + k]
+            self._buf[self._i : self._i + k] = chunk
+            self._buf[
+                self._i + self.window_n : self._i + self.window_n + k
+            ] = chunk
+            self._i = (self._i + k) % self.window_n
+            self._n_since_hop += k
+            self._n_seen += k
+            j += k
+
+            if self._n_since_hop == self.hop_n:
+                self._n_since_hop = 0
+                if self._n_seen >= self.window_n:
+                    self.compute()
+
+    def compute(self) -> np.ndarray:
+        window = self._buf[self._i : self._i + self.window_n]
+        np.multiply(window, self._taper, out=self._tapered)
+        if _RFFT_HAS_OUT:
+            np.fft.rfft(self._tapered, axis=0, out=self._spec)
+        else:
+            self._spec[:] = np.fft.rfft(self._tapered, axis=0)
+        np.abs(self._spec, out=self._power)
+        np.square(self._power, out=self._power)
+        np.matmul(self._band_matrix, self._power, out=self.latest)
+        self.n_updates += 1
+
+        if self.outlet is not None:
+            self.outlet.push_sample(self.latest.ravel())
+
+        return self.latest
+
+    def process(self, data: np.ndarray, cntr: int):
+        """Entry point for CTListener stages"""
+        self.add(data)
@@ -1,5 +1,6 @@
 from ct_bic.utils.global_setup import pyapi, log_file_name, enable_log
 from ct_bic.utils.logging import logger
+from ct_bic.waveforms import Waveform, WaveformBuilder
 
 
 def check_implant(implant: pyapi.implant.Implant):
@@ -53,6 +54,37 @@ def get_single_pulse_stim_cmd(
     return cmd
 
 
+def get_waveform_stim_cmd(
+    implant: pyapi.implant.Implant,
+    waveform: Waveform,
+    stim_channel: int = 0,
+    return_channel: int = 1,
+    repetitions: tuple[int, int] = (1, 1),
+    builder: WaveformBuilder | None = None,
+) -> pyapi.stimulationcommand.StimulationCommand:
+    """
+    Like get_single_pulse_stim_cmd, but for a custom waveform. Pass a
+    builder to reuse its cached stimulation functions.
+    """
+    check_implant(implant)
+
+    builder = builder if builder is not None else WaveformBuilder()
+    cmd = builder.get_command(
+        [waveform],
+        name="custom",
+        stim_channels=[stim_channel],
+        return_channels=[return_channel],
+        repetitions=repetitions,
+    )
+
+    cmd_check = implant.is_stimulation_command_valid(cmd)
+    assert all(
+        [e or e == "" for e in cmd_check]
+    ), f"Stim command not valid: {cmd_check=}"
+
+    return cmd
+
+
 def get_nsec_130Hz_stim(
     implant: pyapi.implant.Implant,
     time_s: float = 2,
@@ -0,0 +1,55 @@
+# Copy free access to the latest samples of a dareplane_utils RingBuffer.
+# `RingBuffer.unfold_buffer` stacks the full buffer into a new array on every
+# call, while readers usually only need the last few samples.
+import numpy as np
+
+from dareplane_utils.general.ringbuffer import RingBuffer
+
+
+def get_window(
+    rb: RingBuffer, n: int, end: int | None = None
+) -> tuple[tuple[np.ndarray, ...], tuple[np.ndarray, ...]]:
+    """
+    The latest `n` samples as views into the buffer, or the `n` samples
+    before the write index `end` - for readers which recorded the index
+    while the writer keeps adding samples
+
+    Returns
+    -------
+    tuple[tuple[np.ndarray, ...], tuple[np.ndarray, ...]]
+        (data views, time / counter views) in chronological order, each with
+        one element, or two if the window wraps around the end of the buffer.
+        The views are only valid until the writer overwrites them, i.e. for
+        at most len(buffer) - n further samples.
+    """
+    size = rb.buffer.shape[0]
+    n = min(n, size)
+    i = rb.curr_i if end is None else end
+    if n <= i:
+        return (rb.buffer[i - n : i],), (rb.buffer_t[i - n : i],)
+    if i == 0:
+        return (rb.buffer[size - n :],), (rb.buffer_t[size - n :],)
+    j = size - (n - i)
+    return (
+        (rb.buffer[j:], rb.buffer[:i]),
+        (rb.buffer_t[j:], rb.buffer_t[:i]),
+    )
+
+
+def get_latest(rb: RingBuffer, channel: int) -> float:
+    """Value of the most recent sample for a single channel"""
+    # curr_i - 1 == -1 for a wrapped buffer, which is the last row
+    return rb.buffer[rb.curr_i - 1, channel]
+
+
+def join_window(views: tuple[np.ndarray, ...]) -> np.ndarray:
+    """Single array from `get_window` views, only copies if wrapped"""
+    return views[0] if len(views) == 1 else np.concatenate(views)
+
+
+def reset_ringbuffer(rb: RingBuffer):
+    """Clear the buffer in place, keeping the allocated arrays"""
+    rb.buffer.fill(0)
+    rb.buffer_t.fill(0)
+    rb.last_t = 0
+    rb.curr_i = 0
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pylsl
+
+from ct_bic.utils.logging import logger
+
+
+def stop_thread(
+    thread: threading.Thread | None,
+    stop_event: threading.Event,
+    timeout: float = 0.5,
+) -> bool:
+    """
+    Set the stop event and join the thread with a timeout.
+
+    Returns
+    -------
+    bool
+        True if the thread is stopped (or was never started), False if it
+        was still alive after `timeout` seconds
+    """
+    stop_event.set()
+    if thread is None or thread.ident is None:
+        return True
+
+    t0 = time.perf_counter()
+    thread.join(timeout=timeout)
+    if thread.is_alive():
+        logger.warning(f"Thread {thread.name} did not stop within {timeout}s")
+        return False
+
+    logger.debug(
+        f"Stopped {thread.name} in {(time.perf_counter() - t0) * 1e3:.1f}ms"
+    )
+    return True
+
+
+def wait_for_stream(
+    name: str, stop_event: threading.Event, dt_s: float = 0.1
+) -> bool:
+    """
+    Wait until an LSL stream of the given name is available, checking the
+    stop event every `dt_s`. pylsl.resolve_byprop without a timeout blocks
+    forever, leaving a thread unstoppable if the stream never shows up.
+
+    Returns
+    -------
+    bool
+        True if the stream was found, False if stopped before
+    """
+    while not stop_event.is_set():
+        if pylsl.resolve_byprop("name", name, timeout=dt_s):
+            return True
+    return False
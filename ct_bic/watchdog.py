@@ -0,0 +1,262 @@
+# Watchdog on the data flow of a device. The listener feeds the measurement
+# counter of every packet, a separate thread checks that the counter keeps
+# advancing. If it does not for `stall_s` (link loss, SDK hiccup), the stall
+# is reported and the measurement can be restarted automatically. Each stall
+# records how long it took to detect and to recover.
+#
+#   SDK callback thread             watchdog thread
+#   CTListener.on_data -> feed -->  check every check_s
+#                                   stall -> on_stall, restart
+#                                   first packet -> on_recover
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+from ct_bic.scheduling import apply_policy
+from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
+
+
+class DataWatchdog:
+    """
+    Parameters
+    ----------
+    restart : Callable[[], None] | None
+        restarts the measurement, e.g. stop_measurement + start_measurement.
+        Only called if `auto_restart` is True
+    stall_s : float
+        time without counter progress after which the data flow is stalled
+    startup_s : float
+        time allowed for the first packet after `arm` or a restart, as
+        starting a measurement takes longer than the packet interval
+    check_s : float
+        interval of the checks, detection takes up to stall_s + check_s
+    auto_restart : bool
+        restart the measurement on a stall
+    max_restarts : int
+        restarts per stall before giving up, a restart is retried if no
+        packet arrived within `startup_s`
+    on_stall : Callable[[dict], None] | None
+        called with the stall record (see `stalls`) once a stall is detected
+    on_recover : Callable[[dict], None] | None
+        called with the stall record once data flows again
+    max_history : int
+        number of stalls kept in `stalls`
+
+    Attributes
+    ----------
+    stalls : deque[dict]
+        one record per stall, times in ms. detect_ms = last progress to
+        detection, recover_ms = detection to the first packet afterwards
+    """
+
+    def __init__(
+        self,
+        restart: Callable[[], None] | None = None,
+        stall_s: float = 0.3,
+        startup_s: float = 2,
+        check_s: float = 0.05,
+        auto_restart: bool = True,
+        max_restarts: int = 3,
+        on_stall: Callable[[dict], None] | None = None,
+        on_recover: Callable[[dict], None] | None = None,
+        max_history: int = 100,
+    ):
+        self.restart = restart
+        self.stall_s = stall_s
+        self.startup_s = startup_s
+        self.check_s = check_s
+        self.auto_restart = auto_restart
+        self.max_restarts = max_restarts
+        self.on_stall = on_stall
+        self.on_recover = on_recover
+
+        self.armed = False
+        self.stall: dict | None = None  # the ongoing stall
+        self.stalls: deque[dict] = deque(maxlen=max_history)
+
+        # written by the callback thread only
+        self.t_last_ns = 0
+        self.t_first_ns = 0  # first packet since `mark`
+        self.n_packets = 0
+        self._cntr: int | None = None
+        self._t_resumed_ns = 0
+
+        self._t_armed_ns = 0
+        self._t_detect_ns = 0
+        self._t_restart_ns = 0
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def feed(self, cntr: int):
+        """Called from the callback thread for every packet"""
+        if cntr == self._cntr:
+            return
+        t = time.perf_counter_ns()
+        self._cntr = cntr
+        self.t_last_ns = t
+        if not self.n_packets:
+            self.t_first_ns = t
+        self.n_packets += 1
+        if self.stall is not None and not self._t_resumed_ns:
+            self._t_resumed_ns = t
+
+    def mark(self):
+        """Count packets and track the first one from now on"""
+        self.n_packets = 0
+        self.t_first_ns = 0
+
+    def arm(self):
+        """Start expecting data, e.g. right after start_measurement"""
+        self._t_armed_ns = time.perf_counter_ns()
+        self.mark()
+        self.stall = None
+        self.armed = True
+
+    def disarm(self):
+        """No data expected, e.g. on stop_measurement"""
+        self.armed = False
+        self.stall = None
+
+    @property
+    def is_stalled(self) -> bool:
+        return self.armed and self.stall is not None
+
+    def check(self) -> bool:
+        """
+        Detect stalls and recoveries, returns True while stalled. Called by
+        the watchdog thread, can also be called directly.
+        """
+        if not self.armed:
+            return False
+
+        t = time.perf_counter_ns()
+        if self.stall is not None:
+            self._check_stalled(t)
+        elif self.n_packets:
+            silent_ns = t - max(self.t_last_ns, self._t_armed_ns)
+            if silent_ns > self.stall_s * 1e9:
+                self._on_stall(t, silent_ns)
+        elif t - self._t_armed_ns > self.startup_s * 1e9:
+            # no packet at all since arm
+            self._on_stall(t, t - self._t_armed_ns)
+
+        return self.stall is not None
+
+    def _on_stall(self, t: int, silent_ns: int):
+        self._t_resumed_ns = 0
+        self.stall = {
+            "t": time.time(),
+            "cntr_last": self._cntr,
+            "detect_ms": silent_ns * 1e-6,
+            "recover_ms": None,
+            "n_restarts": 0,
+            "restart_ms": [],
+            "gave_up": False,
+        }
+        self._t_detect_ns = t
+        self.stalls.append(self.stall)
+        logger.warning(
+            f"Data flow stalled - no progress for {silent_ns * 1e-6:.0f}ms"
+            f" after counter {self._cntr}"
+        )
+        if self.on_stall is not None:
+            self.on_stall(self.stall)
+        if self.auto_restart:
+            self._restart()
+
+    def _check_stalled(self, t: int):
+        stall = self.stall
+        if self._t_resumed_ns:
+            stall["recover_ms"] = (
+                self._t_resumed_ns - self._t_detect_ns
+            ) * 1e-6
+            self.stall = None
+            logger.info(
+                f"Data flow recovered after {stall['recover_ms']:.0f}ms"
+                f" and {stall['n_restarts']} restarts"
+            )
+            if self.on_recover is not None:
+                self.on_recover(stall)
+            return
+
+        if (
+            not self.auto_restart
+            or stall["gave_up"]
+            or t - self._t_restart_ns < self.startup_s * 1e9
+        ):
+            return
+        if stall["n_restarts"] >= self.max_restarts:
+            stall["gave_up"] = True
+            logger.error(
+                f"Data flow still stalled after {stall['n_restarts']}"
+                " restarts - giving up"
+            )
+            return
+        self._restart()
+
+    def _restart(self):
+        if self.restart is None:
+            return
+        stall = self.stall
+        stall["n_restarts"] += 1
+        t0 = time.perf_counter_ns()
+        try:
+            self.restart()
+        except RuntimeError as err:
+            logger.error(f"Restarting the measurement failed: {err}")
+        self._t_restart_ns = time.perf_counter_ns()
+        stall["restart_ms"].append((self._t_restart_ns - t0) * 1e-6)
+
+    def _run(self):
+        logger.debug(f"Watchdog running - {self.stall_s=}, {self.check_s=}")
+        apply_policy(None, "watchdog")  # started from the server loop
+        while not self.stop_event.wait(self.check_s):
+            self.check()
+        logger.debug("Watchdog stopped")
+
+    def start(self) -> tuple[threading.Thread, threading.Event]:
+        if self.thread is not None and self.thread.is_alive():
+            return self.thread, self.stop_event
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="data_watchdog", daemon=True
+        )
+        self.thread.start()
+        return self.thread, self.stop_event
+
+    def stop(self, timeout: float = 0.5) -> bool:
+        self.disarm()
+        return stop_thread(self.thread, self.stop_event, timeout=timeout)
+
+    def summary(self) -> dict:
+        """Detection and recovery times of the stalls so far, in ms"""
+        summary = {
+            "armed": self.armed,
+            "stalled": self.is_stalled,
+            "n_stalls": len(self.stalls),
+            "n_restarts": sum(s["n_restarts"] for s in self.stalls),
+            "ms_since_last_packet": (
+                (time.perf_counter_ns() - self.t_last_ns) * 1e-6
+                if self.t_last_ns
+                else None
+            ),
+        }
+        for key in ("detect_ms", "recover_ms"):
+            vals = np.array(
+                [s[key] for s in self.stalls if s[key] is not None],
+                dtype=float,
+            )
+            summary[key] = (
+                {
+                    "last": float(vals[-1]),
+                    "mean": float(vals.mean()),
+                    "max": float(vals.max()),
+                }
+                if len(vals)
+                else None
+            )
+        return summary
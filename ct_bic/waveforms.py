@@ -0,0 +1,251 @@
+# Custom stimulation waveforms as sequences of 4rect atoms. Amplitudes and
+# durations are given as arrays (or as a sampled waveform), quantized to the
+# amplitude steps of the BIC and checked for charge balance before any SDK
+# object is created. Stimulation functions are cached per waveform and
+# electrode configuration, so that a library of waveforms can be built once
+# at session start.
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from ct_bic.utils.global_setup import pyapi
+from ct_bic.utils.logging import logger
+
+# 12uA steps up to 3060uA (255 steps), 24uA steps above
+FINE_STEP_UA = 12
+COARSE_STEP_UA = 24
+FINE_RANGE_UA = 3060
+MAX_AMPLITUDE_UA = 6120
+
+# as returned by StimulationCommandFactory.create_stimulation_function
+StimFunction = Any
+
+
+def quantize_amplitudes(amplitudes_uA: np.ndarray | list) -> np.ndarray:
+    """Round to the closest amplitude the BIC can deliver"""
+    a = np.asarray(amplitudes_uA, dtype=np.float64)
+    if np.any(np.abs(a) > MAX_AMPLITUDE_UA):
+        raise ValueError(
+            f"Amplitudes must be within +-{MAX_AMPLITUDE_UA}uA, got"
+            f" max {np.abs(a).max():.0f}uA"
+        )
+    # the coarse grid only for what does not round into the fine range,
+    # e.g. 3061uA -> 3060uA and not 3072uA
+    fine = np.round(a / FINE_STEP_UA) * FINE_STEP_UA
+    coarse = np.round(a / COARSE_STEP_UA) * COARSE_STEP_UA
+    return np.where(np.abs(fine) > FINE_RANGE_UA, coarse, fine).astype(
+        np.int64
+    )
+
+
+def quantize_durations(durations_us: np.ndarray | list) -> np.ndarray:
+    d = np.round(np.asarray(durations_us, dtype=np.float64)).astype(np.int64)
+    if np.any(d <= 0):
+        raise ValueError("Atom durations must be >= 1us")
+    return d
+
+
+def charge_imbalance(
+    amplitudes_uA: np.ndarray, durations_us: np.ndarray
+) -> np.ndarray:
+    """
+    Net charge relative to the charge of the larger phase, along the last
+    axis - i.e. 0 for a balanced waveform, +-1 for a monophasic one
+    """
+    q = np.asarray(amplitudes_uA) * np.asarray(durations_us)
+    pos = np.where(q > 0, q, 0).sum(axis=-1)
+    neg = np.where(q < 0, -q, 0).sum(axis=-1)
+    return (pos - neg) / np.maximum(np.maximum(pos, neg), 1)
+
+
+@dataclass(eq=False)
+class Waveform:
+    """Quantized amplitudes (uA) and durations (us) of consecutive atoms"""
+
+    amplitudes_uA: np.ndarray
+    durations_us: np.ndarray
+
+    def __post_init__(self):
+        self.amplitudes_uA = quantize_amplitudes(self.amplitudes_uA)
+        self.durations_us = quantize_durations(self.durations_us)
+        if (
+            self.amplitudes_uA.ndim != 1
+            or self.amplitudes_uA.shape != self.durations_us.shape
+        ):
+            raise ValueError(
+                "Need 1d amplitudes and durations of the same length, got"
+                f" {self.amplitudes_uA.shape} and {self.durations_us.shape}"
+            )
+        # read only, as the arrays are part of the cache key
+        self.amplitudes_uA.setflags(write=False)
+        self.durations_us.setflags(write=False)
+
+    @classmethod
+    def from_sampled(
+        cls, samples_uA: np.ndarray | list, dt_us: float
+    ) -> "Waveform":
+        """One atom per run of equal (quantized) samples"""
+        q = quantize_amplitudes(samples_uA)
+        starts = np.flatnonzero(np.diff(q, prepend=q[0] - 1))
+        n = np.diff(starts, append=len(q))
+        return cls(q[starts], n * dt_us)
+
+    @classmethod
+    def biphasic(
+        cls,
+        amplitude_uA: float = 3060,
+        pulsewidth_us: float = 60,
+        dz0_us: float = 10,
+        dz1_us: float = 7360,
+        ratio: float = 4,
+    ) -> "Waveform":
+        """
+        Pulse, dead zone, counter pulse of about 1/ratio amplitude, dead
+        zone, and the pause until the next pulse. The width of the counter
+        pulse balances the charge of the quantized amplitudes.
+        """
+        amp, counter = quantize_amplitudes(
+            [amplitude_uA, -amplitude_uA / ratio]
+        )
+        if counter == 0:
+            counter = -np.sign(amp) * FINE_STEP_UA
+        return cls(
+            [amp, 0, counter, 0, 0],
+            [
+                pulsewidth_us,
+                dz0_us,
+                abs(amp * pulsewidth_us / counter),
+                dz0_us,
+                dz1_us,
+            ],
+        )
+
+    @property
+    def imbalance(self) -> float:
+        return float(charge_imbalance(self.amplitudes_uA, self.durations_us))
+
+    @property
+    def key(self) -> tuple[bytes, bytes]:
+        return self.amplitudes_uA.tobytes(), self.durations_us.tobytes()
+
+
+def check_charge_balance(
+    waveforms: list[Waveform], max_imbalance: float = 0.01
+) -> np.ndarray:
+    """
+    Imbalance of all waveforms, computed at once on zero padded arrays.
+    Raises a ValueError listing the waveforms above `max_imbalance`.
+    """
+    n = max((len(wf.amplitudes_uA) for wf in waveforms), default=0)
+    amps = np.zeros((len(waveforms), n), dtype=np.int64)
+    durs = np.zeros((len(waveforms), n), dtype=np.int64)
+    for i, wf in enumerate(waveforms):
+        amps[i, : len(wf.amplitudes_uA)] = wf.amplitudes_uA
+        durs[i, : len(wf.durations_us)] = wf.durations_us
+
+    imbalance = charge_imbalance(amps, durs)
+    bad = np.flatnonzero(np.abs(imbalance) > max_imbalance)
+    if len(bad):
+        raise ValueError(
+            f"Waveforms {bad.tolist()} are not charge balanced:"
+            f" {imbalance[bad].round(4).tolist()}, {max_imbalance=}"
+        )
+    return imbalance
+
+
+class WaveformBuilder:
+    """
+    Create stimulation functions from Waveforms, reusing already built
+    functions for the same waveform and electrode configuration.
+
+    Parameters
+    ----------
+    factory : pyapi.StimulationCommandFactory | None
+        a new factory is created if None
+    max_imbalance : float
+        allowed net charge relative to the larger phase, see
+        `charge_imbalance`
+    """
+
+    def __init__(
+        self,
+        factory: pyapi.StimulationCommandFactory | None = None,
+        max_imbalance: float = 0.01,
+    ):
+        self.factory = (
+            factory
+            if factory is not None
+            else pyapi.StimulationCommandFactory()
+        )
+        self.max_imbalance = max_imbalance
+        self._cache: dict[tuple, Any] = {}
+
+    def get_function(
+        self,
+        waveform: Waveform,
+        stim_channels: list[int] = [0],
+        return_channels: list[int] = [1],
+        use_ground: bool = True,
+        repetitions: tuple[int, int] = (1, 1),
+    ) -> StimFunction:
+        key = (
+            waveform.key,
+            tuple(stim_channels),
+            tuple(return_channels),
+            use_ground,
+            tuple(repetitions),
+        )
+        func = self._cache.get(key)
+        if func is None:
+            check_charge_balance([waveform], self.max_imbalance)
+            func = self._build(
+                waveform, stim_channels, return_channels, use_ground
+            )
+            func.set_repetitions(*repetitions)
+            self._cache[key] = func
+        return func
+
+    def _build(
+        self,
+        waveform: Waveform,
+        stim_channels: list[int],
+        return_channels: list[int],
+        use_ground: bool,
+    ) -> StimFunction:
+        func = self.factory.create_stimulation_function()
+        create_atom = self.factory.create_4rect_stimulation_atom
+        # plain python numbers, converted once for all atoms
+        for amp, dur in zip(
+            waveform.amplitudes_uA.tolist(), waveform.durations_us.tolist()
+        ):
+            func.append(create_atom(float(amp), 0.0, 0.0, 0.0, dur))
+        func.set_virtual_stim_electrodes(
+            (list(stim_channels), list(return_channels)), use_ground
+        )
+        return func
+
+    def build_library(
+        self, waveforms: dict[str, Waveform], **kwargs
+    ) -> dict[str, StimFunction]:
+        """Check all waveforms at once, then build the functions"""
+        check_charge_balance(list(waveforms.values()), self.max_imbalance)
+        lib = {
+            name: self.get_function(wf, **kwargs)
+            for name, wf in waveforms.items()
+        }
+        logger.debug(f"Built waveform library of {len(lib)} functions")
+        return lib
+
+    def get_command(
+        self, waveforms: list[Waveform], name: str = "custom", **kwargs
+    ) -> pyapi.stimulationcommand.StimulationCommand:
+        """A command of the waveforms in order, kwargs see `get_function`"""
+        cmd = self.factory.create_stimulation_command()
+        cmd.name = name
+        for wf in waveforms:
+            cmd.append(self.get_function(wf, **kwargs))
+        return cmd
+
+    def clear_cache(self):
+        self._cache.clear()
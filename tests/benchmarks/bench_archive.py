@@ -0,0 +1,114 @@
+# Size, write throughput and random access of the recording archive
+# (ct_bic.archive) compared to the csv dumps of `buffers_to_df`. A synthetic
+# session is written in both formats and a few seconds from its middle are
+# read back.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_archive run
+#   python -m tests.benchmarks.bench_archive run --duration_s=3600
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from fire import Fire
+
+from ct_bic.archive import ArchiveReader, ArchiveWriter
+from ct_bic.listener import buffers_to_df
+from ct_bic.utils.logging import logger
+from tests.utils.benchmark import write_results
+from tests.utils.synthetic import get_synthetic_data
+
+
+def bench_archive(
+    duration_s: float = 600,
+    read_s: float = 5,
+    chunk_n: int = 1000,
+    with_csv: bool = True,
+    tmp_dir: str | None = None,
+) -> dict:
+    n = int(duration_s * 1000)
+    # one minute of data, repeated with new counters, to keep memory low
+    block = get_synthetic_data(min(n, 60_000))
+    n_blocks = int(np.ceil(n / len(block)))
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        tmp = Path(tmp)
+        arc, csv = tmp / "rec.ctbic", tmp / "rec.csv"
+
+        t0 = time.perf_counter()
+        with ArchiveWriter(arc, chunk_n=chunk_n) as wr:
+            for i in range(n_blocks):
+                cntr = np.arange(len(block)) + i * len(block)
+                wr.add(block, cntr)
+        t_write_arc = time.perf_counter() - t0
+
+        # read_s seconds from the middle
+        c0 = n_blocks * len(block) // 2
+        t0 = time.perf_counter()
+        with ArchiveReader(arc) as rd:
+            data, _, _ = rd.read_cntr(c0, c0 + int(read_s * 1000) - 1)
+            n_chunks_read = rd.n_chunks_read
+        t_read_arc = time.perf_counter() - t0
+
+        res = {
+            "n_samples": n_blocks * len(block),
+            "raw_mb": n_blocks * block.nbytes / 1e6,
+            "archive": {
+                "mb": arc.stat().st_size / 1e6,
+                "write_s": t_write_arc,
+                "read_ms": t_read_arc * 1e3,
+                "n_chunks_read": n_chunks_read,
+                "n_read": len(data),
+            },
+        }
+
+        if with_csv:
+            t0 = time.perf_counter()
+            for i in range(n_blocks):
+                cntr = np.arange(len(block)) + i * len(block)
+                buffers_to_df(block.tolist(), cntr.tolist()).to_csv(
+                    csv, index=False, mode="a" if i else "w", header=not i
+                )
+            t_write_csv = time.perf_counter() - t0
+
+            # the best a csv can do is skipping rows while parsing
+            t0 = time.perf_counter()
+            df = pd.read_csv(
+                csv, skiprows=range(1, c0 + 1), nrows=int(read_s * 1000)
+            )
+            t_read_csv = time.perf_counter() - t0
+            res["csv"] = {
+                "mb": csv.stat().st_size / 1e6,
+                "write_s": t_write_csv,
+                "read_ms": t_read_csv * 1e3,
+                "n_read": len(df),
+            }
+
+    return res
+
+
+def main(
+    duration_s: float = 600,
+    read_s: float = 5,
+    chunk_n: int = 1000,
+    with_csv: bool = True,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    logger.info(f"Benchmarking archive with {duration_s=}, {chunk_n=}")
+    res = bench_archive(duration_s, read_s, chunk_n, with_csv)
+    for fmt in ["archive", "csv"]:
+        if fmt in res:
+            r = res[fmt]
+            print(
+                f"{fmt:<8} {r['mb']:>8.1f}MB write={r['write_s']:.1f}s"
+                f" read {read_s}s from the middle={r['read_ms']:.1f}ms"
+            )
+    fpath = write_results("archive", res, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
@@ -0,0 +1,177 @@
+# Latency from the arrival of a packet to the stimulation callback, once for
+# the in process closed loop (ct_bic.closed_loop) and once for the LSL route:
+# data outlet -> biomarker computed by a consumer of the data stream ->
+# control signal outlet -> threshold_single_control. Synthetic packets at
+# 1kHz carry a step on channel 0 every `period_n` packets, the biomarker is
+# the latest value of channel 0 for both routes.
+#
+# The consumer of the LSL route runs as a thread in the same process, so the
+# LSL numbers are a lower bound for an external process.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_closed_loop run
+import threading
+import time
+
+import numpy as np
+import pylsl
+from fire import Fire
+
+from ct_bic.closed_loop import ClosedLoopStage, latest_value
+from ct_bic.controller import ControlParams, threshold_single_control
+from ct_bic.listener import CTListener
+from ct_bic.lsl import get_stream_outlet
+from ct_bic.replay import ReplaySample
+from ct_bic.utils.logging import logger
+from ct_bic.utils.ringbuffer import get_latest
+from dareplane_utils.stream_watcher.lsl_stream_watcher import StreamWatcher
+from tests.benchmarks.bench_data_path import get_control_outlet
+from tests.utils.benchmark import summarize_ns, write_results
+from tests.utils.synthetic import get_synthetic_data
+
+BENCH_CL_STREAM_NAME = "ct_bic_bench_closed_loop"
+BENCH_CL_CONTROL_STREAM_NAME = "ct_bic_bench_closed_loop_control"
+
+
+def get_step_samples(
+    n_triggers: int, period_n: int, step: float = 1000
+) -> tuple[list[ReplaySample], np.ndarray]:
+    """Packets with a step of `step` on channel 0 for half of each period"""
+    data = get_synthetic_data(n_triggers * period_n)
+    i_onsets = np.arange(n_triggers) * period_n + period_n // 2
+    for i in i_onsets:
+        data[i : i + period_n // 2, 0] += step
+    samples = [
+        ReplaySample(measurements=row, measurement_counter=i)
+        for i, row in enumerate(data.tolist())
+    ]
+    return samples, i_onsets
+
+
+def deliver(listener: CTListener, samples: list) -> np.ndarray:
+    """
+    Paced at 1kHz, returns the perf_counter_ns at the arrival of each. Sleeps
+    instead of spinning, as a spinning python thread would hold the GIL which
+    the SDK's callback thread does not do between packets.
+    """
+    t_arrival = np.zeros(len(samples), dtype=np.int64)
+    t0 = time.perf_counter_ns()
+    for i, s in enumerate(samples):
+        dt = t0 + i * 1_000_000 - time.perf_counter_ns()
+        if dt > 0:
+            time.sleep(dt * 1e-9)
+        t_arrival[i] = time.perf_counter_ns()
+        listener.on_data(s)
+    return t_arrival
+
+
+def get_latencies(
+    t_fired: list[int], t_arrival: np.ndarray, i_onsets: np.ndarray
+) -> tuple[np.ndarray, int]:
+    """Latency of each callback to the preceding onset, and n missed"""
+    t_onsets = t_arrival[i_onsets]
+    t_fired = np.asarray(t_fired, dtype=np.int64)
+    i = np.searchsorted(t_onsets, t_fired) - 1
+    i = i[i >= 0]
+    return t_fired[-len(i) :] - t_onsets[i], len(i_onsets) - len(np.unique(i))
+
+
+def bench_in_process(
+    n_triggers: int = 20, period_n: int = 200, threshold: float = 500
+) -> dict:
+    t_fired = []
+    outlet, _ = get_stream_outlet(BENCH_CL_STREAM_NAME, sfreq=1000)
+    stage = ClosedLoopStage(
+        latest_value(0),
+        callback=lambda: t_fired.append(time.perf_counter_ns()),
+        params=ControlParams(
+            threshold=threshold, grace_period_s=period_n / 4000
+        ),
+    )
+    listener = CTListener(outlet=outlet, stages=[stage])
+    samples, i_onsets = get_step_samples(n_triggers, period_n)
+
+    stage.start()
+    t_arrival = deliver(listener, samples)
+    time.sleep(0.05)
+    stage.stop()
+
+    latencies, n_missed = get_latencies(t_fired, t_arrival, i_onsets)
+    return {"latency": summarize_ns(latencies), "n_missed": n_missed}
+
+
+def biomarker_consumer(
+    stop_event: threading.Event, control_outlet: pylsl.StreamOutlet
+):
+    """Stand-in for an external process computing the control signal"""
+    sw = StreamWatcher(name=BENCH_CL_STREAM_NAME, buffer_size_s=1)
+    sw.connect_to_stream()
+    while not stop_event.is_set():
+        sw.update()
+        if sw.n_new:
+            sw.n_new = 0
+            control_outlet.push_sample([get_latest(sw.ring_buffer, 0)])
+        else:
+            time.sleep(0.0002)
+    sw.disconnect()
+
+
+def bench_lsl_route(
+    n_triggers: int = 20, period_n: int = 200, threshold: float = 500
+) -> dict:
+    t_fired = []
+    outlet, _ = get_stream_outlet(BENCH_CL_STREAM_NAME, sfreq=1000)
+    listener = CTListener(outlet=outlet)
+    samples, i_onsets = get_step_samples(n_triggers, period_n)
+
+    stop_event = threading.Event()
+    consumer = threading.Thread(
+        target=biomarker_consumer,
+        args=(stop_event, get_control_outlet(BENCH_CL_CONTROL_STREAM_NAME)),
+    )
+    consumer.start()
+    sw = StreamWatcher(name=BENCH_CL_CONTROL_STREAM_NAME, buffer_size_s=1)
+    controller = threading.Thread(
+        target=threshold_single_control,
+        args=(sw, lambda: t_fired.append(time.perf_counter_ns()), stop_event),
+        kwargs={"threshold": threshold, "grace_period_s": period_n / 4000},
+    )
+    controller.start()
+    while sw.inlet is None:
+        time.sleep(0.01)
+    time.sleep(0.2)
+
+    t_arrival = deliver(listener, samples)
+    time.sleep(0.05)
+    stop_event.set()
+    consumer.join()
+    controller.join()
+
+    latencies, n_missed = get_latencies(t_fired, t_arrival, i_onsets)
+    return {"latency": summarize_ns(latencies), "n_missed": n_missed}
+
+
+def main(
+    n_triggers: int = 20,
+    period_n: int = 200,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = {}
+    logger.info(f"Benchmarking in process closed loop with {n_triggers=}")
+    results["in_process"] = bench_in_process(n_triggers, period_n)
+    logger.info(f"Benchmarking LSL route with {n_triggers=}")
+    results["lsl_route"] = bench_lsl_route(n_triggers, period_n)
+
+    for route, res in results.items():
+        lat = res["latency"]
+        print(
+            f"{route:<12} p50={lat['p50_us']:.0f}us p99={lat['p99_us']:.0f}us"
+            f" max={lat['max_us']:.0f}us missed={res['n_missed']}"
+        )
+    fpath = write_results("closed_loop", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
@@ -0,0 +1,92 @@
+# Trigger latency of the threshold controller at high control signal rates,
+# using the deterministic ControlSignalSource. The latency is measured from
+# the LSL time stamp of the first supra-threshold sample to the callback.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_control_source run
+#   python -m tests.benchmarks.bench_control_source run --rates=[1000,5000]
+import threading
+
+import numpy as np
+import pylsl
+from fire import Fire
+
+from ct_bic.controller import threshold_single_control
+from ct_bic.utils.logging import logger
+from dareplane_utils.stream_watcher.lsl_stream_watcher import StreamWatcher
+from tests.utils.benchmark import summarize_ns, write_results
+from tests.utils.control_signal_stream import ControlSignalSource, get_pattern
+
+BENCH_SOURCE_STREAM_NAME = "ct_bic_bench_source"
+
+
+def bench_rate(
+    sfreq: float = 1000,
+    chunk_n: int = 1,
+    n_triggers: int = 10,
+    period_s: float = 0.2,
+    threshold: float = 127,
+) -> dict:
+    data = get_pattern("square", sfreq=sfreq, period_s=period_s, duty=0.5)
+    onset = int(np.argmax(data > threshold))
+    src = ControlSignalSource(
+        data, sfreq, chunk_n, stream_name=BENCH_SOURCE_STREAM_NAME
+    )
+
+    t_fired = []
+    sw = StreamWatcher(name=BENCH_SOURCE_STREAM_NAME, buffer_size_s=2)
+    stop_event = threading.Event()
+    th = threading.Thread(
+        target=threshold_single_control,
+        args=(sw, lambda: t_fired.append(pylsl.local_clock()), stop_event),
+        kwargs={"threshold": threshold, "grace_period_s": period_s / 4},
+    )
+    th.start()
+    while sw.inlet is None:
+        stop_event.wait(0.001)
+
+    src.run(duration_s=n_triggers * period_s)
+    stop_event.wait(0.05)
+    stop_event.set()
+    th.join()
+
+    # match each callback to the preceding onset
+    t_onsets = src.sample_time(onset + np.arange(n_triggers) * len(data))
+    t_fired = np.asarray(t_fired)
+    i_onset = np.searchsorted(t_onsets, t_fired) - 1
+    latency_ns = ((t_fired - t_onsets[i_onset]) * 1e9).astype(np.int64)
+
+    return {
+        "sfreq": sfreq,
+        "chunk_n": chunk_n,
+        "n_fired": len(t_fired),
+        "n_missed": n_triggers - len(np.unique(i_onset)),
+        "latency": summarize_ns(latency_ns),
+        "source_max_lateness_us": src.max_lateness_s * 1e6,
+    }
+
+
+def main(
+    rates: list[float] = [100, 1000, 5000],
+    chunk_sizes: list[int] = [1, 10],
+    n_triggers: int = 10,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = {}
+    for sfreq in rates:
+        for chunk_n in chunk_sizes:
+            logger.info(f"Benchmarking {sfreq=}Hz, {chunk_n=}")
+            res = bench_rate(sfreq, chunk_n, n_triggers)
+            results[f"{sfreq:.0f}Hz_chunk{chunk_n}"] = res
+            lat = res["latency"]
+            print(
+                f"{sfreq:>6.0f}Hz chunk={chunk_n:<3} p50={lat['p50_us']:.0f}us"
+                f" max={lat['max_us']:.0f}us missed={res['n_missed']}"
+            )
+    fpath = write_results("control_source", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
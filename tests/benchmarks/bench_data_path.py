@@ -0,0 +1,226 @@
+# Benchmarks for the data path (CTListener.on_data -> LSL outlet) and the
+# control path (StreamWatcher -> threshold_single_control -> callback).
+# Runs headless and without an implant, using synthetic packets.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_data_path run
+#   python -m tests.benchmarks.bench_data_path run --n_packets=50000
+#
+# Compare two runs:
+#   python -m tests.benchmarks.bench_data_path compare <old.json> <new.json>
+import threading
+import time
+
+import numpy as np
+import pylsl
+from fire import Fire
+
+from ct_bic.blanking import ArtifactBlanker
+from ct_bic.controller import threshold_single_control
+from ct_bic.hotpath_stats import HotPathStats
+from ct_bic.listener import CTListener
+from ct_bic.quality import SignalQualityStage
+from ct_bic.lsl import get_stream_outlet
+from ct_bic.utils.logging import logger
+from ct_bic.utils.ringbuffer import get_latest
+from dareplane_utils.general.ringbuffer import RingBuffer
+from dareplane_utils.general.time import sleep_s
+from dareplane_utils.stream_watcher.lsl_stream_watcher import StreamWatcher
+from tests.utils.benchmark import compare_results, summarize_ns, write_results
+from tests.utils.synthetic import get_synthetic_samples
+
+BENCH_STREAM_NAME = "ct_bic_bench"
+BENCH_CONTROL_STREAM_NAME = "ct_bic_bench_control"
+
+
+def get_bench_listener(
+    stream_name: str = BENCH_STREAM_NAME,
+    buffer_size_s: float = 5,
+    blanker: ArtifactBlanker | None = None,
+    stats: HotPathStats | None = None,
+) -> CTListener:
+    outlet, _ = get_stream_outlet(
+        stream_name, sfreq=1000, n_channels=32 if blanker is None else 33
+    )
+    rb = RingBuffer(shape=(int(buffer_size_s * 1000), 32))
+    return CTListener(rb, outlet=outlet, blanker=blanker, stats=stats)
+
+
+def bench_on_data(
+    n_packets: int = 10_000,
+    warmup: int = 500,
+    blanking: bool = False,
+    hotpath_stats: bool = False,
+    quality: bool = False,
+) -> dict:
+    """
+    Replay synthetic packets through CTListener.on_data as fast as possible.
+    Reports wall time per packet, CPU time per packet (process time over the
+    full run, as per call CPU timers are too coarse on Windows) and the
+    resulting maximal sustainable packet rate.
+
+    With `blanking`, an ArtifactBlanker is added and a 10ms stimulation is
+    simulated every 100 packets. With `hotpath_stats`, the listener records
+    HotPathStats. With `quality`, a SignalQualityStage is added.
+    """
+    blanker = ArtifactBlanker() if blanking else None
+    stats = HotPathStats() if hotpath_stats else None
+    listener = get_bench_listener(blanker=blanker, stats=stats)
+    if quality:
+        listener.stages.append(SignalQualityStage())
+    samples = get_synthetic_samples(n_packets + warmup)
+
+    for s in samples[:warmup]:
+        listener.on_data(s)
+
+    dts = np.zeros(n_packets, dtype=np.int64)
+    cpu_t0 = time.process_time_ns()
+    wall_t0 = time.perf_counter_ns()
+    for i, s in enumerate(samples[warmup:]):
+        if blanker is not None and i % 100 in (0, 10):
+            listener.on_stimulation_state_changed(i % 100 == 0)
+        t0 = time.perf_counter_ns()
+        listener.on_data(s)
+        dts[i] = time.perf_counter_ns() - t0
+    wall_total_ns = time.perf_counter_ns() - wall_t0
+    cpu_total_ns = time.process_time_ns() - cpu_t0
+
+    return {
+        "wall_per_packet": summarize_ns(dts),
+        "cpu_per_packet_us": cpu_total_ns / n_packets * 1e-3,
+        "max_packet_rate_hz": n_packets / (wall_total_ns * 1e-9),
+        # the BIC delivers packets at 1kHz
+        "realtime_headroom": n_packets / (wall_total_ns * 1e-9) / 1000,
+    }
+
+
+def get_control_outlet(
+    stream_name: str = BENCH_CONTROL_STREAM_NAME, sfreq: float = 1000
+) -> pylsl.StreamOutlet:
+    info = pylsl.StreamInfo(
+        name=stream_name,
+        type="EEG",
+        channel_count=1,
+        nominal_srate=sfreq,
+        channel_format="float32",
+        source_id=f"{stream_name}_id",
+    )
+    return pylsl.StreamOutlet(info, max_buffered=1)
+
+
+def bench_controller_eval(n_iter: int = 5_000, threshold: float = 127) -> dict:
+    """
+    Cost of a single evaluation step of threshold_single_control, i.e.
+    pulling new data, reading the latest value and checking the threshold
+    """
+    outlet = get_control_outlet()
+    sw = StreamWatcher(name=BENCH_CONTROL_STREAM_NAME, buffer_size_s=2)
+    sw.connect_to_stream()
+
+    dts = np.zeros(n_iter, dtype=np.int64)
+    n_above = 0
+    for i in range(n_iter):
+        outlet.push_sample([float(i % 256)])
+        t0 = time.perf_counter_ns()
+        sw.update()
+        n_above += get_latest(sw.ring_buffer, 0) > threshold
+        dts[i] = time.perf_counter_ns() - t0
+
+    sw.disconnect()
+
+    return {"eval": summarize_ns(dts), "n_above": int(n_above)}
+
+
+def bench_trigger_latency(
+    n_triggers: int = 20,
+    threshold: float = 127,
+    grace_period_s: float = 0.05,
+) -> dict:
+    """
+    Time from pushing a supra-threshold control value to the LSL outlet until
+    the controller has fired its callback
+    """
+    outlet = get_control_outlet()
+    sw = StreamWatcher(name=BENCH_CONTROL_STREAM_NAME, buffer_size_s=2)
+    stop_event = threading.Event()
+    fired = threading.Event()
+    t_fired = [0]
+
+    def callback():
+        t_fired[0] = time.perf_counter_ns()
+        fired.set()
+
+    th = threading.Thread(
+        target=threshold_single_control,
+        args=(sw, callback, stop_event),
+        kwargs={"threshold": threshold, "grace_period_s": grace_period_s},
+    )
+    th.start()
+
+    # give the controller time to connect
+    while sw.inlet is None:
+        time.sleep(0.01)
+    sleep_s(0.2)
+
+    latencies = []
+    n_missed = 0
+    for _ in range(n_triggers):
+        fired.clear()
+        t_push = time.perf_counter_ns()
+        outlet.push_sample([threshold + 1])
+        if fired.wait(timeout=1):
+            latencies.append(t_fired[0] - t_push)
+        else:
+            n_missed += 1
+
+        # release and wait for the grace period to pass
+        outlet.push_sample([0.0])
+        sleep_s(grace_period_s * 2)
+
+    stop_event.set()
+    th.join()
+
+    return {"latency": summarize_ns(latencies), "n_missed": n_missed}
+
+
+def run_all(
+    n_packets: int = 10_000,
+    n_iter: int = 5_000,
+    n_triggers: int = 20,
+) -> dict:
+    results = {}
+    logger.info(f"Benchmarking on_data with {n_packets=}")
+    results["on_data"] = bench_on_data(n_packets)
+    results["on_data_blanking"] = bench_on_data(n_packets, blanking=True)
+    results["on_data_hotpath_stats"] = bench_on_data(
+        n_packets, hotpath_stats=True
+    )
+    results["on_data_quality"] = bench_on_data(n_packets, quality=True)
+    logger.info(f"Benchmarking controller evaluation with {n_iter=}")
+    results["controller_eval"] = bench_controller_eval(n_iter)
+    logger.info(f"Benchmarking trigger latency with {n_triggers=}")
+    results["trigger_latency"] = bench_trigger_latency(n_triggers)
+    return results
+
+
+def main(
+    n_packets: int = 10_000,
+    n_iter: int = 5_000,
+    n_triggers: int = 20,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = run_all(n_packets, n_iter, n_triggers)
+    fpath = write_results("data_path", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+def compare(old: str, new: str, rel_tol: float = 0.1):
+    changed = compare_results(old, new, rel_tol=rel_tol)
+    for k, (a, b, rel) in changed.items():
+        print(f"{k:<45} {a:>12.3f} -> {b:>12.3f} ({rel:+.1%})")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main, "compare": compare})
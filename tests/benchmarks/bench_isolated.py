@@ -0,0 +1,176 @@
+# Jitter of the packet handling with a busy controller, once with the
+# listener in the same process (sharing the GIL) and once in a device
+# process (ct_bic.isolated). A synthetic device delivers packets at 1kHz to
+# a CTListener and records how late each on_data call starts and how long
+# it takes, while a pure python busy loop runs in the main process. For the
+# device process, also the round trip of start_stimulation while a long
+# command (the stats, waiting for the last packet) is pending.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_isolated run
+import threading
+import time
+from functools import partial
+from multiprocessing.connection import Connection
+
+import numpy as np
+from fire import Fire
+
+from ct_bic.isolated import STIM_COMMANDS, DeviceProcess, serve_commands
+from ct_bic.listener import CTListener
+from ct_bic.lsl import get_stream_outlet
+from ct_bic.utils.logging import logger
+from tests.utils.benchmark import summarize_ns, write_results
+from tests.utils.synthetic import get_synthetic_samples
+
+
+class SyntheticDevice:
+    """Paced 1kHz packets to a listener, with the CTManager command names"""
+
+    def __init__(self, listener: CTListener, n_packets: int):
+        self.listener = listener
+        self.samples = get_synthetic_samples(n_packets, 32)
+        self.lateness = np.zeros(n_packets, dtype=np.int64)
+        self.durations = np.zeros(n_packets, dtype=np.int64)
+        self.thread: threading.Thread | None = None
+
+    def _run(self):
+        t0 = time.perf_counter_ns()
+        for i, s in enumerate(self.samples):
+            t_due = t0 + i * 1_000_000
+            while (dt := t_due - time.perf_counter_ns()) > 0:
+                if dt > 2_000_000:
+                    time.sleep((dt - 1_000_000) * 1e-9)
+            t1 = time.perf_counter_ns()
+            self.listener.on_data(s)
+            self.durations[i] = time.perf_counter_ns() - t1
+            self.lateness[i] = t1 - t_due
+
+    def start_stimulation(self) -> int:
+        return 0
+
+    def start_recording(self) -> int:
+        self.thread = threading.Thread(target=self._run, name="synthetic")
+        self.thread.start()
+        return 0
+
+    def stats(self) -> dict:
+        self.thread.join()
+        return {
+            "lateness": summarize_ns(self.lateness),
+            "callback": summarize_ns(self.durations),
+        }
+
+
+def get_listener(stream_name: str) -> CTListener:
+    outlet, _ = get_stream_outlet(stream_name, sfreq=1000, n_channels=32)
+    return CTListener(outlet=outlet)
+
+
+def run_synthetic_device(
+    conn: Connection,
+    stim_conn: Connection,
+    device_id: str | None = None,
+    n_packets: int = 5000,
+):
+    """Device process target without an implant, see run_device_process"""
+    dev = SyntheticDevice(get_listener("ct_bic_bench_isolated"), n_packets)
+    threading.Thread(
+        target=serve_commands,
+        args=(stim_conn, dev, 0.01, STIM_COMMANDS),
+        daemon=True,
+    ).start()
+    conn.send((0, "ok", "synthetic"))  # the startup reply, seq 0
+    serve_commands(conn, dev)
+
+
+def busy_loop(stop_event: threading.Event):
+    """Stand-in for a busy controller - pure python, holding the GIL"""
+    x = 0
+    while not stop_event.is_set():
+        for i in range(1000):
+            x += i % 7
+
+
+def bench_in_process(n_packets: int = 5000, n_busy: int = 1) -> dict:
+    dev = SyntheticDevice(get_listener("ct_bic_bench_in_process"), n_packets)
+    stop_event = threading.Event()
+    busy = [
+        threading.Thread(target=busy_loop, args=(stop_event,))
+        for _ in range(n_busy)
+    ]
+    for th in busy:
+        th.start()
+    dev.start_recording()
+    res = dev.stats()
+    stop_event.set()
+    for th in busy:
+        th.join()
+    return res
+
+
+def bench_isolated(n_packets: int = 5000, n_busy: int = 1) -> dict:
+    dp = DeviceProcess(
+        target=partial(run_synthetic_device, n_packets=n_packets)
+    )
+    dp.start()
+    stop_event = threading.Event()
+    busy = [
+        threading.Thread(target=busy_loop, args=(stop_event,))
+        for _ in range(n_busy)
+    ]
+    for th in busy:
+        th.start()
+    dp.start_recording()
+    # the stats only return after the last packet
+    res = {}
+    stats_th = threading.Thread(
+        target=lambda: res.update(
+            dp.call("stats", timeout=n_packets / 1000 + 10)
+        )
+    )
+    stats_th.start()
+    stim_ns = []
+    while stats_th.is_alive():
+        t0 = time.perf_counter_ns()
+        dp.start_stimulation()
+        stim_ns.append(time.perf_counter_ns() - t0)
+        time.sleep(0.01)
+    stats_th.join()
+    res["stim_call"] = summarize_ns(stim_ns)
+    stop_event.set()
+    for th in busy:
+        th.join()
+    dp.close()
+    return res
+
+
+def main(
+    n_packets: int = 5000,
+    n_busy: int = 1,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = {}
+    logger.info(f"Benchmarking in process with {n_packets=}, {n_busy=}")
+    results["in_process"] = bench_in_process(n_packets, n_busy)
+    logger.info(f"Benchmarking isolated with {n_packets=}, {n_busy=}")
+    results["isolated"] = bench_isolated(n_packets, n_busy)
+
+    for mode in ["in_process", "isolated"]:
+        late = results[mode]["lateness"]
+        print(
+            f"{mode:<12} lateness p50={late['p50_us']:.0f}us"
+            f" p99={late['p99_us']:.0f}us max={late['max_us']:.0f}us"
+        )
+    stim = results["isolated"]["stim_call"]
+    print(
+        f"start_stimulation during stats p50={stim['p50_us']:.0f}us"
+        f" max={stim['max_us']:.0f}us"
+    )
+    fpath = write_results("isolated", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
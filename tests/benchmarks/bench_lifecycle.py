@@ -0,0 +1,196 @@
+# Stop and restart latencies without hardware:
+#   - of the controller thread, stopped in each of its states: waiting for
+#     the control stream, listening and within the grace period after a
+#     trigger
+#   - of a CTManager with synthetic devices, CTManager.stop() followed by
+#     restart() - measurements, sinks, watchdog and controller included -
+#     until the first packet of the new measurement arrives
+#   - of CTManager.reconfigure_recording with synthetic devices, i.e. the
+#     timings it reports for the stop / start of the measurement
+#
+# Usage:
+#   python -m tests.benchmarks.bench_lifecycle run
+import threading
+import time
+
+import numpy as np
+from fire import Fire
+
+from ct_bic.controller import threshold_single_control
+from ct_bic.device import CTDevice
+from ct_bic.main import CTManager
+from ct_bic.utils.logging import logger
+from ct_bic.utils.threads import stop_thread
+from dareplane_utils.stream_watcher.lsl_stream_watcher import StreamWatcher
+from tests.benchmarks.bench_data_path import (
+    BENCH_CONTROL_STREAM_NAME,
+    get_control_outlet,
+)
+from tests.utils.benchmark import summarize_ns, write_results
+from tests.utils.synthetic import SyntheticImplant, SyntheticImplantInfo
+
+
+class SyntheticCTManager(CTManager):
+    """CTManager with a SyntheticImplant per device instead of the SDK"""
+
+    def init_implant(self, device_ids: list[str] | None = None):
+        for device_id in device_ids or ["synthetic"]:
+            self.devices[device_id] = CTDevice(
+                device_id=device_id,
+                ext_unit_info=None,
+                implant_info=SyntheticImplantInfo(),
+                implant=SyntheticImplant(),
+            )
+
+
+def start_controller(
+    stream_name: str = BENCH_CONTROL_STREAM_NAME,
+    grace_period_s: float = 1.5,
+) -> tuple[threading.Thread, threading.Event, StreamWatcher]:
+    sw = StreamWatcher(name=stream_name, buffer_size_s=2)
+    stop_event = threading.Event()
+    th = threading.Thread(
+        target=threshold_single_control,
+        args=(sw, lambda: None, stop_event),
+        kwargs={"threshold": 127, "grace_period_s": grace_period_s},
+    )
+    th.start()
+    return th, stop_event, sw
+
+
+def wait_connected(sw: StreamWatcher, timeout: float = 5) -> bool:
+    t0 = time.perf_counter()
+    while sw.inlet is None and time.perf_counter() - t0 < timeout:
+        time.sleep(0.0005)
+    return sw.inlet is not None
+
+
+def time_stop(th: threading.Thread, stop_event: threading.Event) -> int:
+    t0 = time.perf_counter_ns()
+    assert stop_thread(th, stop_event, timeout=2), "Thread did not stop"
+    return time.perf_counter_ns() - t0
+
+
+def bench_stop_restart(n_cycles: int = 10) -> dict:
+    outlet = get_control_outlet()
+
+    t_stop_waiting = []
+    t_stop_listening = []
+    t_stop_grace = []
+    t_restart = []
+
+    for _ in range(n_cycles):
+        # no stream of that name -> controller waits for it
+        th, stop_event, _ = start_controller("ct_bic_bench_not_existing")
+        time.sleep(0.05)
+        t_stop_waiting.append(time_stop(th, stop_event))
+
+        t0 = time.perf_counter_ns()
+        th, stop_event, sw = start_controller()
+        assert wait_connected(sw), "Controller did not connect"
+        t_restart.append(time.perf_counter_ns() - t0)
+
+        time.sleep(0.02)
+        t_stop_listening.append(time_stop(th, stop_event))
+
+        th, stop_event, sw = start_controller()
+        wait_connected(sw)
+        time.sleep(0.02)
+        outlet.push_sample([200.0])  # trigger -> enters the grace period
+        time.sleep(0.05)
+        t_stop_grace.append(time_stop(th, stop_event))
+        outlet.push_sample([0.0])
+
+    stop = np.asarray(t_stop_listening)
+    restart = np.asarray(t_restart)
+    return {
+        "stop_waiting_for_stream": summarize_ns(t_stop_waiting),
+        "stop_listening": summarize_ns(t_stop_listening),
+        "stop_in_grace_period": summarize_ns(t_stop_grace),
+        "restart_until_connected": summarize_ns(t_restart),
+        "stop_to_restart": summarize_ns(stop + restart),
+    }
+
+
+def wait_first_packet(ctm: CTManager, timeout: float = 2) -> int:
+    """Time stamp of the latest device delivering its first packet"""
+    t_end = time.perf_counter() + timeout
+    implants = [dev.implant for dev in ctm.devices.values()]
+    while not all(imp.t_first_ns for imp in implants):
+        assert time.perf_counter() < t_end, "No packets after the restart"
+        time.sleep(0.0005)
+    return max(imp.t_first_ns for imp in implants)
+
+
+def bench_manager_restart(n_cycles: int = 10, n_devices: int = 1) -> dict:
+    ctm = SyntheticCTManager(
+        device_ids=[f"synthetic_{i}" for i in range(n_devices)]
+    )
+    t_stop = []
+    t_restart = []
+    t_first_packet = []
+    try:
+        ctm.start_recording()
+        ctm.listen_for_stim_trigger()
+        wait_first_packet(ctm)
+        for _ in range(n_cycles):
+            time.sleep(0.05)
+            t_stop.append(int(ctm.stop() * 1e9))
+            # stop() ended the controller as well, restart() brings back
+            # what was running
+            ctm.listen_for_stim_trigger()
+            t0 = time.perf_counter_ns()
+            ctm.restart()
+            t1 = time.perf_counter_ns()
+            t_restart.append(t1 - t0)
+            t_first_packet.append(wait_first_packet(ctm) - t0)
+    finally:
+        ctm.close()
+    return {
+        "manager_stop": summarize_ns(t_stop),
+        "manager_restart": summarize_ns(t_restart),
+        "manager_restart_to_first_packet": summarize_ns(t_first_packet),
+    }
+
+
+def bench_reconfigure(n_cycles: int = 10, n_devices: int = 1) -> dict:
+    ctm = SyntheticCTManager(
+        device_ids=[f"synthetic_{i}" for i in range(n_devices)]
+    )
+    timings = []
+    try:
+        ctm.start_recording()
+        wait_first_packet(ctm)
+        for _ in range(n_cycles):
+            time.sleep(0.05)
+            timings.extend(ctm.reconfigure_recording().values())
+    finally:
+        ctm.close()
+    return {
+        f"reconfigure_{key}": summarize_ns(
+            [int(t[key] * 1e6) for t in timings]
+        )
+        for key in ("stop_ms", "start_ms", "first_packet_ms", "blackout_ms")
+    }
+
+
+def main(
+    n_cycles: int = 10,
+    n_devices: int = 1,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    logger.info(f"Benchmarking stop/restart with {n_cycles=}")
+    results = bench_stop_restart(n_cycles)
+    results.update(bench_manager_restart(n_cycles, n_devices))
+    results.update(bench_reconfigure(n_cycles, n_devices))
+    for k, v in results.items():
+        print(
+            f"{k:<32} p50={v['p50_us'] / 1e3:.1f}ms max={v['max_us'] / 1e3:.1f}ms"
+        )
+    fpath = write_results("lifecycle", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
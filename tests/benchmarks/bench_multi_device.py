@@ -0,0 +1,108 @@
+# Scaling benchmark for multiple devices - each simulated device has its own
+# CTListener, ring buffer and outlet and is fed from its own thread, just as
+# the SDK would call on_data from one callback thread per external unit.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_multi_device run --n_devices="[1,2,4]"
+import threading
+import time
+
+from fire import Fire
+
+from ct_bic.listener import CTListener
+from ct_bic.lsl import get_stream_outlet
+from ct_bic.utils.logging import logger
+from dareplane_utils.general.ringbuffer import RingBuffer
+from tests.benchmarks.bench_data_path import BENCH_STREAM_NAME
+from tests.utils.benchmark import write_results
+from tests.utils.synthetic import get_synthetic_samples
+
+
+def get_device_listeners(n_devices: int) -> list[CTListener]:
+    listeners = []
+    for i in range(n_devices):
+        outlet, _ = get_stream_outlet(
+            f"{BENCH_STREAM_NAME}_{i}",
+            sfreq=1000,
+            n_channels=32,
+            source_id=f"{BENCH_STREAM_NAME}_dev{i}",
+        )
+        listeners.append(CTListener(RingBuffer((5000, 32)), outlet=outlet))
+    return listeners
+
+
+def replay(
+    listener: CTListener,
+    samples: list,
+    barrier: threading.Barrier,
+    durations_ns: list[int],
+    i: int,
+):
+    barrier.wait()
+    t0 = time.perf_counter_ns()
+    for s in samples:
+        listener.on_data(s)
+    durations_ns[i] = time.perf_counter_ns() - t0
+
+
+def bench_n_devices(n_devices: int, n_packets: int = 10_000) -> dict:
+    """Per device throughput with all devices fed in parallel"""
+    listeners = get_device_listeners(n_devices)
+    samples = [
+        get_synthetic_samples(n_packets, seed=i) for i in range(n_devices)
+    ]
+
+    barrier = threading.Barrier(n_devices)
+    durations_ns = [0] * n_devices
+    ths = [
+        threading.Thread(
+            target=replay,
+            args=(listener, s, barrier, durations_ns, i),
+        )
+        for i, (listener, s) in enumerate(zip(listeners, samples))
+    ]
+
+    t0 = time.perf_counter_ns()
+    for th in ths:
+        th.start()
+    for th in ths:
+        th.join()
+    total_ns = time.perf_counter_ns() - t0
+
+    rates = [n_packets / (d * 1e-9) for d in durations_ns]
+    return {
+        "n_devices": n_devices,
+        "packet_rate_per_device_hz": {
+            f"dev{i}": r for i, r in enumerate(rates)
+        },
+        "min_packet_rate_per_device_hz": min(rates),
+        "total_packet_rate_hz": n_devices * n_packets / (total_ns * 1e-9),
+    }
+
+
+def run_all(n_devices: list[int] = [1, 2, 4], n_packets: int = 10_000) -> dict:
+    results = {}
+    for n in n_devices:
+        logger.info(f"Benchmarking {n} devices with {n_packets=}")
+        results[f"{n}_devices"] = bench_n_devices(n, n_packets)
+    return results
+
+
+def main(
+    n_devices: list[int] = [1, 2, 4],
+    n_packets: int = 10_000,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = run_all(n_devices, n_packets)
+    for k, r in results.items():
+        print(
+            f"{k}: min per device {r['min_packet_rate_per_device_hz']:.0f}Hz,"
+            f" total {r['total_packet_rate_hz']:.0f}Hz"
+        )
+    fpath = write_results("multi_device", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
@@ -0,0 +1,151 @@
+# End-to-end latency and CPU use of the data outlet for different settings of
+# [outlets] data in config.toml. Synthetic packets are delivered at 1kHz to a
+# CTListener, a local inlet polls the stream like a downstream consumer. The
+# latency of a sample is the time from its LSL time stamp (set when the
+# listener pushes it, back dated within a chunk) to the pull which returned
+# it, so it includes waiting for a chunk to fill.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_outlet run
+#   python -m tests.benchmarks.bench_outlet run --chunk_sizes=[0,32] --push_chunk_ns=[1,5]
+import itertools
+import threading
+import time
+
+import numpy as np
+import pylsl
+from fire import Fire
+
+from ct_bic.listener import CTListener
+from ct_bic.lsl import get_stream_outlet
+from ct_bic.utils.logging import logger
+from tests.utils.benchmark import summarize_ns, write_results
+from tests.utils.synthetic import get_synthetic_samples
+
+BENCH_OUTLET_STREAM_NAME = "ct_bic_bench_outlet"
+
+
+def pull_latencies(
+    inlet: pylsl.StreamInlet,
+    n_samples: int,
+    stop_event: threading.Event,
+    poll_s: float = 0.001,
+) -> list[float]:
+    """Poll the inlet and return the latency of every sample in s"""
+    latencies = []
+    while len(latencies) < n_samples and not stop_event.is_set():
+        _, ts = inlet.pull_chunk(timeout=0.0)
+        if ts:
+            t = pylsl.local_clock()
+            latencies.extend(t - np.asarray(ts))
+        else:
+            time.sleep(poll_s)
+    return latencies
+
+
+def deliver(listener: CTListener, n_packets: int) -> np.ndarray:
+    """
+    Packets at 1kHz, returning the on_data durations in ns. Sleeps instead of
+    spinning between packets, so that the process CPU time is not dominated
+    by the pacing.
+    """
+    samples = get_synthetic_samples(n_packets, 32)
+    durations = np.zeros(n_packets, dtype=np.int64)
+    t0 = time.perf_counter_ns()
+    for i, s in enumerate(samples):
+        dt = t0 + i * 1_000_000 - time.perf_counter_ns()
+        if dt > 0:
+            time.sleep(dt * 1e-9)
+        t1 = time.perf_counter_ns()
+        listener.on_data(s)
+        durations[i] = time.perf_counter_ns() - t1
+    listener.flush_chunk()
+    return durations
+
+
+def bench_setting(
+    chunk_size: int = 0,
+    push_chunk_n: int = 1,
+    max_buffered: int = 2,
+    n_packets: int = 2000,
+    poll_s: float = 0.001,
+) -> dict:
+    stream_name = (
+        f"{BENCH_OUTLET_STREAM_NAME}_{chunk_size}_{push_chunk_n}"
+        f"_{max_buffered}"
+    )
+    outlet, _ = get_stream_outlet(
+        stream_name,
+        sfreq=1000,
+        n_channels=32,
+        max_buffer_s=max_buffered,
+        chunk_size=chunk_size,
+    )
+    listener = CTListener(outlet=outlet, chunk_n=push_chunk_n)
+
+    inlet = pylsl.StreamInlet(
+        pylsl.resolve_byprop("name", stream_name, timeout=5)[0]
+    )
+    inlet.open_stream(timeout=5)
+
+    latencies = []
+    stop_event = threading.Event()
+    th = threading.Thread(
+        target=lambda: latencies.extend(
+            pull_latencies(inlet, n_packets, stop_event, poll_s)
+        ),
+        name="bench_inlet",
+    )
+    th.start()
+
+    cpu_t0 = time.process_time()
+    wall_t0 = time.perf_counter()
+    durations = deliver(listener, n_packets)
+    th.join(timeout=2)
+    stop_event.set()
+    th.join()
+    cpu_s = time.process_time() - cpu_t0
+    wall_s = time.perf_counter() - wall_t0
+
+    inlet.close_stream()
+    return {
+        "chunk_size": chunk_size,
+        "push_chunk_n": push_chunk_n,
+        "max_buffered": max_buffered,
+        "n_received": len(latencies),
+        "latency": summarize_ns(np.asarray(latencies) * 1e9),
+        "callback": summarize_ns(durations),
+        # listener, liblsl and inlet together, in % of a single core
+        "cpu_percent": 100 * cpu_s / wall_s,
+    }
+
+
+def main(
+    chunk_sizes: list[int] = [0, 10, 50],
+    push_chunk_ns: list[int] = [1, 10],
+    max_buffered: list[int] = [2],
+    n_packets: int = 5000,
+    poll_s: float = 0.001,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = {}
+    for cs, pn, mb in itertools.product(
+        chunk_sizes, push_chunk_ns, max_buffered
+    ):
+        logger.info(f"Benchmarking {cs=}, {pn=}, {mb=}")
+        res = bench_setting(cs, pn, mb, n_packets=n_packets, poll_s=poll_s)
+        results[f"chunk_size{cs}_push_chunk_n{pn}_max_buffered{mb}"] = res
+        lat = res["latency"]
+        print(
+            f"chunk_size={cs:<3} push_chunk_n={pn:<3} max_buffered={mb:<3}"
+            f" latency p50={lat['p50_us']:.0f}us p99={lat['p99_us']:.0f}us"
+            f" cpu={res['cpu_percent']:.1f}%"
+            f" callback p50={res['callback']['p50_us']:.1f}us"
+        )
+    fpath = write_results("outlet", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
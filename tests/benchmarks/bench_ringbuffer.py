@@ -0,0 +1,97 @@
+# Allocations and time per call for reading the latest samples of a ring
+# buffer, comparing `RingBuffer.unfold_buffer` with the views of
+# ct_bic.utils.ringbuffer.get_window, and for resetting the buffer.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_ringbuffer run
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+from fire import Fire
+
+from ct_bic.utils.ringbuffer import get_window, reset_ringbuffer
+from dareplane_utils.general.ringbuffer import RingBuffer
+from tests.utils.benchmark import summarize_ns, write_results
+
+
+def get_filled_buffer(buffer_size_s: float = 5) -> RingBuffer:
+    n = int(buffer_size_s * 1000)
+    rb = RingBuffer(shape=(n, 32))
+    data = np.random.default_rng(0).normal(size=(n + n // 3, 32))
+    # wrap around once, so that windows cross the end of the buffer
+    rb.add_samples(data[:n], np.arange(n))
+    rb.add_samples(data[n:], np.arange(n, len(data)))
+    return rb
+
+
+def measure(func: Callable, n_iter: int) -> dict:
+    """Time per call and bytes allocated per call"""
+    func()  # warmup
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    m0, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    dts = np.zeros(n_iter, dtype=np.int64)
+    for i in range(n_iter):
+        t0 = time.perf_counter_ns()
+        func()
+        dts[i] = time.perf_counter_ns() - t0
+
+    return {"time": summarize_ns(dts), "peak_alloc_bytes": int(peak - m0)}
+
+
+def reset_realloc(rb: RingBuffer):
+    """How CTListener.reset_buffers used to clear the buffer"""
+    rb.buffer = np.zeros(rb.buffer.shape)
+    rb.buffer_t = np.zeros(rb.buffer.shape[0])
+    rb.curr_i = 0
+
+
+def bench_ringbuffer(
+    n_iter: int = 2_000, n_window: int = 500, buffer_size_s: float = 5
+) -> dict:
+    rb = get_filled_buffer(buffer_size_s)
+    results = {
+        "unfold_last_n": measure(
+            lambda: rb.unfold_buffer()[-n_window:], n_iter
+        ),
+        "window_last_n": measure(lambda: get_window(rb, n_window), n_iter),
+        "unfold_last_value": measure(
+            lambda: rb.unfold_buffer()[-1, 0], n_iter
+        ),
+        "window_last_value": measure(
+            lambda: rb.buffer[rb.curr_i - 1, 0], n_iter
+        ),
+    }
+
+    rb = get_filled_buffer(buffer_size_s)
+    results["reset_realloc"] = measure(lambda: reset_realloc(rb), n_iter)
+    rb = get_filled_buffer(buffer_size_s)
+    results["reset_in_place"] = measure(lambda: reset_ringbuffer(rb), n_iter)
+    return results
+
+
+def main(
+    n_iter: int = 2_000,
+    n_window: int = 500,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = bench_ringbuffer(n_iter, n_window)
+    for k, v in results.items():
+        print(
+            f"{k:<20} p50={v['time']['p50_us']:>9.2f}us"
+            f" alloc={v['peak_alloc_bytes']:>9d}B"
+        )
+    fpath = write_results("ringbuffer", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
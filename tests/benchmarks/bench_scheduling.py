@@ -0,0 +1,78 @@
+# Scheduling latency, i.e. how late the wake ups of a 1kHz sleep loop are
+# (see ct_bic.scheduling.measure_jitter), without and with a scheduling
+# policy - idle and with `n_load` busy processes competing for the cores.
+# Raising the priority needs root / CAP_SYS_NICE on Linux, refused settings
+# show up as "failed" in the results.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_scheduling run
+#   sudo python -m tests.benchmarks.bench_scheduling run --realtime_priority=50
+#   python -m tests.benchmarks.bench_scheduling run --cpus=[3] --nice=-10
+import multiprocessing as mp
+import os
+
+from fire import Fire
+
+from ct_bic.scheduling import SchedulingPolicy, measure_jitter
+from ct_bic.utils.logging import logger
+from tests.utils.benchmark import write_results
+
+
+def spin(stop_event):
+    while not stop_event.is_set():
+        pass
+
+
+def bench_policy(
+    policy: SchedulingPolicy | None = None,
+    duration_s: float = 5,
+    interval_s: float = 0.001,
+    n_load: int = 0,
+) -> dict:
+    ctx = mp.get_context("spawn")
+    stop_event = ctx.Event()
+    procs = [
+        ctx.Process(target=spin, args=(stop_event,)) for _ in range(n_load)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        return measure_jitter(policy, duration_s, interval_s)
+    finally:
+        stop_event.set()
+        for p in procs:
+            p.join()
+
+
+def main(
+    cpus: list[int] | None = None,
+    nice: int = -10,
+    realtime_priority: int = 0,
+    duration_s: float = 5,
+    interval_s: float = 0.001,
+    n_load: int | None = None,  # if None -> one per core
+    out_dir: str = "./tests/benchmarks/results",
+):
+    n_load = n_load if n_load is not None else os.cpu_count()
+    policy = SchedulingPolicy(
+        cpus=list(cpus or []), nice=nice, realtime_priority=realtime_priority
+    )
+    results = {}
+    for load in (0, n_load):
+        for name, pol in (("default", None), ("policy", policy)):
+            key = f"{name}_load{load}"
+            logger.info(f"Benchmarking scheduling - {key}")
+            res = bench_policy(pol, duration_s, interval_s, load)
+            results[key] = res
+            print(
+                f"{key:<16} p50={res['p50_us']:.0f}us p99={res['p99_us']:.0f}us"
+                f" max={res['max_us'] * 1e-3:.1f}ms late={res['n_late']}"
+                f" {res['applied']}"
+            )
+    fpath = write_results("scheduling", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
@@ -0,0 +1,102 @@
+# Duration of CTListener.on_data with a slow consumer, once run inline as a
+# stage and once as a sink (ct_bic.sinks) with each overflow policy. The
+# consumer stands in for a disk writer: cheap per packet, but stalling for
+# `hiccup_s` every `hiccup_every` packets. Packets are paced at 1kHz.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_sinks run
+#   python -m tests.benchmarks.bench_sinks run --hiccup_s=0.2
+import time
+
+import numpy as np
+from fire import Fire
+
+from ct_bic.sinks import OVERFLOW_POLICIES, SinkRegistry
+from ct_bic.utils.logging import logger
+from tests.benchmarks.bench_data_path import get_bench_listener
+from tests.utils.benchmark import summarize_ns, write_results
+from tests.utils.synthetic import get_synthetic_samples
+
+
+class HiccupSink:
+    def __init__(self, hiccup_s: float, hiccup_every: int):
+        self.hiccup_s = hiccup_s
+        self.hiccup_every = hiccup_every
+        self.n = 0
+
+    def process(self, data: np.ndarray, cntr: int):
+        self.n += 1
+        if self.n % self.hiccup_every == 0:
+            time.sleep(self.hiccup_s)
+
+
+def bench_mode(
+    mode: str = "drop_oldest",  # "stage" or one of OVERFLOW_POLICIES
+    n_packets: int = 2000,
+    hiccup_s: float = 0.05,
+    hiccup_every: int = 500,
+    queue_n: int = 100,
+) -> dict:
+    sink = HiccupSink(hiccup_s, hiccup_every)
+    listener = get_bench_listener()
+    reg = None
+    if mode == "stage":
+        listener.stages.append(sink)
+    else:
+        reg = SinkRegistry(queue_n=queue_n, policy=mode)
+        reg.add("hiccup", sink)
+        reg.start()
+        listener.sinks = reg
+
+    samples = get_synthetic_samples(n_packets)
+    dts = np.zeros(n_packets, dtype=np.int64)
+    t0 = time.perf_counter_ns()
+    for i, s in enumerate(samples):
+        # sleep instead of spinning, see bench_closed_loop.deliver
+        dt = t0 + i * 1_000_000 - time.perf_counter_ns()
+        if dt > 0:
+            time.sleep(dt * 1e-9)
+        t = time.perf_counter_ns()
+        listener.on_data(s)
+        dts[i] = time.perf_counter_ns() - t
+    # packets which arrived later than their 1kHz slot
+    late_ms = (time.perf_counter_ns() - t0) * 1e-6 - n_packets
+
+    res = {"callback": summarize_ns(dts), "behind_ms": max(late_ms, 0)}
+    if reg is not None:
+        reg.stop(timeout=2)
+        w = reg.workers["hiccup"].summary()
+        res.update(
+            n_dropped=w["n_dropped"],
+            n_processed=w["n_processed"],
+            max_lag_us=w["max_lag_us"],
+        )
+    return res
+
+
+def main(
+    n_packets: int = 5000,
+    hiccup_s: float = 0.05,
+    hiccup_every: int = 500,
+    queue_n: int = 100,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    results = {}
+    for mode in ("stage",) + OVERFLOW_POLICIES:
+        logger.info(f"Benchmarking sinks with {mode=}")
+        res = bench_mode(mode, n_packets, hiccup_s, hiccup_every, queue_n)
+        results[mode] = res
+        cb = res["callback"]
+        print(
+            f"{mode:<12} callback p50={cb['p50_us']:.0f}us"
+            f" p99={cb['p99_us']:.0f}us max={cb['max_us'] * 1e-3:.1f}ms"
+            f" dropped={res.get('n_dropped', 0)}"
+            f" max_lag={res.get('max_lag_us', 0) * 1e-3:.1f}ms"
+        )
+    fpath = write_results("sinks", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
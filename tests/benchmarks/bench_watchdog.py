@@ -0,0 +1,141 @@
+# Time to detect a stall of the data flow and time to recover from it with
+# the automatic restart (ct_bic.watchdog). Synthetic packets are delivered to
+# a CTListener at 1kHz, the delivery is paused to simulate a link loss. The
+# restart resumes the delivery with new counters after `restart_s`, standing
+# in for stop_measurement + start_measurement of the SDK.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_watchdog run
+#   python -m tests.benchmarks.bench_watchdog run --stall_s=[0.1,0.3]
+import threading
+import time
+
+import numpy as np
+from fire import Fire
+
+from ct_bic.listener import CTListener
+from ct_bic.lsl import get_stream_outlet
+from ct_bic.watchdog import DataWatchdog
+from ct_bic.utils.logging import logger
+from tests.utils.benchmark import write_results
+from tests.utils.synthetic import get_synthetic_samples
+
+BENCH_WD_STREAM_NAME = "ct_bic_bench_watchdog"
+
+
+class PausableSource:
+    """
+    1kHz packets to the listener, sleeping between packets, see deliver in
+    bench_closed_loop
+    """
+
+    def __init__(self, listener: CTListener, restart_s: float):
+        self.listener = listener
+        self.restart_s = restart_s
+        self.samples = get_synthetic_samples(1000)
+        self.running = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        i = 0
+        while not self.stop_event.is_set():
+            if not self.running.wait(0.01):
+                continue
+            s = self.samples[i % len(self.samples)]
+            s.measurement_counter = i
+            self.listener.on_data(s)
+            i += 1
+            time.sleep(0.001)
+
+    def restart(self):
+        # the restart is done by the watchdog thread and blocks it
+        self.running.clear()
+        time.sleep(self.restart_s)
+        self.running.set()
+
+
+def bench_setting(
+    stall_s: float = 0.3,
+    check_s: float = 0.05,
+    restart_s: float = 0.1,
+    n_stalls: int = 5,
+) -> dict:
+    wd = DataWatchdog(stall_s=stall_s, startup_s=1, check_s=check_s)
+    outlet, _ = get_stream_outlet(BENCH_WD_STREAM_NAME, sfreq=1000)
+    listener = CTListener(outlet=outlet, watchdog=wd)
+    src = PausableSource(listener, restart_s)
+    wd.restart = src.restart
+
+    src.running.set()
+    src.thread.start()
+    wd.arm()
+    wd.start()
+
+    timeout_s = 10 * (stall_s + restart_s + 1)
+    for i in range(n_stalls):
+        time.sleep(0.2)
+        src.running.clear()
+        # wait for the recovery
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < timeout_s and not (
+            len(wd.stalls) > i and wd.stalls[-1]["recover_ms"] is not None
+        ):
+            time.sleep(0.01)
+
+    wd.stop()
+    src.stop_event.set()
+    src.thread.join()
+
+    detect = np.array([s["detect_ms"] for s in wd.stalls])
+    recovered = [s for s in wd.stalls if s["recover_ms"] is not None]
+    recover = np.array([s["recover_ms"] for s in recovered])
+    outage = np.array([s["detect_ms"] + s["recover_ms"] for s in recovered])
+    return {
+        "stall_s": stall_s,
+        "check_s": check_s,
+        "restart_s": restart_s,
+        "n_stalls": len(wd.stalls),
+        "n_recovered": len(recover),
+        "detect_ms": {
+            "p50": float(np.median(detect)),
+            "max": float(detect.max()),
+        },
+        "recover_ms": {
+            "p50": float(np.median(recover)) if len(recover) else None,
+            "max": float(recover.max()) if len(recover) else None,
+        },
+        # from the last packet before the stall to the first one after
+        "outage_ms": {
+            "p50": float(np.median(outage)) if len(outage) else None,
+        },
+    }
+
+
+def main(
+    stall_s: list[float] = [0.1, 0.3],
+    check_s: float = 0.05,
+    restart_s: float = 0.1,
+    n_stalls: int = 5,
+    out_dir: str = "./tests/benchmarks/results",
+):
+    stall_s = stall_s if isinstance(stall_s, (list, tuple)) else [stall_s]
+    results = []
+    for st in stall_s:
+        logger.info(f"Benchmarking watchdog with {st=}, {check_s=}")
+        res = bench_setting(st, check_s, restart_s, n_stalls)
+        results.append(res)
+        print(
+            f"stall_s={st:<5} detect p50={res['detect_ms']['p50']:.0f}ms"
+            f" max={res['detect_ms']['max']:.0f}ms | recover"
+            f" p50={res['recover_ms']['p50']:.0f}ms | outage"
+            f" p50={res['outage_ms']['p50']:.0f}ms"
+            f" ({res['n_recovered']}/{res['n_stalls']} recovered)"
+        )
+    fpath = write_results("watchdog", results, out_dir=out_dir)
+    print(f"Results written to {fpath}")
+    return 0
+
+
+if __name__ == "__main__":
+    Fire({"run": main})
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from ct_bic.archive import (
+    ArchiveReader,
+    ArchiveWriter,
+    csv_to_archive,
+    index_path,
+)
+from ct_bic.listener import buffers_to_df
+from ct_bic.replay import load_recording
+from tests.utils.synthetic import get_synthetic_data
+
+
+@pytest.fixture
+def recording():
+    data = get_synthetic_data(10_500)
+    cntr = np.arange(len(data), dtype=np.int64) + 100
+    cntr[5000:] += 7  # a few dropped packets
+    return data, cntr
+
+
+def test_roundtrip_is_lossless(tmp_path, recording):
+    data, cntr = recording
+    pth = tmp_path / "rec.ctbic"
+    with ArchiveWriter(pth, chunk_n=1000) as wr:
+        # packets of a single sample as in the listener, then a block
+        for row, c in zip(data[:10], cntr[:10]):
+            wr.process(row[None, :], c)
+        wr.add(data[10:], cntr[10:])
+
+    with ArchiveReader(pth) as rd:
+        assert len(rd.index) == 11 and rd.n_samples == len(data)
+        d, c, t = rd.read_all()
+
+    np.testing.assert_array_equal(d, data)
+    np.testing.assert_array_equal(c, cntr)
+    np.testing.assert_array_equal(t, cntr / 1000)
+    assert pth.stat().st_size < data.nbytes
+
+
+def test_random_access_reads_only_needed_chunks(tmp_path, recording):
+    data, cntr = recording
+    pth = tmp_path / "rec.ctbic"
+    with ArchiveWriter(pth, chunk_n=1000) as wr:
+        wr.add(data, cntr)
+
+    with ArchiveReader(pth) as rd:
+        d, c, _ = rd.read_cntr(4500, 5600)
+        assert rd.n_chunks_read == 2
+        msk = (cntr >= 4500) & (cntr <= 5600)
+        np.testing.assert_array_equal(d, data[msk])
+        np.testing.assert_array_equal(c, cntr[msk])
+
+        d, c, t = rd.read_time(7.0, 7.5)
+        assert rd.n_chunks_read == 4  # t 7.0 lies in the 7th chunk
+        assert t.min() >= 7.0 and t.max() <= 7.5 and len(t) == 501
+
+        assert len(rd.read_cntr(0, 50)[0]) == 0
+
+
+def test_counter_resets_start_segments(tmp_path, recording):
+    data, cntr = recording
+    pth = tmp_path / "rec.ctbic"
+    with ArchiveWriter(pth, chunk_n=1000) as wr:
+        wr.add(data[:2500], cntr[:2500])
+        # stop / start of the measurement within a packet and between two
+        for row, c in zip(data[2500:2502], (2600, 0)):
+            wr.process(row[None, :], c)
+        wr.add(data[2502:4000], np.arange(1, 1499))
+        wr.add(data[4000:], np.arange(len(data) - 4000))
+
+    with ArchiveReader(pth) as rd:
+        assert rd.n_segments == 3
+        # no chunk mixes two segments
+        assert np.all(rd.index["cntr_first"] <= rd.index["cntr_last"])
+        assert rd.n_samples == len(data)
+        # counters 100..200 exist in every segment
+        d, c, _ = rd.read_cntr(100, 200)
+        assert len(c) == 3 * 101
+        np.testing.assert_array_equal(d[101:202], data[2601:2702])
+        d, c, _ = rd.read_cntr(100, 200, segment=2)
+        np.testing.assert_array_equal(d, data[4100:4201])
+        np.testing.assert_array_equal(c, np.arange(100, 201))
+        # counters 0..100 of the second segment, the packet after the reset
+        np.testing.assert_array_equal(
+            rd.read_time(0, 0.1, segment=1)[0], data[2501:2602]
+        )
+
+
+def test_empty_archive(tmp_path):
+    pth = tmp_path / "rec.ctbic"
+    ArchiveWriter(pth, n_channels=4).close()
+    with ArchiveReader(pth) as rd:
+        d, c, t = rd.read_all()
+        assert rd.n_segments == 0
+    assert d.shape == (0, 4) and len(c) == len(t) == 0
+
+
+def test_index_is_rebuilt(tmp_path, recording):
+    data, cntr = recording
+    pth = tmp_path / "rec.ctbic"
+    with ArchiveWriter(pth, chunk_n=1000) as wr:
+        wr.add(data, cntr)
+    index = np.load(index_path(pth))
+    index_path(pth).unlink()
+
+    with ArchiveReader(pth) as rd:
+        np.testing.assert_array_equal(rd.index, index)
+    assert index_path(pth).exists()
+
+
+def test_csv_conversion(tmp_path, recording):
+    data, cntr = recording
+    csv = tmp_path / "rec.csv"
+    buffers_to_df(data.tolist(), cntr.tolist()).to_csv(csv, index=False)
+
+    out = csv_to_archive(csv, csv_chunksize=3000)
+    assert out == tmp_path / "rec.ctbic"
+    assert out.stat().st_size < csv.stat().st_size / 2
+
+    d_csv, c_csv = load_recording(csv)
+    d_arc, c_arc = load_recording(out)
+    np.testing.assert_array_equal(d_arc, d_csv)
+    np.testing.assert_array_equal(c_arc, c_csv)
@@ -0,0 +1,181 @@
+# Smoke runs of the benchmark suite - no hardware required. For actual
+# numbers run `python -m tests.benchmarks.bench_data_path run`
+import json
+
+from tests.benchmarks.bench_data_path import (
+    bench_controller_eval,
+    bench_on_data,
+    bench_trigger_latency,
+)
+from tests.benchmarks.bench_archive import bench_archive
+from tests.benchmarks.bench_closed_loop import (
+    bench_in_process,
+    bench_lsl_route,
+)
+from tests.benchmarks.bench_control_source import bench_rate
+from tests.benchmarks.bench_isolated import bench_isolated
+from tests.benchmarks.bench_lifecycle import (
+    bench_manager_restart,
+    bench_reconfigure,
+    bench_stop_restart,
+)
+from tests.benchmarks.bench_multi_device import bench_n_devices
+from tests.benchmarks.bench_outlet import bench_setting
+from tests.benchmarks.bench_ringbuffer import bench_ringbuffer
+from tests.benchmarks.bench_scheduling import bench_policy
+from tests.benchmarks.bench_sinks import bench_mode
+from tests.benchmarks.bench_watchdog import bench_setting as bench_watchdog
+from tests.utils.benchmark import compare_results, write_results
+
+
+def test_bench_on_data():
+    res = bench_on_data(n_packets=500, warmup=10)
+
+    assert res["wall_per_packet"]["n"] == 500
+    assert res["max_packet_rate_hz"] > 0
+    assert res["cpu_per_packet_us"] >= 0
+
+
+def test_bench_on_data_with_blanking():
+    res = bench_on_data(n_packets=500, warmup=10, blanking=True)
+
+    assert res["wall_per_packet"]["n"] == 500
+    # the BIC delivers packets at 1kHz, blanking must not eat that budget
+    assert res["wall_per_packet"]["p50_us"] < 1000
+
+
+def test_bench_on_data_with_quality():
+    res = bench_on_data(n_packets=500, warmup=10, quality=True)
+
+    assert res["wall_per_packet"]["n"] == 500
+    assert res["wall_per_packet"]["p50_us"] < 1000
+
+
+def test_bench_controller_eval():
+    res = bench_controller_eval(n_iter=200)
+    assert res["eval"]["n"] == 200
+
+
+def test_bench_trigger_latency():
+    res = bench_trigger_latency(n_triggers=3, grace_period_s=0.02)
+    assert res["n_missed"] == 0, f"Controller did not fire: {res=}"
+    assert res["latency"]["n"] == 3
+
+
+def test_results_are_comparable(tmp_path):
+    old = write_results(
+        "dummy", {"a": {"mean_us": 10.0}, "b": 1}, tmp_path / "old"
+    )
+    new = write_results(
+        "dummy", {"a": {"mean_us": 20.0}, "b": 1}, tmp_path / "new"
+    )
+
+    assert json.loads(old.read_text())["results"]["b"] == 1
+    assert compare_results(old, new) == {"a.mean_us": (10.0, 20.0, 1.0)}
+
+
+def test_bench_multi_device():
+    res = bench_n_devices(n_devices=2, n_packets=300)
+    assert len(res["packet_rate_per_device_hz"]) == 2
+    assert res["min_packet_rate_per_device_hz"] > 0
+
+
+def test_bench_stop_restart_below_1s():
+    res = bench_stop_restart(n_cycles=2)
+    assert res["stop_to_restart"]["max_us"] < 1e6
+    for k in ["stop_waiting_for_stream", "stop_in_grace_period"]:
+        assert res[k]["max_us"] < 0.5e6, f"Stopping too slow for {k}"
+
+
+def test_bench_manager_restart_with_synthetic_devices():
+    res = bench_manager_restart(n_cycles=2, n_devices=2)
+    assert res["manager_stop"]["n"] == 2
+    assert res["manager_restart_to_first_packet"]["max_us"] < 1e6
+
+
+def test_bench_reconfigure_timings_are_ordered():
+    res = bench_reconfigure(n_cycles=3, n_devices=2)
+    first = res["reconfigure_first_packet_ms"]
+    assert first["n"] == 6
+    # from issuing the start - the first packet cannot come before it
+    assert first["min_us"] >= 0
+    assert first["max_us"] <= res["reconfigure_blackout_ms"]["max_us"]
+
+
+def test_bench_ringbuffer_window_does_not_allocate_data():
+    res = bench_ringbuffer(n_iter=50, n_window=500)
+
+    # a copy of 500 x 32 float32 would be 64kB
+    assert res["unfold_last_n"]["peak_alloc_bytes"] > 64_000
+    assert res["window_last_n"]["peak_alloc_bytes"] < 2_000
+    assert res["reset_in_place"]["peak_alloc_bytes"] < 2_000
+
+
+def test_bench_isolated():
+    res = bench_isolated(n_packets=200)
+
+    assert res["lateness"]["n"] == 200
+    # stimulation calls went through while the stats were pending
+    assert res["stim_call"]["n"] > 0
+    assert res["stim_call"]["max_us"] < 150_000
+
+
+def test_bench_control_source():
+    res = bench_rate(sfreq=2000, chunk_n=1, n_triggers=3, period_s=0.1)
+    assert res["n_missed"] == 0, f"Controller did not fire: {res=}"
+    assert res["latency"]["n"] == 3
+
+
+def test_bench_outlet():
+    res = bench_setting(chunk_size=10, push_chunk_n=5, n_packets=200)
+
+    assert res["n_received"] == 200
+    # chunks of 5 samples at 1kHz, so the last sample waits up to 4ms
+    assert res["latency"]["min_us"] >= 0
+
+
+def test_bench_closed_loop_is_faster_than_lsl_route():
+    in_process = bench_in_process(n_triggers=3, period_n=100)
+    lsl_route = bench_lsl_route(n_triggers=3, period_n=100)
+
+    assert in_process["n_missed"] == 0 and lsl_route["n_missed"] == 0
+    assert in_process["latency"]["p50_us"] < lsl_route["latency"]["p50_us"]
+
+
+def test_bench_archive_is_smaller_and_seeks_faster_than_csv():
+    res = bench_archive(duration_s=20, read_s=1)
+
+    assert res["archive"]["n_read"] == res["csv"]["n_read"] == 1000
+    # one second with chunks of 1000 touches at most two chunks
+    assert res["archive"]["n_chunks_read"] <= 2
+    assert res["archive"]["mb"] < res["csv"]["mb"]
+    assert res["archive"]["read_ms"] < res["csv"]["read_ms"]
+
+
+def test_bench_watchdog_detects_and_recovers():
+    res = bench_watchdog(stall_s=0.1, check_s=0.02, restart_s=0.05, n_stalls=2)
+
+    assert res["n_stalls"] == res["n_recovered"] == 2
+    assert 100 <= res["detect_ms"]["max"] < 200
+    assert res["recover_ms"]["max"] < 200
+
+
+def test_bench_sinks_keep_hiccups_out_of_the_callback():
+    kwargs = dict(n_packets=300, hiccup_s=0.05, hiccup_every=100, queue_n=20)
+    stage = bench_mode("stage", **kwargs)
+    sink = bench_mode("drop_oldest", **kwargs)
+
+    assert stage["callback"]["max_us"] >= 50_000
+    assert sink["callback"]["max_us"] < 50_000
+    # 50 packets arrive during a hiccup, 20 fit in the queue
+    assert sink["n_dropped"] > 0
+    assert sink["n_processed"] + sink["n_dropped"] == 300
+
+
+def test_bench_scheduling_under_load():
+    res = bench_policy(duration_s=0.2, n_load=1)
+
+    assert res["n"] == 200
+    assert res["p50_us"] <= res["max_us"]
+    # the baseline probe is reset to the process defaults
+    assert set(res["applied"].values()) == {"applied"}
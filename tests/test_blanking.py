@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from ct_bic.blanking import ArtifactBlanker, split_by_counter
+from ct_bic.listener import CTListener
+from ct_bic.replay import ReplaySample
+from ct_bic.sinks import RingBufferSink, SinkRegistry
+from ct_bic.utils.ringbuffer import get_window
+from dareplane_utils.general.ringbuffer import RingBuffer
+from tests.test_degradation import RecordingOutlet
+from tests.utils.synthetic import get_synthetic_samples
+
+
+def run_blanker(blanker, n=200, stim_on=100, stim_off=105):
+    """Feed n single sample packets with value == counter, stimulating
+    from the packet with counter `stim_on` until after `stim_off`"""
+    outs = []
+    for c in range(n):
+        if c == stim_on:
+            blanker.on_stimulation_state_changed(True)
+        if c == stim_off + 1:
+            blanker.on_stimulation_state_changed(False)
+        data = np.full((1, 32), c, dtype=np.float32)
+        out, cntr = blanker.process(data, c)
+        # the counters travel through the delay line with their samples
+        if blanker.mode == "mark":
+            np.testing.assert_array_equal(out[:, 0], cntr)
+        outs.append(out)
+    return np.vstack(outs)
+
+
+@pytest.mark.parametrize("pre_n,post_n", [(0, 0), (3, 10), (5, 1)])
+def test_blanking_window(pre_n, post_n):
+    out = run_blanker(ArtifactBlanker(pre_n=pre_n, post_n=post_n, mode="mark"))
+
+    # the first pre_n samples stay in the delay line
+    assert len(out) == 200 - pre_n
+    np.testing.assert_array_equal(out[:, 0], np.arange(200 - pre_n))
+
+    flagged = np.nonzero(out[:, -1])[0]
+    np.testing.assert_array_equal(
+        flagged, np.arange(100 - pre_n, 105 + post_n + 1)
+    )
+
+
+def test_blanking_modes():
+    out = run_blanker(ArtifactBlanker(pre_n=2, post_n=3, mode="hold"))
+    flags = out[:, -1].astype(bool)
+    # held at the last clean sample before the onset window
+    assert (out[flags, :32] == 97).all()
+    np.testing.assert_array_equal(out[~flags, 0], np.nonzero(~flags)[0])
+
+    out = run_blanker(ArtifactBlanker(pre_n=2, post_n=3, mode="zero"))
+    flags = out[:, -1].astype(bool)
+    assert (out[flags, :32] == 0).all()
+
+
+def test_listener_pushes_flag_channel():
+    class Outlet:
+        def __init__(self):
+            self.samples = []
+
+        def push_sample(self, s):
+            self.samples.append(np.asarray(s))
+
+    outlet = Outlet()
+    listener = CTListener(
+        outlet=outlet, blanker=ArtifactBlanker(pre_n=2, post_n=5)
+    )
+    listener.on_measurement_state_changed(True)
+    for i, s in enumerate(get_synthetic_samples(100, 32)):
+        if i == 50:
+            listener.on_stimulation_state_changed(True)
+        if i == 52:
+            listener.on_stimulation_state_changed(False)
+            listener.on_stimulation_function_finished(1)
+        listener.on_data(s)
+
+    pushed = np.vstack(outlet.samples)
+    assert pushed.shape == (98, 33)
+    assert pushed[:, -1].sum() == 2 + 2 + 5
+
+
+def test_counters_of_delayed_multi_sample_packets():
+    blanker = ArtifactBlanker(pre_n=3, post_n=0, mode="mark")
+    outs, cntrs = [], []
+    for c in range(10):
+        # packets of two samples, which leave the delay line split up
+        out, cntr = blanker.process(np.full((2, 32), c), c)
+        outs.append(out)
+        cntrs.append(cntr)
+    out, cntr = np.vstack(outs), np.concatenate(cntrs)
+    np.testing.assert_array_equal(out[:, 0], cntr)
+    assert len(out) == 20 - 3
+
+    packets = list(split_by_counter(out[:, :32], cntr))
+    assert [c for _, c in packets] == list(range(9))
+    assert [len(d) for d, _ in packets] == [2] * 8 + [1]
+
+
+def test_new_data_of_blanked_packets_matches_the_counters():
+    reg = SinkRegistry()
+    listener = CTListener(
+        buffer=RingBuffer((100, 32)),
+        outlet=RecordingOutlet(),
+        blanker=ArtifactBlanker(pre_n=5, post_n=0, mode="mark"),
+        sinks=reg,
+    )
+    reg.add("ring_buffer", RingBufferSink(listener))
+    reg.start()
+    listener.on_measurement_state_changed(True)
+    # the value of each sample is its counter
+    for c in range(3):
+        listener.on_data(ReplaySample([float(c)] * 32, c))
+    reg.stop()
+    # all still in the delay line, nothing was written
+    assert listener.n_unread == 0
+    assert len(listener.get_new_data()) == 0
+
+    reg.start()
+    for c in range(3, 30):
+        listener.on_data(ReplaySample([float(c)] * 32, c))
+    reg.stop()
+    assert listener.ringbuffer_sink.n_written == listener.n_unread == 25
+    np.testing.assert_array_equal(listener.get_new_data()[:, 0], range(25))
+    _, cntr = get_window(listener.ringbuffer, 25)
+    np.testing.assert_array_equal(cntr[0], range(25))
@@ -0,0 +1,52 @@
+import threading
+
+import numpy as np
+
+from ct_bic.closed_loop import ClosedLoopStage, latest_value, rms
+from ct_bic.controller import ControlParams
+from ct_bic.degradation import DegradationLevel, DegradationPolicy
+from ct_bic.listener import CTListener
+from ct_bic.replay import ReplaySample
+from tests.test_degradation import RecordingOutlet
+
+
+def test_biomarkers():
+    window = np.zeros((4, 2), dtype=np.float32)
+    window[:, 1] = [3, -3, 3, -3]
+    window[-1, 0] = 7
+
+    assert latest_value(0)(window) == 7
+    assert rms(1)(window) == 3
+
+
+def test_stage_fires_once_per_crossing():
+    fired = threading.Event()
+    n_fired = []
+
+    def callback():
+        n_fired.append(1)
+        fired.set()
+
+    stage = ClosedLoopStage(
+        rms(0),
+        callback,
+        params=ControlParams(threshold=5, grace_period_s=0),
+        window_n=10,
+    )
+    # the control path keeps running when degraded
+    policy = DegradationPolicy([DegradationLevel(1, stages=False)])
+    listener = CTListener(
+        outlet=RecordingOutlet(), stages=[stage], degradation=policy
+    )
+    stage.start()
+
+    x = np.zeros(32)
+    for i in range(30):
+        x[0] = 10 if 10 <= i < 20 else 0
+        listener.on_data(ReplaySample(x.tolist(), i))
+    assert fired.wait(1)
+    stage.stop()
+
+    assert stage.n_evaluated == 30
+    assert len(n_fired) == 1
+    assert stage.summary()["latency_us"]["max"] > 0
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ct_bic.cmd_swap import CommandSwapper
+
+
+class FakeImplant:
+    """Records the calls and reports state changes like the SDK would"""
+
+    def __init__(self):
+        self.swapper: CommandSwapper | None = None
+        self.calls = []
+
+    def is_stimulation_command_valid(self, cmd):
+        return (cmd != "bad", "")
+
+    def enqueue_stimulation_command(self, cmd, mode):
+        self.calls.append(("enqueue", cmd, time.perf_counter_ns()))
+
+    def start_stimulation(self):
+        self.calls.append(("start", None, time.perf_counter_ns()))
+        self.swapper.on_stimulation_state_changed(True)
+
+    def stop_stimulation(self):
+        self.calls.append(("stop", None, time.perf_counter_ns()))
+        self.swapper.on_stimulation_state_changed(False)
+
+
+@pytest.fixture
+def swapper():
+    implant = FakeImplant()
+    swapper = CommandSwapper(implant, boundary_timeout_s=0.2)
+    implant.swapper = swapper
+    yield swapper
+    swapper.cancel()
+
+
+def test_swap_without_stimulation_only_enqueues(swapper):
+    swapper.prepare("cmd_a")
+
+    assert [c[0] for c in swapper.implant.calls] == ["enqueue"]
+    assert swapper.active == "cmd_a" and swapper.pending is None
+    assert swapper.summary()["n_running"] == 0
+
+    with pytest.raises(ValueError):
+        swapper.prepare("bad")
+    assert swapper.active == "cmd_a"
+
+
+def test_swap_waits_for_function_boundary(swapper):
+    swapper.implant.start_stimulation()
+    swapped = []
+    swapper.on_swap = lambda cmd, timing: swapped.append((cmd, timing))
+
+    swapper.prepare("cmd_a")
+    swapper.prepare("cmd_b")  # replaces the pending command
+    time.sleep(0.05)
+    assert swapped == [], "Swapped before a function finished"
+
+    t_boundary = time.perf_counter_ns()
+    swapper.on_stimulation_function_finished(1)
+    swapper.thread.join(timeout=1)
+
+    assert [c[1] for c in swapper.implant.calls if c[0] == "enqueue"] == [
+        "cmd_b"
+    ]
+    t_stop = next(c[2] for c in swapper.implant.calls if c[0] == "stop")
+    assert t_stop >= t_boundary
+
+    cmd, timing = swapped[0]
+    assert cmd == "cmd_b" and not timing["timed_out"]
+    summary = swapper.summary()
+    assert summary["n_running"] == 1
+    assert 0 < summary["stim_off_us"]["last"]
+    # the state callbacks come from within the stop and start calls
+    assert summary["stim_off_us"]["last"] <= summary["gap_us"]["last"]
+    np.testing.assert_allclose(
+        summary["boundary_to_start_us"]["last"],
+        summary["boundary_to_stop_us"]["last"] + summary["gap_us"]["last"],
+    )
+
+
+def test_swap_times_out_without_boundary(swapper):
+    swapper.implant.start_stimulation()
+    swapper.prepare("cmd_a")
+    swapper.thread.join(timeout=1)
+
+    assert swapper.active == "cmd_a"
+    assert swapper.summary()["n_timed_out"] == 1
+
+
+def test_prepare_during_a_swap_is_not_lost(swapper):
+    implant = swapper.implant
+    implant.start_stimulation()
+    gate = threading.Event()
+    stop = implant.stop_stimulation
+
+    def slow_stop():
+        gate.wait(1)
+        stop()
+
+    implant.stop_stimulation = slow_stop
+    swapper.prepare("cmd_a")
+    swapper.on_stimulation_function_finished(1)
+    time.sleep(0.05)  # the worker took cmd_a and is stopping
+    assert swapper.pending is None
+
+    swapper.prepare("cmd_b")
+    gate.set()
+    time.sleep(0.05)
+    assert swapper.active == "cmd_a" and swapper.pending == "cmd_b"
+    assert swapper.thread.is_alive(), "cmd_b was left without a worker"
+
+    swapper.on_stimulation_function_finished(2)
+    swapper.thread.join(timeout=1)
+    assert swapper.active == "cmd_b" and swapper.pending is None
+    assert [c[1] for c in implant.calls if c[0] == "enqueue"] == [
+        "cmd_a",
+        "cmd_b",
+    ]
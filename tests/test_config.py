@@ -0,0 +1,131 @@
+import copy
+import threading
+import time
+
+import pytest
+
+from ct_bic.config import (
+    CONFIG_PATH,
+    ConfigWatcher,
+    diff_config,
+    load_config,
+    validate_config,
+)
+from ct_bic.controller import ControlParams, threshold_single_control
+from dareplane_utils.stream_watcher.lsl_stream_watcher import StreamWatcher
+from tests.benchmarks.bench_data_path import get_control_outlet
+
+
+@pytest.fixture
+def cfg_file(tmp_path):
+    pth = tmp_path / "config.toml"
+    pth.write_text(CONFIG_PATH.read_text())
+    return pth
+
+
+def test_shipped_config_is_valid():
+    assert validate_config(load_config()) == []
+
+
+def test_invalid_values_are_reported():
+    cfg = copy.deepcopy(load_config())
+    cfg["stim_control"]["threshold"] = "high"
+    cfg["lsl"]["buffer_size_s"] = -1
+    cfg["recording"]["ref_channels"] = [40]
+
+    errors = validate_config(cfg)
+    assert len(errors) == 3, f"{errors=}"
+
+
+def test_invalid_outlet_settings_are_reported():
+    cfg = copy.deepcopy(load_config())
+    cfg["outlets"]["data"]["push_chunk_n"] = 0
+    cfg["outlets"]["events"]["chunk_size"] = -1
+    cfg["outlets"]["stats"]["push_chunk_n"] = 1  # only for the data outlet
+
+    errors = validate_config(cfg)
+    assert len(errors) == 3, f"{errors=}"
+
+
+def test_invalid_degradation_levels_are_reported():
+    cfg = copy.deepcopy(load_config())
+    levels = cfg["degradation"]["levels"]
+    levels[1]["paused_sinks"] = "archive"  # not a list
+    levels[2]["skip"] = True  # unknown key
+
+    errors = validate_config(cfg)
+    assert len(errors) == 2, f"{errors=}"
+
+
+def test_diff_config():
+    old = {"a": {"x": 1, "y": 2}}
+    new = {"a": {"x": 1, "y": 3}, "b": {"z": 0}}
+    assert diff_config(old, new) == {("a", "y"): (2, 3), ("b", "z"): (None, 0)}
+
+
+def test_watcher_applies_and_reports(cfg_file):
+    applied = []
+
+    def apply(changes, new_cfg):
+        applied.append(changes)
+        return {
+            f"{s}.{k}": "applied" if k == "threshold" else "rejected: test"
+            for s, k in changes
+        }
+
+    watcher = ConfigWatcher(load_config(cfg_file), apply, path=cfg_file)
+
+    txt = cfg_file.read_text()
+    txt = txt.replace("threshold = 127", "threshold = 100")
+    txt = txt.replace("stream_name = 'ct_bic'", "stream_name = 'other'")
+    cfg_file.write_text(txt)
+
+    report = watcher.check(force=True)
+    assert report == {
+        "stim_control.threshold": "applied",
+        "lsl.stream_name": "rejected: test",
+    }
+    assert watcher.cfg["stim_control"]["threshold"] == 100
+    # rejected values are not taken over
+    assert watcher.cfg["lsl"]["stream_name"] == "ct_bic"
+
+
+def test_watcher_rejects_invalid_config(cfg_file):
+    watcher = ConfigWatcher(
+        load_config(cfg_file), lambda c, n: {}, path=cfg_file
+    )
+    cfg_file.write_text(
+        cfg_file.read_text().replace("channel = 0", "channel = -1")
+    )
+
+    report = watcher.check(force=True)
+    assert report["config"].startswith("rejected")
+    assert watcher.cfg["stim_control"]["channel"] == 0
+
+
+def test_threshold_change_applies_to_running_controller():
+    name = "ct_bic_test_control"
+    outlet = get_control_outlet(name)
+    params = ControlParams(threshold=127, grace_period_s=0.01)
+    stop_event = threading.Event()
+    fired = threading.Event()
+    sw = StreamWatcher(name=name)
+
+    th = threading.Thread(
+        target=threshold_single_control,
+        args=(sw, fired.set, stop_event),
+        kwargs={"params": params},
+    )
+    th.start()
+    while sw.inlet is None:
+        time.sleep(0.01)
+
+    params.threshold = 300
+    outlet.push_sample([200.0])
+    assert not fired.wait(0.2), "Fired with the old threshold"
+
+    outlet.push_sample([400.0])
+    assert fired.wait(1), "Did not fire with the new threshold"
+
+    stop_event.set()
+    th.join(timeout=1)
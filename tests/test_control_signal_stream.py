@@ -0,0 +1,52 @@
+import numpy as np
+import pylsl
+import pytest
+
+from tests.utils.control_signal_stream import ControlSignalSource, get_pattern
+
+
+def test_patterns(tmp_path):
+    sq = get_pattern("square", sfreq=1000, period_s=0.1, duty=0.3)
+    assert len(sq) == 100 and (sq[70:] == 150).all() and (sq[:70] == 0).all()
+
+    ramp = get_pattern("ramp", sfreq=1000, period_s=0.1, low=0, high=100)
+    np.testing.assert_allclose(np.diff(ramp), 1)
+
+    noise = get_pattern("noise", sfreq=1000, period_s=0.1, seed=1)
+    np.testing.assert_array_equal(
+        noise, get_pattern("noise", sfreq=1000, period_s=0.1, seed=1)
+    )
+
+    np.save(tmp_path / "sig.npy", ramp)
+    np.testing.assert_array_equal(
+        get_pattern("file", file=tmp_path / "sig.npy"), ramp
+    )
+
+    with pytest.raises(ValueError):
+        get_pattern("sine")
+
+
+@pytest.mark.parametrize("sfreq,chunk_n", [(2000, 1), (5000, 7)])
+def test_source_is_paced_and_time_stamped(sfreq, chunk_n):
+    data = get_pattern("ramp", sfreq=sfreq, period_s=0.01)
+    src = ControlSignalSource(
+        data, sfreq, chunk_n, stream_name="ct_bic_test_source"
+    )
+    inlet = pylsl.StreamInlet(
+        pylsl.resolve_byprop("name", "ct_bic_test_source", timeout=5)[0]
+    )
+    inlet.open_stream(timeout=5)
+
+    src.run(duration_s=0.2)
+    n = int(0.2 * sfreq)
+    assert src.n_pushed == n
+
+    x, ts = [], []
+    while len(x) < n:
+        chunk, t = inlet.pull_chunk(timeout=1)
+        assert chunk, "Missing samples"
+        x += chunk
+        ts += t
+
+    np.testing.assert_array_equal(np.ravel(x), np.resize(data, n))
+    np.testing.assert_allclose(ts, src.sample_time(np.arange(n)), atol=1e-6)
@@ -0,0 +1,143 @@
+import numpy as np
+
+from ct_bic.degradation import DegradationLevel, DegradationPolicy
+from ct_bic.listener import CTListener
+from ct_bic.sinks import SinkRegistry
+from tests.utils.synthetic import get_synthetic_samples
+
+
+class RecordingOutlet:
+    def __init__(self):
+        self.pushes = []
+
+    def push_sample(self, s):
+        self.pushes.append(np.asarray(s)[None, :])
+
+    def push_chunk(self, c):
+        self.pushes.append(np.array(c))
+
+
+class CountingStage:
+    def __init__(self):
+        self.n = 0
+
+    def process(self, data, cntr):
+        self.n += len(data)
+
+
+def get_policy(**kwargs) -> DegradationPolicy:
+    levels = [
+        DegradationLevel(chunk_n=1, stages=True),
+        DegradationLevel(chunk_n=5, stages=True),
+        DegradationLevel(chunk_n=5, stages=False),
+    ]
+    return DegradationPolicy(
+        levels=levels, hold_s=0, recover_s=0.05, check_every=1, **kwargs
+    )
+
+
+def test_escalation_and_recovery():
+    transitions = []
+    policy = get_policy(on_change=lambda o, n: transitions.append((o, n)))
+
+    for _ in range(5):
+        policy.too_slow()
+    # capped at the last level
+    assert policy.level == 2
+    assert not policy.stages and policy.chunk_n == 5
+
+    policy.tick()
+    assert policy.level == 2  # too early to recover
+
+    policy._t_last_slow -= 1
+    policy._t_last_change -= 1
+    policy.tick()
+    assert policy.level == 1
+    assert transitions == [(0, 1), (1, 2), (2, 1)]
+
+
+def test_hold_limits_escalation_rate():
+    policy = DegradationPolicy(hold_s=10)
+    policy.too_slow()
+    policy.too_slow()
+    assert policy.level == 1
+
+
+def test_listener_degrades_without_losing_samples():
+    outlet = RecordingOutlet()
+    stage = CountingStage()
+    policy = get_policy()
+    listener = CTListener(outlet=outlet, stages=[stage], degradation=policy)
+    samples = get_synthetic_samples(100, 32)
+
+    for s in samples[:10]:
+        listener.on_data(s)
+    listener.on_data_processing_too_slow()  # -> chunked
+    for s in samples[10:32]:
+        listener.on_data(s)
+    listener.on_data_processing_too_slow()  # -> stages paused
+    for s in samples[32:]:
+        listener.on_data(s)
+    listener.on_measurement_state_changed(False)  # flushes the last chunk
+
+    pushed = np.vstack(outlet.pushes)
+    np.testing.assert_array_equal(
+        pushed, np.asarray([s.measurements for s in samples], np.float32)
+    )
+    assert max(len(p) for p in outlet.pushes) == 5
+    assert stage.n == 32
+
+
+def test_degradation_only_increases_the_configured_chunk_size():
+    outlet = RecordingOutlet()
+    policy = get_policy()
+    listener = CTListener(outlet=outlet, degradation=policy, chunk_n=8)
+    samples = get_synthetic_samples(32, 32)
+
+    for s in samples[:16]:
+        listener.on_data(s)
+    listener.on_data_processing_too_slow()  # level chunk_n=5 < 8
+    for s in samples[16:]:
+        listener.on_data(s)
+
+    assert [len(p) for p in outlet.pushes] == [8] * 4
+
+
+def test_levels_pause_named_sinks():
+    class Sink:
+        def __init__(self):
+            self.cntrs = []
+
+        def process(self, data, cntr):
+            self.cntrs.append(cntr)
+
+    policy = DegradationPolicy(
+        levels=[
+            DegradationLevel(chunk_n=1, stages=True),
+            DegradationLevel(chunk_n=1, stages=True, paused_sinks=["slow"]),
+        ],
+        hold_s=0,
+    )
+    reg = SinkRegistry()
+    slow, other = Sink(), Sink()
+    reg.add("slow", slow)
+    reg.add("other", other)
+    listener = CTListener(
+        outlet=RecordingOutlet(), degradation=policy, sinks=reg
+    )
+    reg.start()
+    samples = get_synthetic_samples(30, 32)
+    for s in samples[:10]:
+        listener.on_data(s)
+    listener.on_data_processing_too_slow()
+    for s in samples[10:20]:
+        listener.on_data(s)
+    policy.reset()
+    for s in samples[20:]:
+        listener.on_data(s)
+    reg.stop()
+
+    assert other.cntrs == list(range(30))
+    assert slow.cntrs == list(range(10)) + list(range(20, 30))
+    assert reg.workers["slow"].summary()["n_paused"] == 10
+    assert reg.workers["other"].summary()["n_paused"] == 0
@@ -0,0 +1,56 @@
+import numpy as np
+
+from ct_bic.drop_stats import DropStats, drop_stats_from_file
+from ct_bic.listener import buffers_to_df
+
+
+def get_counters(n: int = 5000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    steps = np.ones(n, dtype=np.int64)
+    steps[rng.choice(n, 50, replace=False)] += rng.integers(1, 20, 50)
+    return np.cumsum(steps)
+
+
+def test_chunked_matches_single_and_reference():
+    cntr = get_counters()
+
+    ds_single = DropStats(window_s=0.5)
+    for c in cntr:
+        ds_single.add(int(c))
+
+    ds_chunked = DropStats(window_s=0.5)
+    for chunk in np.array_split(cntr, 7):
+        ds_chunked.update(chunk)
+
+    # reference as previously computed with pandas
+    gaps = np.diff(cntr) - 1
+    assert ds_chunked.n_dropped == gaps.sum()
+    assert ds_chunked.longest_gap == gaps.max()
+    assert ds_chunked.n_received == len(cntr)
+
+    s1 = ds_single.summary(with_windows=True)
+    s2 = ds_chunked.summary(with_windows=True)
+    assert s1 == s2
+    assert sum(s1["gap_histogram"].values()) == (gaps > 0).sum()
+
+
+def test_counter_reset_is_not_a_drop():
+    ds = DropStats()
+    ds.update([1, 2, 3, 5])
+    ds.update([0, 1, 2])
+
+    assert ds.n_dropped == 1
+    assert ds.n_resets == 1
+
+
+def test_from_file(tmp_path):
+    cntr = get_counters(2000)
+    data = np.zeros((len(cntr), 32))
+    pth = tmp_path / "rec.csv"
+    buffers_to_df(data.tolist(), cntr.tolist()).to_csv(pth, index=False)
+
+    ds = drop_stats_from_file(pth, chunksize=300)
+    assert ds.n_dropped == (np.diff(cntr) - 1).sum()
+
+    ds.to_json(tmp_path / "summary.json")
+    assert (tmp_path / "summary.json").exists()
@@ -0,0 +1,53 @@
+import numpy as np
+import pylsl
+
+from ct_bic.events import (
+    EventCode,
+    EventOutlet,
+    event_locked_indices,
+    get_event_codes,
+    get_event_outlet,
+)
+
+
+def test_events_are_pushed_in_batches_with_their_time_stamps():
+    events = EventOutlet(get_event_outlet("ct_bic_test_events"))
+    streams = pylsl.resolve_byprop("name", "ct_bic_test_events", timeout=5)
+    inlet = pylsl.StreamInlet(streams[0])
+    info = inlet.info(timeout=5)
+    inlet.open_stream(timeout=5)
+
+    assert get_event_codes(info) == {int(c): c.name for c in EventCode}
+
+    t0 = pylsl.local_clock()
+    events.add(EventCode.FIRING_CALLBACK, value=200, channel=3, t=t0)
+    events.add(EventCode.STIM_START, value=1, cmd_key=0, t=t0 + 0.001)
+    events.add(EventCode.CALLBACK_FIRED, channel=3, t=t0 + 0.002)
+    assert events.flush() == 3
+
+    data, ts = [], []
+    while len(data) < 3:
+        chunk, t = inlet.pull_chunk(timeout=1)
+        data += chunk
+        ts += t
+
+    data = np.asarray(data)
+    np.testing.assert_array_equal(
+        data[:, 0],
+        [
+            EventCode.FIRING_CALLBACK,
+            EventCode.STIM_START,
+            EventCode.CALLBACK_FIRED,
+        ],
+    )
+    np.testing.assert_array_equal(data[:2, 1], [200, 1])
+    np.testing.assert_array_equal(data[:, 2], [3, -1, 3])
+    np.testing.assert_allclose(np.diff(ts), [0.001, 0.001], atol=1e-6)
+
+
+def test_event_locked_indices():
+    t_data = np.arange(100) / 10
+    idx = event_locked_indices(t_data, np.array([0.1, 5.0, 9.8]), 2, 3)
+
+    # first and last event lack samples before / after
+    np.testing.assert_array_equal(idx, [[48, 49, 50, 51, 52]])
@@ -0,0 +1,53 @@
+import numpy as np
+
+from ct_bic.hotpath_stats import HotPathStats
+from ct_bic.listener import CTListener
+from tests.utils.synthetic import get_synthetic_samples
+
+
+class NullOutlet:
+    def push_sample(self, s):
+        pass
+
+
+def test_durations_are_binned_by_powers_of_two():
+    stats = HotPathStats()
+    for dt_us in [0.5, 1, 3, 3, 100, 5000]:
+        stats.record(int(dt_us * 1000), 1)
+
+    smry = stats.summary()
+    assert smry["n_packets"] == 6
+    assert smry["callback_hist_us"] == {1: 1, 2: 1, 4: 2, 128: 1, 8192: 1}
+    assert smry["callback_p50_us"] == 4
+    assert smry["callback_max_us"] == 5000
+
+
+def test_listener_records_callbacks():
+    stats = HotPathStats()
+    listener = CTListener(outlet=NullOutlet(), stats=stats)
+    for s in get_synthetic_samples(100, 32):
+        listener.on_data(s)
+    listener.on_data_processing_too_slow()
+
+    smry = stats.summary()
+    assert smry["n_packets"] == 100
+    assert smry["n_samples"] == 100
+    assert smry["n_too_slow"] == 1
+    assert smry["packets_per_s"] > 0
+    assert sum(smry["callback_hist_us"].values()) == 100
+
+    # rates are since the last summary
+    assert stats.summary()["packets_per_s"] == 0
+
+
+def test_rates_are_kept_per_consumer():
+    stats = HotPathStats()
+    for _ in range(10):
+        stats.record(1000, 1)
+    stats.summary("publish")
+    for _ in range(10):
+        stats.record(1000, 1)
+    # e.g. a manual request in between does not reset the publisher
+    stats.summary("request")
+    assert stats.summary("request")["packets_per_s"] == 0
+    assert stats.summary("publish")["packets_per_s"] > 0
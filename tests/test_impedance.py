@@ -0,0 +1,83 @@
+import threading
+import time
+
+from ct_bic.impedance import ImpedanceCache, ImpedanceSweeper, periodic_sweeps
+from tests.benchmarks.bench_lifecycle import SyntheticCTManager
+
+
+class SlowImplant:
+    """Mimics the blocking calculate_impedance of the SDK"""
+
+    def __init__(self, dt_s: float = 0.01):
+        self.dt_s = dt_s
+        self.calls = []
+
+    def calculate_impedance(self, channel: int) -> float:
+        time.sleep(self.dt_s)
+        self.calls.append(channel)
+        return 1000.0 + channel
+
+
+def test_sweep_does_not_block():
+    cache = ImpedanceCache()
+    sweeper = ImpedanceSweeper(
+        SlowImplant(dt_s=0.05), "dev0", cache, n_channels=4
+    )
+
+    t0 = time.perf_counter()
+    sweeper.request_sweep()
+    assert time.perf_counter() - t0 < 0.05, "Requesting a sweep blocked"
+
+    assert sweeper.wait(timeout=2)
+    res = cache.get("dev0")["dev0"]
+    assert res["is_complete"]
+    assert res["impedances"] == {str(i): 1000.0 + i for i in range(4)}
+    sweeper.stop()
+
+
+def test_sweep_waits_while_busy():
+    cache = ImpedanceCache()
+    busy = threading.Event()
+    busy.set()
+    implant = SlowImplant()
+    sweeper = ImpedanceSweeper(implant, "dev0", cache, is_busy=busy.is_set)
+
+    sweeper.request_sweep([0, 1])
+    time.sleep(0.2)
+    assert implant.calls == [], "Sweep started while device was busy"
+
+    busy.clear()
+    assert sweeper.wait(timeout=2)
+    assert implant.calls == [0, 1]
+    sweeper.stop()
+
+
+def test_periodic_sweeps():
+    n_requests = []
+    stop_event = threading.Event()
+    th = threading.Thread(
+        target=periodic_sweeps,
+        args=(lambda: n_requests.append(1), lambda: False, stop_event),
+        kwargs={"interval_s": 0.05, "dt_s": 0.01},
+    )
+    th.start()
+    time.sleep(0.3)
+    stop_event.set()
+    th.join(timeout=1)
+
+    assert not th.is_alive()
+    assert len(n_requests) >= 3
+
+
+def test_sweep_of_synthetic_devices():
+    ctm = SyntheticCTManager(device_ids=["synthetic_0", "synthetic_1"])
+    try:
+        ctm.start_impedance_sweep()
+        for sweeper in ctm.impedance_sweepers.values():
+            assert sweeper.wait(timeout=2)
+        res = ctm.get_impedances()
+    finally:
+        ctm.close()
+    assert set(res) == {"synthetic_0", "synthetic_1"}
+    # all channels of the implant info
+    assert all(len(r["impedances"]) == 32 for r in res.values())
@@ -0,0 +1,102 @@
+import threading
+import time
+from multiprocessing import Pipe
+
+import pytest
+
+from ct_bic.isolated import (
+    STIM_COMMANDS,
+    CommandPipe,
+    DeviceProcess,
+    serve_commands,
+)
+
+
+def test_serve_commands():
+    class Target:
+        def stats(self):
+            return {"n": 1}
+
+        def start_recording(self):
+            raise RuntimeError("no implant")
+
+    conn, child = Pipe()
+    th = threading.Thread(target=serve_commands, args=(child, Target(), 0.01))
+    th.start()
+
+    conn.send((1, "stats", {}))
+    assert conn.recv() == (1, "ok", {"n": 1})
+    conn.send((2, "start_recording", {}))
+    seq, status, msg = conn.recv()
+    assert status == "error" and "no implant" in msg
+    conn.send((3, "set_implant_power", {}))  # not allowed
+    assert conn.recv()[:2] == (3, "error")
+    # stimulation goes through its own pipe
+    conn.send((4, "start_stimulation", {}))
+    assert conn.recv()[:2] == (4, "error")
+
+    conn.send((5, "close", {}))
+    assert conn.recv() == (5, "ok", None)
+    th.join(timeout=1)
+    assert not th.is_alive()
+
+
+def test_late_reply_is_not_taken_for_the_next():
+    class Target:
+        def start_recording(self):
+            time.sleep(0.3)
+            return "start_reply"
+
+        def stats(self):
+            return "stats_reply"
+
+    conn, child = Pipe()
+    pipe = CommandPipe(conn)
+    th = threading.Thread(target=serve_commands, args=(child, Target(), 0.01))
+    th.start()
+
+    with pytest.raises(TimeoutError):
+        pipe.call("start_recording", timeout=0.1)
+    assert pipe.call("stats") == "stats_reply"
+
+    pipe.call("close")
+    th.join(timeout=1)
+
+
+def test_stimulation_does_not_wait_for_long_commands():
+    class Target:
+        def reconfigure_recording(self):
+            time.sleep(0.5)
+            return {}
+
+        def start_stimulation(self):
+            return 0
+
+    target = Target()
+    dp = DeviceProcess()
+    conn, child = Pipe()
+    stim_conn, stim_child = Pipe()
+    dp.pipe, dp.stim_pipe = CommandPipe(conn), CommandPipe(stim_conn)
+    threads = [
+        threading.Thread(target=serve_commands, args=(child, target, 0.01)),
+        threading.Thread(
+            target=serve_commands,
+            args=(stim_child, target, 0.01, STIM_COMMANDS),
+        ),
+    ]
+    for th in threads:
+        th.start()
+
+    reconf = threading.Thread(target=dp.reconfigure_recording)
+    reconf.start()
+    time.sleep(0.05)  # the reconfiguration is running
+    t0 = time.perf_counter()
+    assert dp.start_stimulation() == 0
+    assert time.perf_counter() - t0 < 0.2
+    assert reconf.is_alive()
+
+    reconf.join()
+    for pipe in (dp.stim_pipe, dp.pipe):
+        pipe.call("close")
+    for th in threads:
+        th.join(timeout=1)
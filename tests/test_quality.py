@@ -0,0 +1,97 @@
+import numpy as np
+
+from ct_bic.listener import CTListener
+from ct_bic.quality import QUALITY_METRICS, SignalQualityStage
+from tests.test_degradation import RecordingOutlet
+from tests.utils.synthetic import get_synthetic_samples
+
+
+def get_test_data(n: int = 5000, sfreq: float = 1000) -> np.ndarray:
+    """ch0 noise, ch1 noise + 50Hz, ch2 flat, ch3 clipped sine"""
+    rng = np.random.default_rng(0)
+    t = np.arange(n) / sfreq
+    data = rng.normal(0, 10, size=(n, 4))
+    data[:, 1] += 100 * np.sin(2 * np.pi * 50 * t + 0.3)
+    data[:, 2] = 3.0
+    data[:, 3] = np.clip(1000 * np.sin(2 * np.pi * 7 * t), -800, 800)
+    return data
+
+
+def test_metrics_per_channel():
+    stage = SignalQualityStage(
+        n_channels=4, tau_s=1, saturation_level=800, publish_interval_s=10
+    )
+    for i, x in enumerate(get_test_data()):
+        stage.process(x[None, :], i)
+
+    rms, flat, sat, line = stage.compute()
+    np.testing.assert_allclose(rms[0], 10, rtol=0.1)
+    np.testing.assert_allclose(rms[1], np.sqrt(100 + 100**2 / 2), rtol=0.1)
+    assert rms[2] == 0
+
+    assert flat[2] > 0.99 and flat[:2].max() < 0.01
+    # arcsin(0.8) / (pi / 2) of the 7Hz sine is below the clipping level,
+    # the clipped samples are flat as well
+    np.testing.assert_allclose(sat[3], 1 - 2 / np.pi * np.arcsin(0.8), 0.05)
+    np.testing.assert_allclose(flat[3], sat[3], atol=0.02)
+    assert sat[:3].max() == 0
+
+    assert line[1] > 0.9 and line[0] < 0.05
+
+    assert stage.bad_channels() == {
+        1: ["line_ratio"],
+        2: ["flat"],
+        3: ["saturated"],
+    }
+
+
+def test_packets_of_any_size_give_the_same_metrics():
+    data = get_test_data(1000)
+    single = SignalQualityStage(n_channels=4, saturation_level=800)
+    chunked = SignalQualityStage(n_channels=4, saturation_level=800)
+    for x in data:
+        single.add(x[None, :])
+    # packets across the block boundaries
+    for i in range(0, len(data), 30):
+        chunked.add(data[i : i + 30])
+    np.testing.assert_allclose(single.compute(), chunked.compute())
+
+
+def test_line_phase_follows_dropped_packets():
+    data = get_test_data(5000)
+    stage = SignalQualityStage(n_channels=4, tau_s=1)
+    for i, x in enumerate(data):
+        if i % 7 == 3:  # dropped on the way, the counter skips
+            continue
+        stage.process(x[None, :], i)
+    assert stage.compute()[3, 1] > 0.9
+
+
+def test_publishes_at_the_interval():
+    outlet = RecordingOutlet()
+    stage = SignalQualityStage(publish_interval_s=0.1, outlet=outlet)
+    listener = CTListener(outlet=RecordingOutlet(), stages=[stage])
+    for s in get_synthetic_samples(1000):
+        listener.on_data(s)
+
+    assert len(outlet.pushes) == 10
+    assert outlet.pushes[-1].shape == (1, len(QUALITY_METRICS) * 32)
+    summary = stage.summary()
+    assert summary["n_samples"] == 1000
+    # the synthetic data: 50uV sines plus noise, none of them bad
+    assert np.all(np.array(summary["rms"]) > 30)
+    assert summary["bad_channels"] == {}
+
+
+def test_folding_does_not_change_what_readers_hold():
+    stage = SignalQualityStage(n_channels=4, saturation_level=800)
+    data = get_test_data(2000)
+    for x in data[:1000]:
+        stage.add(x[None, :])
+    avg, n_avg = stage._state
+    held = avg.copy()
+    for x in data[1000:]:
+        stage.add(x[None, :])
+    # the averages are replaced with each block, never updated in place
+    np.testing.assert_array_equal(avg, held)
+    assert stage._state[1] == n_avg + 1000
@@ -1,11 +1,11 @@
 import pytest
 import time
 
-import plotly.express as px
-
 
 from ct_bic.utils.global_setup import pyapi, log_file_name, enable_log
+from ct_bic.drop_stats import DropStats
 from ct_bic.listener import buffers_to_df, TestListener
+from ct_bic.main import CTManager
 
 
 # Cannot work with cached fixture as otherwise the tests will fail with CorTecs API
@@ -121,26 +121,27 @@ def test_n_sec_drop_rate(
 
     # Create a histogram plot of the dropped packages
     if plot:
-        df = buffers_to_df(buffer, cntr_buffer)
-        df["pkg_dropped"] = df["cntr"].diff().fillna(1) - 1
-        dg = df.loc[df.pkg_dropped != 0, ["cntr", "pkg_dropped"]]
-        dg["type"] = "single_drops"
-
-        fig = px.histogram(
-            dg,
-            x="pkg_dropped",
-            hover_data=["cntr"],
-            nbins=int(dg.pkg_dropped.max()),
-            #     points="all",
+        import plotly.express as px
+
+        ds = DropStats()
+        ds.update(cntr_buffer)
+        summary = ds.summary()
+        hist = summary["gap_histogram"]
+
+        fig = px.bar(
+            x=list(hist.keys()),
+            y=list(hist.values()),
+            labels={"x": "pkg_dropped", "y": "count"},
         )
         fig = fig.add_annotation(
-            x=dg.pkg_dropped.max(),
-            y=dg.pkg_dropped.value_counts().max(),
-            text=f"Total number of dropped in {nsleep}s:<br>{int(dg.pkg_dropped.sum())} [{int(dg.pkg_dropped.sum()) / dg.cntr.max():.2%}]",
+            x=max(hist.keys(), default=0),
+            y=max(hist.values(), default=0),
+            text=f"Total number of dropped in {nsleep}s:<br>{summary['n_dropped']} [{summary['drop_rate']:.2%}]",
             showarrow=False,
         )
         fig.show()
 
+        df = buffers_to_df(buffer, cntr_buffer)
         df.to_csv(
             f"./tests/test_data/recording_test_{time.strftime('%Y%m%d_%H%M%S')}.csv",
             index=False,
@@ -168,3 +169,37 @@ def plot_test_recording_psd():
         ax.legend()
 
     plt.show()
+
+
+@pytest.fixture
+def ctm():
+    ctm = CTManager()
+    yield ctm
+    ctm.close()
+
+
+def test_switching_amplification_while_recording(ctm: CTManager):
+    dev = ctm.get_device()
+    listener, outlet = dev.listener, dev.outlet
+    buffer = listener.ringbuffer
+    ctm.reconfigure_recording(ref_channels=[], amplification="39_5dB")
+    ctm.start_recording()
+    time.sleep(1)
+
+    timings = ctm.reconfigure_recording(
+        ref_channels=[4], amplification="57_5dB"
+    )
+    time.sleep(1)
+    ctm.stop_recording()
+
+    timing = timings[dev.device_id]
+    assert timing["blackout_ms"] is not None, "No data after reconfiguring"
+    assert 0 < timing["blackout_ms"] < 2000
+    assert ctm.ref_channels == [4]
+    assert ctm.amplification == (
+        pyapi.RecordingAmplificationFactor.AMPLIFICATION_57_5dB
+    )
+    # restarted in place, consumers keep their listener, outlet and buffer
+    assert dev.listener is listener
+    assert dev.outlet is outlet
+    assert dev.listener.ringbuffer is buffer
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from ct_bic.controller import ControlParams, ThresholdControl
+from ct_bic.listener import TestListener, buffers_to_df
+from ct_bic.replay import ReplayEngine, load_recording, replay_files
+from tests.utils.synthetic import get_synthetic_data
+
+
+@pytest.fixture
+def recording_csv(tmp_path):
+    data = get_synthetic_data(500)
+    cntr = np.arange(500) + 10
+    cntr[250:] += 5  # 5 dropped packets
+    pth = tmp_path / "recording_test_dummy.csv"
+    buffers_to_df(data.tolist(), cntr.tolist()).to_csv(pth, index=False)
+    return pth
+
+
+def test_replay_as_fast_as_possible(recording_csv):
+    data, cntr = load_recording(recording_csv)
+    listener = TestListener()
+
+    stats = ReplayEngine(data, cntr, [listener], speed=0).run()
+
+    assert stats.n_packets == 500
+    assert listener.cntr_buffer == cntr.tolist()
+    np.testing.assert_allclose(np.asarray(listener.buffer), data)
+    assert not listener.is_measument_active
+
+
+def test_replay_paced(recording_csv):
+    data, cntr = load_recording(recording_csv)
+
+    # 505ms of recording at 10x -> ~50ms
+    stats = ReplayEngine(data, cntr, [TestListener()], speed=10).run()
+
+    assert stats.replay_time_s == pytest.approx(0.504)
+    assert 0.045 < stats.wall_time_s < 0.1
+    assert stats.max_lateness_s < 0.01
+
+
+def test_controller_result_independent_of_speed(recording_csv):
+    def evaluate(speed):
+        ctrl = ThresholdControl(
+            ControlParams(threshold=40, grace_period_s=0.05)
+        )
+        fired = []
+
+        def on_packet(sample, c, t):
+            if ctrl.step(sample[0], t):
+                fired.append(c)
+
+        replay_files([recording_csv], [], speed=speed, on_packet=on_packet)
+        return fired
+
+    fired = evaluate(0)
+    assert len(fired) > 0
+    assert fired == evaluate(20)
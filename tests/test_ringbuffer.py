@@ -0,0 +1,55 @@
+import numpy as np
+
+from ct_bic.listener import CTListener
+from ct_bic.utils.ringbuffer import (
+    get_latest,
+    get_window,
+    join_window,
+    reset_ringbuffer,
+)
+from dareplane_utils.general.ringbuffer import RingBuffer
+
+
+def get_buffer(n_added: int, size: int = 10) -> RingBuffer:
+    rb = RingBuffer(shape=(size, 2))
+    data = np.arange(n_added)[:, None] * [1, -1]
+    # in two steps, as add_samples truncates to the buffer size
+    for idx in np.array_split(np.arange(n_added), 2):
+        rb.add_samples(data[idx], idx)
+    return rb
+
+
+def test_window_matches_unfold_buffer():
+    for n_added in [3, 10, 14]:
+        rb = get_buffer(n_added)
+        for n in [1, 3, 4, 10, 12]:
+            data, cntr = get_window(rb, n)
+            assert len(data) in (1, 2)
+            np.testing.assert_array_equal(
+                join_window(data), rb.unfold_buffer()[-n:]
+            )
+            np.testing.assert_array_equal(
+                join_window(cntr), rb.unfold_buffer_t()[-n:]
+            )
+            # views, no copies
+            assert all(np.shares_memory(d, rb.buffer) for d in data)
+
+        assert get_latest(rb, 1) == rb.unfold_buffer()[-1, 1]
+
+
+def test_reset_keeps_the_arrays():
+    listener = CTListener(buffer=get_buffer(14))
+    buf = listener.ringbuffer.buffer
+    (view,), _ = listener.get_window(3)
+
+    listener.reset_buffers()
+
+    assert listener.ringbuffer.buffer is buf
+    assert listener.ringbuffer.curr_i == 0
+    assert (view == 0).all()
+
+
+def test_reset_ringbuffer():
+    rb = get_buffer(5)
+    reset_ringbuffer(rb)
+    assert not rb.buffer.any() and not rb.buffer_t.any()
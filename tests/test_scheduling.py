@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from ct_bic.config import CONFIG_PATH, load_config, validate_config
+from ct_bic.listener import CTListener
+from ct_bic.scheduling import (
+    PROCESS_CPUS,
+    PROCESS_NICE,
+    SchedulingPolicy,
+    apply_policy,
+    measure_jitter,
+)
+from tests.test_degradation import RecordingOutlet
+from tests.utils.synthetic import get_synthetic_samples
+
+linux_only = pytest.mark.skipif(
+    sys.platform != "linux", reason="per thread scheduling via os"
+)
+
+
+def run_in_thread(fn):
+    """Result of fn called in a new thread, which is gone afterwards"""
+    res = {}
+    th = threading.Thread(target=lambda: res.update(out=fn()))
+    th.start()
+    th.join()
+    return res["out"]
+
+
+@linux_only
+def test_default_policy_resets_what_threads_inherit():
+    def child():
+        apply_policy(None, "child")
+        tid = threading.get_native_id()
+        return (
+            os.sched_getaffinity(tid),
+            os.getpriority(os.PRIO_PROCESS, tid),
+            os.sched_getscheduler(tid),
+        )
+
+    def parent():
+        # e.g. the server loop starting a sink worker or a probe
+        apply_policy(SchedulingPolicy(cpus=[0], nice=5), "parent")
+        return run_in_thread(child)
+
+    cpus, nice, policy = run_in_thread(parent)
+    assert cpus == set(PROCESS_CPUS)
+    assert nice == PROCESS_NICE
+    assert policy == os.SCHED_OTHER
+
+
+@linux_only
+def test_policy_applies_to_the_calling_thread_only():
+    def fn():
+        report = apply_policy(SchedulingPolicy(cpus=[0], nice=5))
+        tid = threading.get_native_id()
+        return (
+            report,
+            os.sched_getaffinity(tid),
+            os.getpriority(os.PRIO_PROCESS, tid),
+        )
+
+    before = os.getpriority(os.PRIO_PROCESS, threading.get_native_id())
+    report, cpus, nice = run_in_thread(fn)
+    assert set(report.values()) == {"applied"}
+    assert cpus == {0} and nice == 5
+    assert os.getpriority(os.PRIO_PROCESS, threading.get_native_id()) == (
+        before
+    )
+
+
+def test_refused_settings_are_reported(monkeypatch):
+    def refuse(*args):
+        raise PermissionError(1, "Operation not permitted")
+
+    monkeypatch.setattr("ct_bic.scheduling._set_realtime", refuse)
+    report = run_in_thread(
+        lambda: apply_policy(SchedulingPolicy(realtime_priority=50))
+    )
+    assert report["realtime_priority"].startswith("failed: PermissionError")
+
+
+def test_listener_schedules_each_callback_thread_once(monkeypatch):
+    tids = []
+    monkeypatch.setattr(
+        "ct_bic.listener.apply_policy",
+        lambda policy, name: tids.append(threading.get_native_id()) or {},
+    )
+    listener = CTListener(
+        outlet=RecordingOutlet(), scheduling=SchedulingPolicy(nice=5)
+    )
+    samples = get_synthetic_samples(20)
+
+    def feed(chunk):
+        for s in chunk:
+            listener.on_data(s)
+
+    run_in_thread(lambda: feed(samples[:10]))
+    # e.g. a new measurement with a new SDK callback thread
+    run_in_thread(lambda: feed(samples[10:]))
+    assert len(tids) == 2 and tids[0] != tids[1]
+
+    listener.set_scheduling(SchedulingPolicy(nice=6))
+    listener.on_data(samples[0])
+    assert tids[-1] == threading.get_native_id()
+
+
+def test_measure_jitter():
+    res = measure_jitter(duration_s=0.1, interval_s=0.001)
+    assert res["n"] == 100
+    assert 0 <= res["p50_us"] <= res["p99_us"] <= res["max_us"]
+    assert res["policy"] == {"cpus": [], "nice": 0, "realtime_priority": 0}
+
+
+def test_invalid_policies_are_rejected():
+    cfg = load_config(CONFIG_PATH)
+    cfg["scheduling"]["callback"]["nice"] = -30
+    cfg["scheduling"]["server"] = {"cpus": [0]}
+    errors = validate_config(cfg)
+    assert len(errors) == 2
+    assert all(e.startswith("[scheduling]") for e in errors)
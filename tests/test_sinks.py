@@ -0,0 +1,292 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ct_bic.archive import ArchiveReader, ArchiveWriter
+from ct_bic.blanking import ArtifactBlanker
+from ct_bic.listener import CTListener
+from ct_bic.replay import ReplaySample
+from ct_bic.sinks import RingBufferSink, SinkRegistry, SinkWorker
+from ct_bic.utils.ringbuffer import get_window
+from dareplane_utils.general.ringbuffer import RingBuffer
+from tests.test_degradation import RecordingOutlet
+from tests.utils.synthetic import get_synthetic_samples
+
+
+class CollectingSink:
+    def __init__(
+        self, delay_s: float = 0, gate: threading.Event | None = None
+    ):
+        self.delay_s = delay_s
+        self.gate = gate
+        self.cntrs = []
+        self.data = []
+
+    def process(self, data, cntr):
+        if self.gate is not None:
+            self.gate.wait()
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        self.cntrs.append(cntr)
+        self.data.append(data)
+
+
+class ClosingSink(CollectingSink):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.n_closed = 0
+        self.cntrs_at_close = None
+
+    def close(self):
+        self.n_closed += 1
+        self.cntrs_at_close = list(self.cntrs)
+
+
+def wait_processed(worker: SinkWorker, n: int, timeout: float = 1):
+    t0 = time.perf_counter()
+    while worker.n_processed < n and time.perf_counter() - t0 < timeout:
+        time.sleep(0.001)
+
+
+def fill_blocked(policy: str, n: int = 10, queue_n: int = 3) -> SinkWorker:
+    """Worker which is stuck on the first packet while n are put"""
+    gate = threading.Event()
+    worker = SinkWorker(
+        "test", CollectingSink(gate=gate), queue_n=queue_n, policy=policy
+    )
+    worker.start()
+    worker.put(np.zeros((1, 32)), 0)
+    time.sleep(0.01)  # the worker takes packet 0 and waits at the gate
+    for i in range(1, n):
+        worker.put(np.zeros((1, 32)), i)
+    gate.set()
+    wait_processed(worker, queue_n + 1)
+    worker.stop()
+    return worker
+
+
+def test_drop_oldest_keeps_the_latest_packets():
+    worker = fill_blocked("drop_oldest")
+    assert worker.sink.cntrs == [0, 7, 8, 9]
+    assert worker.n_dropped == 6
+
+
+def test_drop_newest_keeps_the_first_packets():
+    worker = fill_blocked("drop_newest")
+    assert worker.sink.cntrs == [0, 1, 2, 3]
+    assert worker.n_dropped == 6
+
+
+def test_block_waits_for_the_timeout():
+    worker = SinkWorker(
+        "test",
+        CollectingSink(gate=threading.Event()),
+        queue_n=1,
+        policy="block",
+        block_timeout_s=0.02,
+    )
+    worker.put(np.zeros((1, 32)), 0)
+    t0 = time.perf_counter()
+    worker.put(np.zeros((1, 32)), 1)
+    assert time.perf_counter() - t0 >= 0.02
+    assert worker.n_dropped == 1
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        SinkWorker("test", CollectingSink(), policy="drop_all")
+
+
+def test_slow_sink_does_not_block_dispatch():
+    reg = SinkRegistry(queue_n=100)
+    fast = reg.add("fast", CollectingSink())
+    slow = reg.add("slow", CollectingSink(delay_s=0.01))
+    reg.start()
+
+    t0 = time.perf_counter()
+    for i in range(50):
+        reg.dispatch(np.zeros((1, 32)), i)
+    dt = time.perf_counter() - t0
+    # 50 packets at 10ms each would take 0.5s in the callback
+    assert dt < 0.05
+
+    wait_processed(fast, 50)
+    wait_processed(slow, 1)
+    assert fast.sink.cntrs == list(range(50))
+    summary = reg.summary()
+    assert summary["slow"]["queued"] > 0
+    assert summary["slow"]["cntr_lag"] > 0
+
+    # stop drains the queue
+    reg.stop(timeout=2)
+    assert slow.sink.cntrs == list(range(50))
+    assert slow.max_lag_us > 1e4
+
+
+def test_remove_returns_the_sink_after_processing():
+    reg = SinkRegistry()
+    reg.start()
+    sink = CollectingSink()
+    reg.add("late", sink)  # started as the registry is running
+    for i in range(5):
+        reg.dispatch(np.zeros((1, 32)), i)
+    assert reg.remove("late") is sink
+    assert sink.cntrs == list(range(5))
+    assert len(reg) == 0
+
+    with pytest.raises(KeyError):
+        reg.add("a", sink)
+        reg.add("a", sink)
+    reg.stop()
+
+
+def test_busy_sink_is_closed_by_its_worker():
+    gate = threading.Event()
+    worker = SinkWorker("test", ClosingSink(gate=gate))
+    worker.start()
+    for i in range(3):
+        worker.put(np.zeros((1, 32)), i)
+    # the worker is stuck, it must not be closed while writing
+    assert not worker.stop(timeout=0.05, close=True)
+    assert worker.sink.n_closed == 0
+    gate.set()
+    worker.thread.join(1)
+    assert worker.sink.n_closed == 1
+    assert worker.sink.cntrs_at_close == [0, 1, 2]
+
+
+def test_idle_sink_is_closed_once():
+    reg = SinkRegistry()
+    sink = ClosingSink()
+    reg.add("test", sink)
+    reg.start()
+    reg.dispatch(np.zeros((1, 32)), 0)
+    reg.remove("test", close=True)
+    assert sink.n_closed == 1 and sink.cntrs_at_close == [0]
+
+
+def test_failing_sink_keeps_running():
+    class FailingSink:
+        def process(self, data, cntr):
+            raise RuntimeError("disk full")
+
+    reg = SinkRegistry()
+    worker = reg.add("fail", FailingSink())
+    reg.start()
+    for i in range(3):
+        reg.dispatch(np.zeros((1, 32)), i)
+    wait_processed(worker, 3)
+    reg.stop()
+    assert worker.n_errors == 3 and worker.n_processed == 3
+
+
+def test_listener_fans_out_to_sinks():
+    reg = SinkRegistry()
+    listener = CTListener(
+        buffer=RingBuffer((100, 32)), outlet=RecordingOutlet(), sinks=reg
+    )
+    sink = CollectingSink()
+    reg.add("collect", sink)
+    reg.add("ring_buffer", RingBufferSink(listener))
+    reg.start()
+
+    samples = get_synthetic_samples(20)
+    for s in samples:
+        listener.on_data(s)
+    reg.stop()
+
+    assert sink.cntrs == list(range(20))
+    # all sinks share the same array per packet
+    assert reg.workers["ring_buffer"].n_processed == 20
+    data, cntr = get_window(listener.ringbuffer, 20)
+    np.testing.assert_array_equal(cntr[0], np.arange(20))
+    np.testing.assert_array_equal(
+        data[0], np.array([s.measurements for s in samples], dtype=np.float32)
+    )
+
+
+def test_blanked_packets_are_copied_for_sinks():
+    reg = SinkRegistry()
+    listener = CTListener(
+        outlet=RecordingOutlet(),
+        blanker=ArtifactBlanker(pre_n=0, post_n=0),
+        sinks=reg,
+    )
+    sink = CollectingSink()
+    reg.add("collect", sink)
+    reg.start()
+
+    samples = get_synthetic_samples(10)
+    for s in samples:
+        listener.on_data(s)
+    reg.stop()
+
+    # the delay line is reused, but every packet kept its own values
+    np.testing.assert_allclose(
+        np.vstack(sink.data),
+        np.array([s.measurements for s in samples], dtype=np.float32),
+    )
+
+
+def test_new_data_is_counted_by_the_ring_buffer_sink():
+    reg = SinkRegistry()
+    listener = CTListener(
+        buffer=RingBuffer((100, 32)), outlet=RecordingOutlet(), sinks=reg
+    )
+    gate = threading.Event()
+    reg.add("slow", CollectingSink(gate=gate))
+    reg.add("ring_buffer", RingBufferSink(listener))
+    reg.start()
+    samples = get_synthetic_samples(30)
+    for s in samples[:20]:
+        listener.on_data(s)
+    wait_processed(reg.workers["ring_buffer"], 20)
+    assert listener.n_unread == 20
+    np.testing.assert_array_equal(
+        listener.get_new_data(),
+        np.array([s.measurements for s in samples[:20]], dtype=np.float32),
+    )
+    assert listener.n_unread == 0
+
+    for s in samples[20:]:
+        listener.on_data(s)
+    wait_processed(reg.workers["ring_buffer"], 30)
+    assert len(listener.get_new_data()) == 10
+    gate.set()
+    reg.stop()
+
+
+def test_blanked_samples_keep_their_counters(tmp_path):
+    reg = SinkRegistry()
+    listener = CTListener(
+        buffer=RingBuffer((100, 32)),
+        outlet=RecordingOutlet(),
+        blanker=ArtifactBlanker(pre_n=3, post_n=0, mode="mark"),
+        sinks=reg,
+    )
+    stage = CollectingSink()
+    listener.stages = [stage]
+    reg.add("ring_buffer", RingBufferSink(listener))
+    reg.add("archive", ArchiveWriter(tmp_path / "blanked.bin", chunk_n=10))
+    reg.start()
+    listener.on_measurement_state_changed(True)
+    # the value of each sample is its counter
+    for c in range(50):
+        listener.on_data(ReplaySample([float(c)] * 32, c))
+    reg.close()
+
+    # the first pre_n samples are still in the delay line
+    assert stage.cntrs == list(range(47))
+    for d, c in zip(stage.data, stage.cntrs):
+        assert (d == c).all()
+
+    data, cntr = get_window(listener.ringbuffer, 47)
+    np.testing.assert_array_equal(cntr[0], np.arange(47))
+    np.testing.assert_array_equal(data[0][:, 0], np.arange(47))
+
+    with ArchiveReader(tmp_path / "blanked.bin") as rd:
+        data, cntr, _ = rd.read_all()
+    np.testing.assert_array_equal(cntr, np.arange(47))
+    np.testing.assert_array_equal(data[:, 0], cntr)
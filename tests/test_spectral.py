@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from ct_bic.spectral import BandPowerStage
+
+
+def reference_band_power(x: np.ndarray, sfreq: float, lo: float, hi: float):
+    w = np.hanning(len(x))[:, None]
+    spec = np.fft.rfft(x * w, axis=0)
+    psd = 2 * np.abs(spec) ** 2 / (sfreq * (w**2).sum())
+    freqs = np.fft.rfftfreq(len(x), 1 / sfreq)
+    msk = (freqs >= lo) & (freqs <= hi)
+    return psd[msk].sum(axis=0) * (freqs[1] - freqs[0])
+
+
+def test_band_power_matches_reference():
+    sfreq = 1000
+    t = np.arange(3000) / sfreq
+    x = np.random.default_rng(0).normal(size=(3000, 4)).astype(np.float32)
+    x[:, 1] += 10 * np.sin(2 * np.pi * 20 * t)  # beta on channel 1
+
+    stage = BandPowerStage(
+        bands={"alpha": (8, 12), "beta": (13, 30)},
+        n_channels=4,
+        window_s=0.5,
+        hop_s=0.1,
+    )
+    # feed in uneven chunks to exercise the wrap around
+    for chunk in np.array_split(x, 37):
+        stage.add(chunk)
+
+    # first update once a full window is available, then every hop
+    assert stage.n_updates == (3000 - 500) // 100 + 1
+
+    ref = reference_band_power(x[-500:], sfreq, 13, 30)
+    np.testing.assert_allclose(stage.latest[1], ref, rtol=1e-3)
+    assert np.argmax(stage.latest[1]) == 1
+
+
+def test_hop_larger_than_window_is_rejected():
+    with pytest.raises(AssertionError):
+        BandPowerStage(window_s=0.1, hop_s=0.2)
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+
+from ct_bic.listener import CTListener
+from ct_bic.watchdog import DataWatchdog
+from tests.test_degradation import RecordingOutlet
+from tests.utils.synthetic import get_synthetic_samples
+
+
+class Feeder:
+    """Feeds counters at ~1kHz until paused, like the SDK callback thread"""
+
+    def __init__(self, watchdog: DataWatchdog):
+        self.watchdog = watchdog
+        self.cntr = 0
+        self.running = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if self.running.wait(0.01):
+                self.watchdog.feed(self.cntr)
+                self.cntr += 1
+                time.sleep(0.001)
+
+    def start(self):
+        self.running.set()
+        self.thread.start()
+
+    def restart(self):
+        # a new measurement starts counting from 0 again
+        self.cntr = 0
+        self.running.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+
+@pytest.fixture
+def feeder():
+    wd = DataWatchdog(stall_s=0.1, startup_s=0.2, check_s=0.01)
+    feeder = Feeder(wd)
+    wd.restart = feeder.restart
+    yield feeder
+    wd.stop()
+    feeder.stop()
+
+
+def test_no_stall_while_data_flows(feeder):
+    wd = feeder.watchdog
+    wd.arm()
+    feeder.start()
+    for _ in range(20):
+        time.sleep(0.01)
+        assert not wd.check()
+    assert wd.n_packets > 0 and not wd.stalls
+
+
+def test_stall_is_detected_and_recovered_by_restart(feeder):
+    wd = feeder.watchdog
+    stalled, recovered = [], []
+    wd.on_stall = stalled.append
+    wd.on_recover = recovered.append
+    wd.arm()
+    wd.start()
+    feeder.start()
+    time.sleep(0.05)
+
+    feeder.running.clear()
+    time.sleep(0.3)
+
+    assert len(stalled) == 1 and len(recovered) == 1
+    stall = wd.stalls[0]
+    assert stall["n_restarts"] == 1
+    # detected after stall_s, with one check interval (and scheduling) slack
+    assert 100 <= stall["detect_ms"] < 150
+    assert stall["recover_ms"] is not None and stall["recover_ms"] < 50
+    assert not wd.is_stalled
+
+    summary = wd.summary()
+    assert summary["n_stalls"] == 1 and summary["n_restarts"] == 1
+    assert summary["recover_ms"]["last"] == stall["recover_ms"]
+
+
+def test_stuck_counter_is_a_stall():
+    wd = DataWatchdog(stall_s=0.05, auto_restart=False)
+    wd.arm()
+    wd.feed(1)
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < 0.1:
+        wd.feed(1)  # packets arrive, but the counter does not advance
+        time.sleep(0.005)
+    assert wd.check()
+    assert wd.stalls[0]["cntr_last"] == 1
+
+    wd.feed(2)
+    assert not wd.check()
+    assert wd.stalls[0]["recover_ms"] is not None
+
+
+def test_first_packet_gets_startup_time():
+    wd = DataWatchdog(stall_s=0.01, startup_s=0.1, auto_restart=False)
+    wd.arm()
+    time.sleep(0.03)
+    assert not wd.check()
+    time.sleep(0.08)
+    assert wd.check()
+
+
+def test_gives_up_after_max_restarts():
+    restarts = []
+    wd = DataWatchdog(
+        restart=lambda: restarts.append(1),
+        stall_s=0.01,
+        startup_s=0.02,
+        max_restarts=2,
+    )
+    wd.arm()
+    wd.feed(0)
+    for _ in range(20):
+        time.sleep(0.01)
+        wd.check()
+
+    assert len(restarts) == 2
+    assert wd.stall["gave_up"] and wd.is_stalled
+
+
+def test_failing_restart_is_retried():
+    def restart():
+        raise RuntimeError("link lost")
+
+    wd = DataWatchdog(restart=restart, stall_s=0.01, startup_s=0.02)
+    wd.arm()
+    wd.feed(0)
+    for _ in range(20):
+        time.sleep(0.01)
+        wd.check()
+    assert wd.stall["n_restarts"] == 3
+
+
+def test_disarmed_watchdog_never_stalls():
+    wd = DataWatchdog(stall_s=0.01, startup_s=0.01)
+    wd.feed(0)
+    time.sleep(0.02)
+    assert not wd.check()
+
+    wd.arm()
+    time.sleep(0.02)
+    assert wd.check()
+    wd.disarm()
+    assert not wd.is_stalled and not wd.check()
+
+
+def test_first_packet_after_mark():
+    wd = DataWatchdog()
+    wd.feed(0)
+    wd.mark()
+    assert wd.t_first_ns == 0
+    t = time.perf_counter_ns()
+    wd.feed(1)
+    wd.feed(2)
+    assert t <= wd.t_first_ns < wd.t_last_ns
+
+
+def test_listener_feeds_watchdog():
+    wd = DataWatchdog()
+    listener = CTListener(outlet=RecordingOutlet(), watchdog=wd)
+    for s in get_synthetic_samples(10):
+        listener.on_data(s)
+    assert wd.n_packets == 10
+    assert wd._cntr == 9
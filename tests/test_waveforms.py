@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from ct_bic.waveforms import (
+    Waveform,
+    WaveformBuilder,
+    check_charge_balance,
+    quantize_amplitudes,
+)
+
+
+class RecordingFactory:
+    """Stand-in for pyapi.StimulationCommandFactory, atoms are tuples"""
+
+    def __init__(self):
+        self.n_atoms = 0
+
+    def create_4rect_stimulation_atom(self, a0, a1, a2, a3, duration):
+        self.n_atoms += 1
+        return (a0, duration)
+
+    def create_stimulation_function(self):
+        return RecordingFunction()
+
+    def create_stimulation_command(self):
+        return RecordingFunction()
+
+
+class RecordingFunction(list):
+    def set_repetitions(self, n_pulses, n_bursts):
+        self.repetitions = (n_pulses, n_bursts)
+
+    def set_virtual_stim_electrodes(self, electrodes, use_ground):
+        self.electrodes = electrodes
+
+
+def test_quantize_amplitudes():
+    q = quantize_amplitudes([5, 7, -3060, 3070, -6120, 100.4])
+    np.testing.assert_array_equal(q, [0, 12, -3060, 3072, -6120, 96])
+
+    with pytest.raises(ValueError):
+        quantize_amplitudes([7000])
+
+
+@pytest.mark.parametrize(
+    "amplitude,expected",
+    [(3060, 3060), (3061, 3060), (3072, 3072), (-3061, -3060), (3080, 3072)],
+)
+def test_quantize_amplitudes_at_the_grid_boundary(amplitude, expected):
+    assert quantize_amplitudes([amplitude])[0] == expected
+
+
+def test_from_sampled_merges_runs():
+    samples = np.r_[np.full(6, 120), np.zeros(2), np.full(24, -31)]
+    wf = Waveform.from_sampled(samples, dt_us=10)
+
+    np.testing.assert_array_equal(wf.amplitudes_uA, [120, 0, -36])
+    np.testing.assert_array_equal(wf.durations_us, [60, 20, 240])
+
+
+def test_charge_balance_is_checked_for_all_waveforms():
+    # counter pulse quantized 765 -> 768uA, its width balances the charge
+    ok = Waveform.biphasic(3060, 60)
+    assert ok.amplitudes_uA[2] == -768
+    assert abs(ok.imbalance) < 0.01
+    bad = Waveform([120, -120], [60, 30])
+
+    with pytest.raises(ValueError, match=r"\[1\]"):
+        check_charge_balance([ok, bad, ok])
+
+
+def test_builder_emits_atoms_and_caches():
+    factory = RecordingFactory()
+    builder = WaveformBuilder(factory)
+    lib = {f"amp_{a}": Waveform.biphasic(a, 60) for a in (120, 240, 480)}
+
+    funcs = builder.build_library(lib, stim_channels=[2], return_channels=[3])
+    assert factory.n_atoms == 15
+    assert funcs["amp_240"] == [
+        (240.0, 60),
+        (0.0, 10),
+        (-60.0, 240),
+        (0.0, 10),
+        (0.0, 7360),
+    ]
+    assert funcs["amp_240"].electrodes == ([2], [3])
+
+    # same waveforms, same electrodes -> no new atoms
+    again = builder.build_library(lib, stim_channels=[2], return_channels=[3])
+    assert factory.n_atoms == 15
+    assert again["amp_120"] is funcs["amp_120"]
+
+    cmd = builder.get_command([lib["amp_120"]] * 2, repetitions=(10, 2))
+    assert factory.n_atoms == 20
+    assert cmd[0] is cmd[1] and cmd[0].repetitions == (10, 2)
@@ -0,0 +1,103 @@
+# Helpers for the benchmark suite in ./tests/benchmarks - results are written
+# as json so that they can be compared between commits
+import json
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+
+RESULTS_DIR = Path("./tests/benchmarks/results")
+
+
+def summarize_ns(durations_ns: list[int] | np.ndarray) -> dict:
+    """Summary statistics of durations in ns, reported in us"""
+    d = np.asarray(durations_ns, dtype=np.float64) * 1e-3
+    if len(d) == 0:
+        return {"n": 0}
+
+    return {
+        "n": int(len(d)),
+        "mean_us": float(d.mean()),
+        "std_us": float(d.std()),
+        "min_us": float(d.min()),
+        "p50_us": float(np.percentile(d, 50)),
+        "p90_us": float(np.percentile(d, 90)),
+        "p99_us": float(np.percentile(d, 99)),
+        "max_us": float(d.max()),
+    }
+
+
+def get_git_revision() -> str:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return "unknown"
+
+
+def write_results(
+    name: str, results: dict, out_dir: Path | str = RESULTS_DIR
+) -> Path:
+    """
+    Write the results of a benchmark run to
+    <out_dir>/<name>_<git_revision>_<timestamp>.json together with some
+    meta data of the host
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(exist_ok=True, parents=True)
+    rev = get_git_revision()
+
+    payload = {
+        "benchmark": name,
+        "git_revision": rev,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+    fpath = out_dir / f"{name}_{rev}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    fpath.write_text(json.dumps(payload, indent=2))
+
+    return fpath
+
+
+def flatten_results(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for k, v in results.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            flat.update(flatten_results(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            flat[key] = float(v)
+    return flat
+
+
+def compare_results(
+    old: Path | str, new: Path | str, rel_tol: float = 0.1
+) -> dict[str, tuple[float, float, float]]:
+    """
+    Compare two result files, returning {metric: (old, new, rel_change)} for
+    all metrics which changed by more than `rel_tol`
+    """
+    a = flatten_results(json.loads(Path(old).read_text())["results"])
+    b = flatten_results(json.loads(Path(new).read_text())["results"])
+
+    changed = {}
+    for k in sorted(a.keys() & b.keys()):
+        rel = (b[k] - a[k]) / a[k] if a[k] != 0 else float(b[k] != 0)
+        if abs(rel) > rel_tol:
+            changed[k] = (a[k], b[k], rel)
+
+    return changed
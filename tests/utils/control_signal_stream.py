@@ -1,44 +1,211 @@
-# A simple stream providing a control signal for testing
-
+# A deterministic control signal source for testing and load tests of the
+# trigger controller. Samples are pushed on a fixed schedule derived from the
+# start time, so the rate does not drift and the time stamp of every sample
+# is known in advance - e.g. to compute the latency from a threshold
+# crossing to the controller's callback.
+#
+# Usage:
+#   python -m tests.utils.control_signal_stream
+#   python -m tests.utils.control_signal_stream --pattern=ramp --sfreq=5000 --chunk_n=10
+import threading
 import time
+from pathlib import Path
+
+import numpy as np
 import pylsl
+
 from ct_bic.utils.logging import logger
 
-import numpy as np
+PATTERNS = ("square", "ramp", "noise", "file")
+
+
+def get_pattern(
+    pattern: str = "square",
+    sfreq: float = 100,
+    period_s: float = 2,
+    duty: float = 0.5,
+    low: float = 0,
+    high: float = 150,
+    seed: int = 0,
+    file: str | Path | None = None,
+) -> np.ndarray:
+    """
+    One period of the control signal, the source repeats it
+
+    Parameters
+    ----------
+    pattern : str
+        "square" - `high` for the last `duty` fraction of the period
+        "ramp" - linear from `low` to `high` over the period
+        "noise" - uniform in [low, high)
+        "file" - single column from a .npy or .csv file, sfreq is ignored
+    """
+    if pattern == "file":
+        assert file is not None, "Need a file for pattern='file'"
+        file = Path(file)
+        if file.suffix == ".npy":
+            data = np.load(file)
+        else:
+            data = np.loadtxt(file, delimiter=",", ndmin=1)
+        return np.asarray(data, dtype=np.float32).ravel()
+
+    n = int(period_s * sfreq)
+    assert n > 0, f"{period_s=} too short for {sfreq=}"
+    if pattern == "square":
+        data = np.full(n, low, dtype=np.float32)
+        data[n - int(n * duty) :] = high
+    elif pattern == "ramp":
+        data = np.linspace(low, high, n, endpoint=False, dtype=np.float32)
+    elif pattern == "noise":
+        rng = np.random.default_rng(seed)
+        data = rng.uniform(low, high, n).astype(np.float32)
+    else:
+        raise ValueError(f"Unknown {pattern=}, use one of {PATTERNS}")
+    return data
+
+
+class ControlSignalSource:
+    """
+    Push a repeated pattern to a single channel LSL stream at `sfreq`, in
+    chunks of `chunk_n` samples. Sample i has the LSL time stamp
+    `t0_lsl + i / sfreq` and a chunk is pushed once its last sample is due.
+    If the pushing thread falls behind, overdue chunks are pushed right
+    away.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        one period of the control signal, see `get_pattern`
+    sfreq : float
+        sampling rate, up to several kHz
+    chunk_n : int
+        samples per push
+    stream_name : str
+        name of the LSL stream
+    """
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        sfreq: float = 100,
+        chunk_n: int = 1,
+        stream_name: str = "control_signal",
+    ):
+        self.data = np.asarray(data, dtype=np.float32)
+        self.sfreq = sfreq
+        self.chunk_n = chunk_n
+        self.stream_name = stream_name
+
+        info = pylsl.StreamInfo(
+            name=stream_name,
+            type="EEG",
+            channel_count=1,
+            nominal_srate=sfreq,
+            channel_format="float32",
+            source_id=stream_name,
+        )
+        self.outlet = pylsl.StreamOutlet(info, chunk_size=chunk_n)
+
+        self.t0_lsl: float | None = None  # LSL time of sample 0
+        self.n_pushed = 0
+        self.max_lateness_s = 0.0
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def sample_time(self, i: int | np.ndarray) -> float | np.ndarray:
+        """LSL time stamp of sample i"""
+        return self.t0_lsl + np.asarray(i) / self.sfreq
+
+    def run(self, duration_s: float | None = None):
+        """Push until stopped, or for `duration_s` seconds"""
+        n_total = None if duration_s is None else int(duration_s * self.sfreq)
+        # one extra period, so that a chunk never needs to wrap around
+        n_period = len(self.data)
+        data = np.resize(self.data, n_period + self.chunk_n)
+
+        self.stop_event.clear()
+        self.n_pushed = 0
+        t_start = time.perf_counter()
+        self.t0_lsl = pylsl.local_clock()
+        while not self.stop_event.is_set():
+            if n_total is not None and self.n_pushed >= n_total:
+                break
+
+            n = self.chunk_n
+            if n_total is not None:
+                n = min(n, n_total - self.n_pushed)
+            # index of the last sample in the chunk, which determines when
+            # the chunk is due and its time stamp
+            i_last = self.n_pushed + n - 1
+
+            t_due = t_start + i_last / self.sfreq
+            while (dt := t_due - time.perf_counter()) > 0:
+                # sleep coarse, then spin for the last ms
+                if dt > 0.002:
+                    time.sleep(dt - 0.001)
+            self.max_lateness_s = max(
+                self.max_lateness_s, time.perf_counter() - t_due
+            )
+
+            i = self.n_pushed % n_period
+            self.outlet.push_chunk(
+                data[i : i + n, None], self.t0_lsl + i_last / self.sfreq
+            )
+            self.n_pushed += n
+
+        logger.debug(
+            f"Control signal source pushed {self.n_pushed} samples, max"
+            f" lateness {self.max_lateness_s * 1e3:.2f}ms"
+        )
+
+    def start(
+        self, duration_s: float | None = None
+    ) -> tuple[threading.Thread, threading.Event]:
+        self.thread = threading.Thread(
+            target=self.run,
+            kwargs={"duration_s": duration_s},
+            name="control_signal",
+            daemon=True,
+        )
+        self.thread.start()
+        return self.thread, self.stop_event
+
+    def stop(self, timeout: float = 1):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+def main(
+    pattern: str = "square",
+    sfreq: float = 100,
+    chunk_n: int = 1,
+    period_s: float = 2,
+    duty: float = 0.5,
+    low: float = 0,
+    high: float = 150,
+    file: str | None = None,
+    stream_name: str = "control_signal",
+    duration_s: float | None = None,
+):
+    data = get_pattern(
+        pattern,
+        sfreq=sfreq,
+        period_s=period_s,
+        duty=duty,
+        low=low,
+        high=high,
+        file=file,
+    )
+    src = ControlSignalSource(data, sfreq, chunk_n, stream_name)
+    logger.info(f"Streaming {pattern=} at {sfreq=}Hz to {stream_name}")
+    try:
+        src.run(duration_s)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    from fire import Fire
 
-SRATE_HZ = 100
-data = np.zeros(SRATE_HZ * 10)
-for i in range(1, 5):
-    data[SRATE_HZ * (2 * i) : SRATE_HZ * (2 * i + 1)] = 150
-
-
-info = pylsl.StreamInfo(
-    name="control_signal",
-    type="EEG",
-    channel_count=1,
-    nominal_srate=SRATE_HZ,
-    channel_format="float32",
-    source_id=f"control_signal",
-)
-
-outlet = pylsl.StreamOutlet(info, max_buffered=1)
-
-i = 0
-dt = 1 / SRATE_HZ * 1e9
-t0 = time.time_ns()
-while True:
-    ndt = time.time_ns() - t0
-    if ndt > dt:
-        t0 = time.time_ns()
-        req_samples = int((ndt * 1e-9) // SRATE_HZ + 1)
-
-        if i + req_samples > len(data):
-            i = 0
-
-        for j in range(req_samples):
-            d = data[i + j]
-            # logger.debug(f"Pushing: {d}")
-            outlet.push_sample([d])
-
-        i += req_samples
-        i = i % len(data)
+    Fire(main)
@@ -0,0 +1,149 @@
+# Synthetic data packets mimicking the pyapi.Sample objects delivered to
+# ImplantListener.on_data - used to exercise the data path without hardware.
+# The packets are ReplaySamples, the same stand-in the replay uses.
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from ct_bic.replay import ReplaySample
+
+
+def get_synthetic_data(
+    n_samples: int,
+    n_channels: int = 32,
+    sfreq: float = 1000,
+    seed: int = 0,
+) -> np.ndarray:
+    """Sines of different frequency per channel plus some white noise, in uV"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) / sfreq
+    freqs = np.linspace(5, 80, n_channels)
+    data = 50 * np.sin(2 * np.pi * freqs[None, :] * t[:, None])
+    data += rng.normal(0, 5, size=data.shape)
+    return data.astype(np.float32)
+
+
+def get_synthetic_samples(
+    n_samples: int,
+    n_channels: int = 32,
+    cntr_start: int = 0,
+    drop_every: int = 0,
+    seed: int = 0,
+) -> list[ReplaySample]:
+    """
+    Create a list of synthetic packets, one sample of all channels per packet
+    as delivered by the BIC at 1kHz.
+
+    Parameters
+    ----------
+    n_samples : int
+        number of packets to create
+    n_channels : int
+        number of channels per packet
+    cntr_start : int
+        measurement counter of the first packet
+    drop_every : int
+        if > 0, skip the counter by one every `drop_every` packets to mimic
+        packets which were dropped on the way
+    seed : int
+        seed for the noise component
+
+    Returns
+    -------
+    list[ReplaySample]
+
+    """
+    data = get_synthetic_data(n_samples, n_channels=n_channels, seed=seed)
+    cntr = np.arange(n_samples) + cntr_start
+    if drop_every > 0:
+        cntr += np.arange(n_samples) // drop_every
+
+    # convert upfront so that list creation is not part of any timing
+    return [
+        ReplaySample(measurements=row, measurement_counter=int(c))
+        for row, c in zip(data.tolist(), cntr)
+    ]
+
+
+@dataclass
+class SyntheticImplantInfo:
+    """Duck-typed stand-in for pyapi.implantinfo.ImplantInfo"""
+
+    channel_count: int = 32
+
+
+class SyntheticImplant:
+    """
+    Duck-typed stand-in for pyapi.implant.Implant, for a CTManager without
+    hardware. While measuring, packets of synthetic data are delivered to
+    the registered listener at `sfreq` from a thread of its own, like the
+    SDK callback thread. Counters restart with each measurement. Stimulation
+    and power calls are accepted and ignored.
+    """
+
+    def __init__(self, sfreq: float = 1000, n_channels: int = 32):
+        self.sfreq = sfreq
+        # one second of data, repeated
+        self.rows = get_synthetic_data(
+            int(sfreq), n_channels=n_channels, sfreq=sfreq
+        ).tolist()
+        self.listener = None
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.t_first_ns = 0  # first packet of the current measurement
+
+    def register_listener(self, listener):
+        self.listener = listener
+
+    def start_measurement(self, ref_channels, **kwargs):
+        if self.thread is not None and self.thread.is_alive():
+            raise RuntimeError("Measurement already running")
+        self.stop_event.clear()
+        self.t_first_ns = 0
+        self.thread = threading.Thread(
+            target=self._run, name="synthetic_implant", daemon=True
+        )
+        self.thread.start()
+
+    def stop_measurement(self):
+        if self.thread is None or not self.thread.is_alive():
+            raise RuntimeError("Measurement already stopped")
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        self.listener.on_measurement_state_changed(True)
+        dt_ns = int(1e9 / self.sfreq)
+        t0 = time.perf_counter_ns()
+        i = 0
+        while not self.stop_event.is_set():
+            dt = t0 + i * dt_ns - time.perf_counter_ns()
+            if dt > 0:
+                time.sleep(dt * 1e-9)
+            self.listener.on_data(
+                ReplaySample(self.rows[i % len(self.rows)], i)
+            )
+            if i == 0:
+                self.t_first_ns = time.perf_counter_ns()
+            i += 1
+        self.listener.on_measurement_state_changed(False)
+
+    def set_implant_power(self, enabled: bool):
+        pass
+
+    def calculate_impedance(self, channel: int) -> float:
+        return 1000.0
+
+    def is_stimulation_command_valid(self, cmd) -> tuple:
+        return (True, "")
+
+    def enqueue_stimulation_command(self, cmd, mode):
+        pass
+
+    def start_stimulation(self):
+        pass
+
+    def stop_stimulation(self):
+        pass